@@ -1,5 +1,6 @@
 import os
-from flask import Flask, send_from_directory, jsonify, redirect, request, Response
+from flask import Flask, jsonify, redirect, request, Response
+from werkzeug.security import safe_join
 from datetime import timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
@@ -79,8 +80,14 @@ def setup_logging(app):
     
     return app
 
-def create_app():
-    """Initialize the core application."""
+def create_app(config=None):
+    """
+    Initialize the core application.
+
+    Args:
+        config: Settings applied over the ones read from the environment before
+            the extensions are set up, e.g. another SQLALCHEMY_DATABASE_URI for tests
+    """
     app = Flask(__name__, static_folder=None)
     print("CREATE_APP: Entered create_app() for MINIMAL + DB + AUTH_BP + CMS_BP test.")
     
@@ -143,6 +150,81 @@ def create_app():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
     
+    # Background matting worker pool (see app/matting/jobs.py)
+    app.config['MATTING_WORKERS'] = int(os.environ.get('MATTING_WORKERS', 4))
+    app.config['MATTING_QUEUE_POLL_SECONDS'] = float(os.environ.get('MATTING_QUEUE_POLL_SECONDS', 2))
+    app.config['MATTING_JOB_MAX_WAIT_SECONDS'] = float(os.environ.get('MATTING_JOB_MAX_WAIT_SECONDS', 30))
+    
+    # Remote matting nodes, comma-separated and load-balanced (see app/matting/client.py)
+    app.config['MATTING_BACKEND_URLS'] = os.environ.get('MATTING_BACKEND_URLS', 'http://8.130.113.102:5000/api/process-image-api')
+    app.config['MATTING_BACKEND_CONNECT_TIMEOUT'] = float(os.environ.get('MATTING_BACKEND_CONNECT_TIMEOUT', 5))
+    app.config['MATTING_BACKEND_READ_TIMEOUT'] = float(os.environ.get('MATTING_BACKEND_READ_TIMEOUT', 60))
+    app.config['MATTING_BACKEND_POOL_SIZE'] = int(os.environ.get('MATTING_BACKEND_POOL_SIZE', 10))
+    app.config['MATTING_BACKEND_MAX_ATTEMPTS'] = int(os.environ.get('MATTING_BACKEND_MAX_ATTEMPTS', 3))
+    app.config['MATTING_BACKEND_FAILURE_THRESHOLD'] = int(os.environ.get('MATTING_BACKEND_FAILURE_THRESHOLD', 5))
+    app.config['MATTING_BACKEND_RESET_SECONDS'] = float(os.environ.get('MATTING_BACKEND_RESET_SECONDS', 30))
+    
+    # Local fallback engine used when the matting API fails (see app/matting/engine.py)
+    app.config['MATTING_LOCAL_FALLBACK'] = os.environ.get('MATTING_LOCAL_FALLBACK', 'true').lower() == 'true'
+    app.config['MATTING_FALLBACK_ENGINE'] = os.environ.get('MATTING_FALLBACK_ENGINE', 'threshold')
+    app.config['MATTING_FALLBACK_THRESHOLD'] = int(os.environ.get('MATTING_FALLBACK_THRESHOLD', 200))
+    app.config['MATTING_FALLBACK_TILE_SIZE'] = int(os.environ.get('MATTING_FALLBACK_TILE_SIZE', 1024))
+
+    # Pre-processing before matting: orient, cap the longest edge, re-encode (see app/matting/service.py)
+    app.config['MATTING_PREPROCESS'] = os.environ.get('MATTING_PREPROCESS', 'true').lower() == 'true'
+    app.config['MATTING_MAX_EDGE'] = int(os.environ.get('MATTING_MAX_EDGE', 2048))
+    app.config['MATTING_PREPROCESS_FORMAT'] = os.environ.get('MATTING_PREPROCESS_FORMAT', 'JPEG')
+    app.config['MATTING_PREPROCESS_QUALITY'] = int(os.environ.get('MATTING_PREPROCESS_QUALITY', 90))
+    app.config['MATTING_UPSCALE_ALPHA'] = os.environ.get('MATTING_UPSCALE_ALPHA', 'true').lower() == 'true'
+
+    # Thumbnail/preview variants of processed images (see app/matting/derivatives.py)
+    app.config['MATTING_DERIVATIVE_FOLDER'] = os.environ.get('MATTING_DERIVATIVE_FOLDER', 'app/static/processed_variants')
+    app.config['MATTING_DERIVATIVE_MAX_BYTES'] = int(os.environ.get('MATTING_DERIVATIVE_MAX_BYTES', 1024 ** 3))
+    app.config['MATTING_DERIVATIVES_EAGER'] = os.environ.get('MATTING_DERIVATIVES_EAGER', 'true').lower() == 'true'
+    app.config['MATTING_DERIVATIVE_EAGER_FORMATS'] = os.environ.get('MATTING_DERIVATIVE_EAGER_FORMATS', 'webp')
+
+    # Static uploads: 'x-accel' (nginx) or 'x-sendfile' lets the proxy send the bytes (see app/utils/static_files.py)
+    app.config['BLOG_UPLOAD_FOLDER'] = os.environ.get('BLOG_UPLOAD_FOLDER', os.path.join(app.root_path, 'static', 'uploads', 'blog'))
+    app.config['STATIC_SENDFILE_MODE'] = os.environ.get('STATIC_SENDFILE_MODE', '')
+    app.config['STATIC_ACCEL_PREFIX'] = os.environ.get('STATIC_ACCEL_PREFIX', '/protected')
+    
+    # Content-addressed result cache (see app/matting/cache.py)
+    app.config['MATTING_CACHE_FOLDER'] = os.environ.get('MATTING_CACHE_FOLDER', 'app/static/matting_cache')
+    app.config['MATTING_CACHE_MAX_BYTES'] = int(os.environ.get('MATTING_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+    app.config['MATTING_CACHE_CHARGE_HITS'] = os.environ.get('MATTING_CACHE_CHARGE_HITS', 'true').lower() == 'true'
+
+    # Multi-image requests to /matting/batch (see app/matting/batch.py)
+    app.config['MATTING_BATCH_MAX_ITEMS'] = int(os.environ.get('MATTING_BATCH_MAX_ITEMS', 100))
+    app.config['MATTING_BATCH_CONCURRENCY'] = int(os.environ.get('MATTING_BATCH_CONCURRENCY', 4))
+    app.config['MATTING_BATCH_MAX_FILE_BYTES'] = int(os.environ.get('MATTING_BATCH_MAX_FILE_BYTES', 50 * 1024 ** 2))
+
+    # Public blog/language response cache; REDIS_URL adds a shared tier (see app/cms/response_cache.py)
+    app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+    app.config['RESPONSE_CACHE_TTL_SECONDS'] = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 300))
+    app.config['RESPONSE_CACHE_REDIS_URL'] = os.environ.get('RESPONSE_CACHE_REDIS_URL', '')
+    
+    # Blog search from the full-text index instead of LIKE, filled by the background migrations (see app/cms/search.py)
+    app.config['BLOG_SEARCH_INDEX'] = os.environ.get('BLOG_SEARCH_INDEX', 'true').lower() == 'true'
+    
+    # Background auto-translation runs; DEEPSEEK_REQUESTS_PER_SECOND caps the API rate (see app/cms/bulk_translate.py)
+    app.config['CMS_TRANSLATION_WORKERS'] = int(os.environ.get('CMS_TRANSLATION_WORKERS', 3))
+    app.config['CMS_TRANSLATION_POLL_SECONDS'] = float(os.environ.get('CMS_TRANSLATION_POLL_SECONDS', 5))
+    app.config['CMS_TRANSLATION_STALE_SECONDS'] = int(os.environ.get('CMS_TRANSLATION_STALE_SECONDS', 600))
+    app.config['CMS_TRANSLATION_MAX_ATTEMPTS'] = int(os.environ.get('CMS_TRANSLATION_MAX_ATTEMPTS', 3))
+    app.config['CMS_TRANSLATION_RETRY_BACKOFF_SECONDS'] = float(os.environ.get('CMS_TRANSLATION_RETRY_BACKOFF_SECONDS', 30))
+    app.config['CMS_TRANSLATION_CANCEL_CHECK_SECONDS'] = float(os.environ.get('CMS_TRANSLATION_CANCEL_CHECK_SECONDS', 1))
+    # false: the web process only queues runs and translation_worker.py translates them
+    app.config['CMS_TRANSLATION_IN_PROCESS_WORKERS'] = os.environ.get('CMS_TRANSLATION_IN_PROCESS_WORKERS', 'true').lower() == 'true'
+    
+    # Generated post content is reused for repeated titles (see app/cms/ai_content.py)
+    app.config['AI_CONTENT_CACHE_ENABLED'] = os.environ.get('AI_CONTENT_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['AI_CONTENT_CACHE_MAX_ENTRIES'] = int(os.environ.get('AI_CONTENT_CACHE_MAX_ENTRIES', 256))
+    app.config['AI_CONTENT_CACHE_TTL_SECONDS'] = int(os.environ.get('AI_CONTENT_CACHE_TTL_SECONDS', 86400))
+    
+    # Languages are served from memory, reloaded after Language commits or this long (see app/cms/languages.py)
+    app.config['LANGUAGE_REGISTRY_TTL_SECONDS'] = int(os.environ.get('LANGUAGE_REGISTRY_TTL_SECONDS', 300))
+    
     # Set server's external URL for image processing responses
     replit_domain = os.environ.get('REPLIT_DOMAIN')
     if replit_domain:
@@ -154,6 +236,19 @@ def create_app():
     if app.config['SERVER_EXTERNAL_URL']:
         app.logger.info(f"Using external URL for image links: {app.config['SERVER_EXTERNAL_URL']}")
     
+    # orjson-backed JSON responses when orjson is installed (see app/utils/json_provider.py)
+    if os.environ.get('JSON_ORJSON', 'true').lower() == 'true':
+        from .utils.json_provider import FastJSONProvider
+        if FastJSONProvider.available:
+            app.json = FastJSONProvider(app)
+            app.logger.info("Using orjson for JSON responses")
+    
+    # Schema migrations at startup (see app/utils/async_migrations.py); false when they are run as a deploy step
+    app.config['DB_MIGRATIONS_ON_STARTUP'] = os.environ.get('DB_MIGRATIONS_ON_STARTUP', 'true').lower() == 'true'
+    
+    if config:
+        app.config.update(config)
+    
     # Initialize extensions with app
     db.init_app(app)
     jwt.init_app(app)
@@ -165,13 +260,20 @@ def create_app():
     
     with app.app_context():
         try:
-            # from .models.models import User # Keep User for auth
-            # from .models.cms import Post, PostTranslation, Tag, Language # Keep CMS for core functionality testing
+            # Every model has to be imported for create_all to know its table
+            from .models import models, cms  # noqa: F401
             db.create_all() # Re-introduce table creation
             app.logger.info("MINIMAL + DB + AUTH_BP + CMS_BP APP: db.create_all() called.")
         except Exception as e:
             app.logger.error(f"MINIMAL + DB + AUTH_BP + CMS_BP APP: Error during db.create_all(): {e}", exc_info=True)
 
+        # create_all does not add columns to existing tables: add the mapped ones now,
+        # then backfill and build missing indexes in the background
+        if app.config['DB_MIGRATIONS_ON_STARTUP']:
+            from .utils.async_migrations import run_schema_migrations, run_migrations_in_background
+            run_schema_migrations(app)
+            run_migrations_in_background(app)
+
         # Register Auth blueprint
         from .auth import bp as auth_bp
         app.register_blueprint(auth_bp)
@@ -179,13 +281,28 @@ def create_app():
         
         # Register CMS blueprint
         from .cms import bp as cms_bp
+        from .cms.response_cache import register_invalidation_hooks
+        from .cms.search import register_index_hooks
+        from .cms.languages import register_refresh_hooks
         app.register_blueprint(cms_bp)
+        register_invalidation_hooks(db.session)
+        register_index_hooks(db.session)
+        register_refresh_hooks(db.session)
         app.logger.info("MINIMAL + DB + AUTH_BP + CMS_BP APP: CMS blueprint registered.")
         
-        # Temporarily comment out other blueprints to reduce memory load
-        # from .matting import bp as matting_bp
-        # app.register_blueprint(matting_bp)
-        # app.logger.info("Matting blueprint SKIPPED (temporarily). ")
+        # Pick up bulk translation runs interrupted by the last restart
+        from .cms.bulk_translate import resume_unfinished_runs
+        resume_unfinished_runs(app)
+        
+        # Register Matting blueprint, also under /api/matting where the frontend calls it
+        from .matting import bp as matting_bp
+        from .matting.jobs import resume_unfinished_jobs
+        app.register_blueprint(matting_bp)
+        app.register_blueprint(matting_bp, url_prefix='/api/matting', name='api_matting')
+        app.logger.info("Matting blueprint registered.")
+        
+        # Pick up matting jobs interrupted by the last restart
+        resume_unfinished_jobs(app)
         
         from .payment import bp as payment_bp
         app.register_blueprint(payment_bp)
@@ -206,30 +323,50 @@ def create_app():
         app.register_blueprint(credits_bp)
         app.logger.info("Credits blueprint registered.")
 
-        # Static file routes
+        # Static file routes (see utils/static_files.py for caching and X-Accel/X-Sendfile)
+        from .utils.static_files import static_files
+        static_files.init_app(app)
+        static_files.add_folder('uploads', app.config['UPLOAD_FOLDER'])
+        static_files.add_folder('cms', os.path.join(app.config['UPLOAD_FOLDER'], 'cms'))
+        static_files.add_folder('processed', app.config['PROCESSED_FOLDER'])
+        static_files.add_folder('variants', app.config['MATTING_DERIVATIVE_FOLDER'])
+        # Blog images are not guaranteed unique names, so they are revalidated daily
+        static_files.add_folder('blog', app.config['BLOG_UPLOAD_FOLDER'], immutable=False, max_age=86400)
+        
         @app.route('/api/uploads/<filename>')
         def serve_upload(filename):
             """Serve uploaded files"""
-            return send_from_directory(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+            return static_files.send('uploads', filename)
             
         @app.route('/api/uploads/cms/<filename>')
         def serve_cms_upload(filename):
             """Serve CMS uploaded files"""
-            cms_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'cms')
-            return send_from_directory(os.path.abspath(cms_folder), filename)
+            return static_files.send('cms', filename)
             
         @app.route('/static/uploads/blog/<path:filename>')
         def serve_blog_upload(filename):
             """Serve blog uploaded files from static folder"""
-            app.logger.info(f"Serving blog image: {filename}")
-            blog_folder = os.path.join(app.static_folder, 'uploads', 'blog')
-            app.logger.info(f"Blog folder path: {blog_folder}")
-            return send_from_directory(os.path.abspath(blog_folder), filename)
+            return static_files.send('blog', filename)
             
         @app.route('/api/processed/<filename>')
         def serve_processed(filename):
-            """Serve processed files"""
-            return send_from_directory(os.path.abspath(app.config['PROCESSED_FOLDER']), filename)
+            """Serve processed files, or a smaller variant with ?variant=thumb|preview|full"""
+            from .matting.derivatives import select_variant, get_derivative_cache, mimetype_for
+            variant, image_format = select_variant(request)
+            if variant is None:
+                return static_files.send('processed', filename)
+            
+            source_path = safe_join(static_files.folder_path('processed'), filename)
+            derivative_path = get_derivative_cache().get(source_path, variant, image_format) if source_path else None
+            if derivative_path is None:
+                return jsonify({"error": "Image not found"}), 404
+            if derivative_path == source_path:
+                response = static_files.send('processed', filename)
+            else:
+                relative_path = os.path.relpath(derivative_path, static_files.folder_path('variants'))
+                response = static_files.send('variants', relative_path, mimetype=mimetype_for(image_format))
+            response.vary.add('Accept')
+            return response
             
         @app.route('/images/placeholder-image.svg')
         @app.route('/api/images/placeholder-image.svg')
@@ -340,12 +477,6 @@ def create_app():
             return jsonify(response), status_code
             
         # Add API route mappings for missing endpoints
-        @app.route('/api/matting/history', methods=['GET'])
-        def api_matting_history():
-            """API route for matting history that maps to the blueprint route"""
-            from .matting.routes import get_matting_history
-            return get_matting_history()
-        
         @app.route('/api/payment/history', methods=['GET'])
         def api_payment_history():
             """API route for payment history"""
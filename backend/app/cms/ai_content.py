@@ -1,12 +1,29 @@
 """
 AI Content Generation for CMS
-This module provides functions to generate blog content using DeepSeek API.
+This module provides functions to generate blog content using DeepSeek API
+(or the provider LLM_PROVIDER names, see app/services/llm_providers.py).
+
+Generated content is cached by (title, language, length, model, prompt
+version), so a repeated title is answered without an API call. Identical
+requests made while one is being generated share that generation instead
+of starting their own. Generations run in a thread of their own and stream
+from the API; callers either wait for the whole content
+(generate_blog_content) or follow it as it arrives (stream_blog_content).
+Each generation and each request is logged as one structured summary line.
 """
 
 import os
 import requests
 import json
 import logging
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+
+from app.services.llm_providers import get_provider
 
 # Setup dedicated logger for this module
 ai_content_logger = logging.getLogger('ai_content_specific')
@@ -54,16 +71,325 @@ except Exception as e:
 
 ai_content_logger.info("Logger for ai_content.py initialized.")
 
-# Configure DeepSeek API
-deepseek_api_key = os.environ.get('DEEPSEEK_API_KEY')
-if not deepseek_api_key:
-    ai_content_logger.warning("DEEPSEEK_API_KEY environment variable not set.")
 
-DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
-# Common model, can be changed if needed e.g., deepseek-coder for code-related content
-DEEPSEEK_MODEL = "deepseek-chat"
+# Part of the cache key; bump it whenever the prompt or the request parameters change
+PROMPT_VERSION = 2
+
+WORD_COUNTS = {
+    "short": "300-500",
+    "medium": "800-1200",
+    "long": "1500-2000"
+}
+
+SYSTEM_PROMPT = ("You are a professional content writer specializing in creating engaging, informative blog posts "
+                 "with proper HTML formatting. Include h2 and h3 headings, paragraphs, and occasionally lists or "
+                 "emphasis where appropriate.")
+
+# How long a caller waits for the API between two pieces of content
+IDLE_TIMEOUT_SECONDS = 130
+
+
+def generation_key(title, language, length, model):
+    """Cache key of a generation; titles differing only in whitespace share it"""
+    key = json.dumps([' '.join(title.split()), language, length, model, PROMPT_VERSION], ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _log_summary(event, **fields):
+    ai_content_logger.info(f"{event} {json.dumps(fields, ensure_ascii=False, default=str)}")
+
+
+class GenerationCache:
+    """In-process LRU of generated content with a TTL"""
+
+    def __init__(self, max_entries=256, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] >= time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['content']
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, content):
+        with self._lock:
+            self._entries[key] = {'content': content, 'expires': time.time() + self.ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
 
-def generate_blog_content(title, language="en", length="medium"):
+class Generation:
+    """
+    One generation, shared by every request for the same key while it runs.
+
+    Attributes:
+        parts: Content received so far, in order
+        error: Error message once it failed
+        done: Whether it finished (successfully or not)
+    """
+
+    def __init__(self, key, title, language, length, model):
+        self.key = key
+        self.title = title
+        self.language = language
+        self.length = length
+        self.model = model
+        self.parts = []
+        self.error = None
+        self.done = False
+        self.waiters = 1
+        self._changed = threading.Condition()
+
+    @classmethod
+    def finished(cls, key, title, language, length, model, content):
+        generation = cls(key, title, language, length, model)
+        generation.parts.append(content)
+        generation.done = True
+        return generation
+
+    def append(self, text):
+        with self._changed:
+            self.parts.append(text)
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.error = error
+            self.done = True
+            self._changed.notify_all()
+
+    def content(self):
+        return ''.join(self.parts)
+
+    def follow(self, idle_timeout=IDLE_TIMEOUT_SECONDS):
+        """
+        Yield content as it arrives, until the generation is done.
+
+        Raises:
+            TimeoutError: Nothing arrived for idle_timeout seconds
+        """
+        index = 0
+        while True:
+            with self._changed:
+                if index == len(self.parts) and not self.done:
+                    self._changed.wait(idle_timeout)
+                    if index == len(self.parts) and not self.done:
+                        raise TimeoutError(f"No content for {idle_timeout}s")
+                new_parts = self.parts[index:]
+                index = len(self.parts)
+                done = self.done
+            for part in new_parts:
+                yield part
+            if done:
+                return
+
+    def result(self, idle_timeout=IDLE_TIMEOUT_SECONDS, cached=False):
+        """Wait for the generation; returns the dict generate_blog_content returns"""
+        try:
+            for _ in self.follow(idle_timeout):
+                pass
+        except TimeoutError as e:
+            return {"success": False, "error": f"Content generation timed out: {e}"}
+        if self.error:
+            return {"success": False, "error": self.error}
+        return {
+            "success": True,
+            "content": self.content(),
+            "language": self.language,  # Reflects requested language, even if prompt was English
+            "title": self.title,
+            "cached": cached
+        }
+
+
+class ContentGenerator:
+    """Cached, coalesced blog content generation through the shared chat completions provider"""
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def start(self, title, language="en", length="medium", refresh=False):
+        """
+        The generation for these arguments: from the cache, the one already running,
+        or a new one started in the background.
+
+        Args:
+            refresh: Generate again even if the content is cached
+
+        Returns:
+            tuple: (Generation, source) where source is 'cache', 'coalesced' or 'api'
+        """
+        provider = get_provider()
+        key = generation_key(title, language, length, provider.model)
+        if self.cache is not None and not refresh:
+            content = self.cache.get(key)
+            if content is not None:
+                return Generation.finished(key, title, language, length, provider.model, content), 'cache'
+
+        with self._lock:
+            generation = self._running.get(key)
+            if generation is not None:
+                generation.waiters += 1
+                return generation, 'coalesced'
+            generation = Generation(key, title, language, length, provider.model)
+            self._running[key] = generation
+        threading.Thread(target=self._run, args=(generation, provider), name='ai-content', daemon=True).start()
+        return generation, 'api'
+
+    def _run(self, generation, provider):
+        started = time.monotonic()
+        summary = {'key': generation.key[:12], 'language': generation.language, 'length': generation.length,
+                   'model': generation.model, 'provider': provider.name}
+        try:
+            error = self._generate(generation, provider, summary)
+            if error is None and self.cache is not None:
+                self.cache.set(generation.key, generation.content())
+        except Exception as e:
+            ai_content_logger.error(f"Content generation failed unexpectedly: {e}", exc_info=True)
+            error = f"An unexpected error occurred: {str(e)}"
+        finally:
+            with self._lock:
+                self._running.pop(generation.key, None)
+        generation.finish(error)
+        summary.update(outcome='error' if error else 'generated', ms=round((time.monotonic() - started) * 1000),
+                       chars=len(generation.content()), waiters=generation.waiters)
+        if error:
+            summary['error'] = error[:300]
+        _log_summary('ai_content.generate', **summary)
+
+    def _generate(self, generation, provider, summary):
+        """Stream the content into generation; returns an error message, or None"""
+        if not provider.is_available():
+            return f"{provider.label} key not configured"
+
+        word_count = WORD_COUNTS.get(generation.length, "800-1200")
+        if generation.language != "en":
+            # Fallback or more sophisticated prompt engineering would be needed for other languages.
+            ai_content_logger.warning(f"Content generation requested for lang '{generation.language}', generating in English.")
+        prompt_text = (f"Write a professional blog post in English with the title '{generation.title}'. "
+                       f"It should be approximately {word_count} words long, well-structured with HTML headings (h2, h3), "
+                       f"paragraphs, and lists where appropriate. Ensure the tone is engaging and informative.")
+        payload = {
+            "model": provider.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt_text}
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.7,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+
+        started = time.monotonic()
+        try:
+            # The read timeout applies between streamed pieces rather than to the whole answer
+            response = provider.post_chat(payload, timeout=(20, 120), stream=True)
+        except requests.exceptions.RequestException as e:
+            return str(e)
+        try:
+            summary['status'] = response.status_code
+            if response.status_code != 200:
+                try:
+                    detail = response.json()
+                except ValueError:
+                    detail = response.text[:500]
+                return f"{provider.label} returned {response.status_code} - Details: {detail}"
+
+            usage = {}
+            if 'text/event-stream' in response.headers.get('Content-Type', ''):
+                for line in response.iter_lines():
+                    if isinstance(line, bytes):
+                        line = line.decode('utf-8')
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+                    usage = event.get("usage") or usage
+                    for choice in event.get("choices") or []:
+                        text = (choice.get("delta") or {}).get("content")
+                        if text:
+                            if not generation.parts:
+                                summary['first_token_ms'] = round((time.monotonic() - started) * 1000)
+                            generation.append(text)
+            else:
+                response_data = response.json()
+                usage = response_data.get("usage") or {}
+                choices = response_data.get("choices") or []
+                text = choices[0].get("message", {}).get("content") if choices else None
+                if text:
+                    generation.append(text)
+            summary['prompt_tokens'] = usage.get("prompt_tokens")
+            summary['completion_tokens'] = usage.get("completion_tokens")
+        except requests.exceptions.RequestException as e:
+            return str(e)
+        except ValueError as e:
+            return f"{provider.label} response could not be parsed: {e}"
+        finally:
+            response.close()
+
+        if not generation.content().strip():
+            return f"{provider.label} response missing content."
+        return None
+
+    def stats(self):
+        with self._lock:
+            running = len(self._running)
+        return {'running': running, 'cache': self.cache.stats() if self.cache is not None else None}
+
+
+_content_generator = None
+_content_generator_lock = threading.Lock()
+
+
+def _config(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+def get_content_generator():
+    """Return the process-wide content generator; AI_CONTENT_CACHE_ENABLED off leaves out the cache"""
+    global _content_generator
+    if _content_generator is None:
+        with _content_generator_lock:
+            if _content_generator is None:
+                cache = None
+                if _config('AI_CONTENT_CACHE_ENABLED', True):
+                    cache = GenerationCache(
+                        max_entries=_config('AI_CONTENT_CACHE_MAX_ENTRIES', 256),
+                        ttl=_config('AI_CONTENT_CACHE_TTL_SECONDS', 86400)
+                    )
+                _content_generator = ContentGenerator(cache)
+    return _content_generator
+
+
+def generate_blog_content(title, language="en", length="medium", refresh=False):
     """
     Generate blog content based on a title using DeepSeek API
     
@@ -71,116 +397,35 @@ def generate_blog_content(title, language="en", length="medium"):
         title (str): The blog post title
         language (str): Language code (e.g., 'en', 'fr')
         length (str): 'short', 'medium', or 'long'
+        refresh (bool): Generate again even if the content is cached
     
     Returns:
-        dict: The generated content or error message
+        dict: The generated content or error message; 'cached' tells whether it came from the cache
     """
-    ai_content_logger.info(f"Entered generate_blog_content for title: '{title}', lang: '{language}', len: '{length}'")
+    started = time.monotonic()
+    generation, source = get_content_generator().start(title, language, length, refresh=refresh)
+    result = generation.result(cached=source == 'cache')
+    _log_summary('ai_content.request', key=generation.key[:12], source=source, mode='blocking',
+                 success=result['success'], ms=round((time.monotonic() - started) * 1000))
+    return result
 
-    if not deepseek_api_key:
-        ai_content_logger.error("DeepSeek API key is missing when function is called.")
-        return {"success": False, "error": "DeepSeek API key not configured"}
-    
-    ai_content_logger.info(f"Using DeepSeek API Key (masked): {deepseek_api_key[:5]}...{deepseek_api_key[-4:] if len(deepseek_api_key) > 9 else ''}")
-
-    word_counts = {
-        "short": "300-500",
-        "medium": "800-1200",
-        "long": "1500-2000"
-    }
-    word_count = word_counts.get(length, "800-1200")
-    
-    if language != "en":
-        ai_content_logger.warning(f"DeepSeek content generation requested for lang '{language}', generating in English.")
-        # Fallback or more sophisticated prompt engineering would be needed for other languages.
-        # For simplicity, this example will proceed with an English-focused prompt.
-
-    prompt_text = f"Write a professional blog post in English with the title '{title}'. It should be approximately {word_count} words long, well-structured with HTML headings (h2, h3), paragraphs, and lists where appropriate. Ensure the tone is engaging and informative."
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {deepseek_api_key}"
-    }
-
-    payload = {
-        "model": DEEPSEEK_MODEL,
-        "messages": [
-            {"role": "system", "content": "You are a professional content writer specializing in creating engaging, informative blog posts with proper HTML formatting. Include h2 and h3 headings, paragraphs, and occasionally lists or emphasis where appropriate."},
-            {"role": "user", "content": prompt_text}
-        ],
-        "max_tokens": 1000, # Further reduced from 2000
-        "temperature": 0.7
-    }
-
-    ai_content_logger.debug(f"Attempting to call DeepSeek API. URL: {DEEPSEEK_API_URL}")
-    ai_content_logger.debug(f"DeepSeek Headers: {json.dumps(headers)}")
-    ai_content_logger.debug(f"DeepSeek Payload: {json.dumps(payload)}")
-    
-    log_entry_final_status = "No attempt made or early exit."
 
+def stream_blog_content(title, language="en", length="medium", refresh=False):
+    """
+    Generate blog content as generate_blog_content does, yielding it as it arrives.
+
+    Yields:
+        dict: {"delta": text} for each piece of content, then one final dict
+            as generate_blog_content returns
+    """
+    started = time.monotonic()
+    generation, source = get_content_generator().start(title, language, length, refresh=refresh)
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=120)
-        ai_content_logger.info(f"DeepSeek API Raw Response Status: {response.status_code}")
-        ai_content_logger.debug(f"DeepSeek API Raw Response Headers: {json.dumps(dict(response.headers))}")
-        ai_content_logger.debug(f"DeepSeek API Raw Response Body: {response.text}")
-        log_entry_final_status = f"Response status: {response.status_code}"
-        
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        
-        response_data = response.json()
-        
-        if response_data.get("choices") and len(response_data["choices"]) > 0:
-            generated_content = response_data["choices"][0].get("message", {}).get("content")
-            if generated_content:
-                log_entry_final_status += " - Successfully got content."
-                ai_content_logger.info("Successfully generated content with DeepSeek.")
-                # ---- Log before returning ----
-                ai_content_logger.info(f"FINAL STATUS before returning success: {log_entry_final_status}")
-                return {
-                    "success": True,
-                    "content": generated_content,
-                    "language": language, # Reflects requested language, even if prompt was English
-                    "title": title
-                }
-            else:
-                log_entry_final_status += " - API response missing content."
-                ai_content_logger.error(f"DeepSeek API response missing content: {response_data}")
-                # ---- Log before returning ----
-                ai_content_logger.info(f"FINAL STATUS before returning error (missing content): {log_entry_final_status}")
-                return {"success": False, "error": "DeepSeek API response missing content."}
-        else:
-            log_entry_final_status += " - API response invalid structure."
-            ai_content_logger.error(f"DeepSeek API response invalid structure: {response_data}")
-            # ---- Log before returning ----
-            ai_content_logger.info(f"FINAL STATUS before returning error (invalid structure): {log_entry_final_status}")
-            return {"success": False, "error": "DeepSeek API response had an invalid structure."}
-        
-    except requests.exceptions.RequestException as e:
-        error_message = str(e)
-        if e.response is not None:
-            try:
-                error_detail = e.response.json()
-                error_message = f"{str(e)} - Details: {error_detail}"
-            except ValueError: # If response is not JSON
-                error_message = f"{str(e)} - Response: {e.response.text}"
-        log_entry_final_status = f"RequestException: {error_message}"
-        ai_content_logger.error(f"DeepSeek API request failed: {error_message}")
-        # ---- Log before returning ----
-        ai_content_logger.info(f"FINAL STATUS before returning error (RequestException): {log_entry_final_status}")
-        return {
-            "success": False,
-            "error": error_message
-        }
-    except Exception as e:
-        log_entry_final_status = f"Generic Exception: {str(e)}"
-        ai_content_logger.error(f"Error processing DeepSeek response: {e}", exc_info=True)
-        # ---- Log before returning ----
-        ai_content_logger.info(f"FINAL STATUS before returning error (Generic Exception): {log_entry_final_status}")
-        return {
-            "success": False,
-            "error": f"An unexpected error occurred: {str(e)}"
-        }
-    finally:
-        # This log should appear even if there's an unhandled exception or early return in try block
-        # though raise_for_status() might bypass it if it jumps to the except block that also returns.
-        ai_content_logger.info(f"Exiting generate_blog_content. Final status before any return: {log_entry_final_status}")
\ No newline at end of file
+        for text in generation.follow():
+            yield {"delta": text}
+        result = generation.result(cached=source == 'cache')
+    except TimeoutError as e:
+        result = {"success": False, "error": f"Content generation timed out: {e}"}
+    _log_summary('ai_content.request', key=generation.key[:12], source=source, mode='stream',
+                 success=result['success'], ms=round((time.monotonic() - started) * 1000))
+    yield result
@@ -0,0 +1,534 @@
+"""
+Background auto-translation of blog posts
+
+/posts/auto-translate-all used to translate every (post, language) pair one
+after another inside the request, up to four DeepSeek calls each, which for
+50 posts x 21 languages takes hours. A run is now recorded as a
+TranslationRun with one TranslationRunItem per pair and the request returns
+at once; a bounded pool of worker threads (CMS_TRANSLATION_WORKERS, the
+global concurrency limit) works the items off while the admin polls the
+run's progress.
+
+Items are checkpoints: each one is claimed atomically, translated, written
+and marked done in its own transaction. A run interrupted by a restart
+resumes on the next start from its pending items, and items left 'running'
+by a dead worker are returned to pending after CMS_TRANSLATION_STALE_SECONDS.
+Calls to DeepSeek share the translation service's token bucket, which
+honours 429 Retry-After (see app/utils/rate_limit.py).
+
+/posts/<id>/auto-translate is a run of one post (TranslationRun.post_id), so
+it no longer holds a web worker for minutes either. A failed item is retried
+after an exponential backoff (CMS_TRANSLATION_RETRY_BACKOFF_SECONDS, doubled
+per attempt). Cancelling a run, or some languages of it, also stops the items
+being translated: the worker's cancel check makes the translation service
+give up at its next API call or streamed token.
+
+Workers run in the web process unless CMS_TRANSLATION_IN_PROCESS_WORKERS is
+false, in which case translation_worker.py runs them in a process of its own;
+either way they find work by polling the database.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select
+
+from app import db
+from app.models.cms import PostTranslation, TranslationRun, TranslationRunItem
+from app.services.translation_service import translation_service, TranslationCancelled
+from .languages import get_language_registry
+
+logger = logging.getLogger('flask.app')
+
+SOURCE_LANGUAGE = 'en'
+
+RUN_RUNNING = 'running'
+RUN_COMPLETED = 'completed'
+RUN_CANCELLED = 'cancelled'
+
+ITEM_PENDING = 'pending'
+ITEM_RUNNING = 'running'
+ITEM_DONE = 'done'
+ITEM_FAILED = 'failed'
+ITEM_SKIPPED = 'skipped'
+ITEM_CANCELLED = 'cancelled'
+
+ITEM_STATUSES = (ITEM_PENDING, ITEM_RUNNING, ITEM_DONE, ITEM_FAILED, ITEM_SKIPPED, ITEM_CANCELLED)
+FINISHED_ITEM_STATUSES = (ITEM_DONE, ITEM_FAILED, ITEM_SKIPPED, ITEM_CANCELLED)
+
+# Longest wait before retrying a failed item
+MAX_RETRY_BACKOFF_SECONDS = 900
+
+def resolve_languages(requested=None):
+    """
+    Target languages of a run, English excluded.
+
+    Returns:
+        dict: language code -> name, in display order
+    """
+    targets = get_language_registry().translation_targets()
+    return {code: name for code, name in targets.items()
+            if code != SOURCE_LANGUAGE and (not requested or code in requested)}
+
+
+def placeholder_fields(english, language_name):
+    """Stand-in translation used in placeholder mode or without an API key"""
+    return {
+        'title': f"[{language_name}] {english['title']}",
+        'content': f"""
+[This is an automatic placeholder for {language_name} translation]
+
+{english['content']}
+
+[End of placeholder translation. This will be replaced with proper {language_name} translation.]
+        """.strip(),
+        'meta_title': f"[{language_name}] {english['meta_title']}" if english['meta_title'] else "",
+        'meta_description': english['meta_description'],
+        'meta_keywords': english['meta_keywords']
+    }
+
+
+def create_run(user_id, languages, post_ids=None, placeholder_mode=True, max_posts=0):
+    """
+    Record a run and its items; the caller commits and then calls submit().
+
+    Pairs whose translation was edited by hand are recorded as skipped.
+
+    Args:
+        languages: dict of target language code -> name (see resolve_languages)
+        post_ids: Only these posts, or every post with English content
+        max_posts: Only the first max_posts posts when > 0
+
+    Returns:
+        TranslationRun: The new (flushed) run
+    """
+    query = db.session.query(PostTranslation.post_id).filter(PostTranslation.language_code == SOURCE_LANGUAGE)
+    if post_ids:
+        query = query.filter(PostTranslation.post_id.in_(post_ids))
+    source_post_ids = [row.post_id for row in query.order_by(PostTranslation.post_id)]
+    if max_posts > 0:
+        source_post_ids = source_post_ids[:max_posts]
+
+    manual = set()
+    if source_post_ids:
+        manual = set(db.session.query(PostTranslation.post_id, PostTranslation.language_code).filter(
+            PostTranslation.post_id.in_(source_post_ids),
+            PostTranslation.language_code.in_(list(languages)),
+            PostTranslation.is_auto_translated.isnot(True)
+        ).all())
+
+    run = TranslationRun(
+        id=str(uuid.uuid4()),
+        status=RUN_RUNNING,
+        requested_by=user_id,
+        options=json.dumps({'placeholder_mode': placeholder_mode, 'languages': languages})
+    )
+    db.session.add(run)
+    db.session.add_all([
+        TranslationRunItem(
+            run_id=run.id,
+            post_id=post_id,
+            language_code=code,
+            status=ITEM_SKIPPED if (post_id, code) in manual else ITEM_PENDING
+        )
+        for post_id in source_post_ids for code in languages
+    ])
+    db.session.flush()
+    return run
+
+
+def run_progress(run, failures=50):
+    """Dict describing a run and how far it has got, for API responses"""
+    counts = dict.fromkeys(ITEM_STATUSES, 0)
+    counts.update(db.session.query(TranslationRunItem.status, func.count()).filter(
+        TranslationRunItem.run_id == run.id
+    ).group_by(TranslationRunItem.status).all())
+    total = sum(counts.values())
+    finished = sum(counts[status] for status in FINISHED_ITEM_STATUSES)
+    failed_items = run.items.filter(
+        TranslationRunItem.status == ITEM_FAILED
+    ).order_by(TranslationRunItem.id).limit(failures).all() if counts[ITEM_FAILED] and failures else []
+    segments, hits, tokens_saved = db.session.query(
+        func.coalesce(func.sum(TranslationRunItem.memory_segments), 0),
+        func.coalesce(func.sum(TranslationRunItem.memory_hits), 0),
+        func.coalesce(func.sum(TranslationRunItem.tokens_saved), 0)
+    ).filter(TranslationRunItem.run_id == run.id).one()
+    options = json.loads(run.options or '{}')
+    progress = {
+        'run_id': run.id,
+        'status': run.status,
+        'post_id': run.post_id,
+        'placeholder_mode': options.get('placeholder_mode'),
+        'languages': list(options.get('languages', {})),
+        'total': total,
+        'counts': counts,
+        'percent': round(100.0 * finished / total, 1) if total else 100.0,
+        'failed_items': [item.to_dict() for item in failed_items],
+        'translation_memory': {
+            'segments': int(segments),
+            'hits': int(hits),
+            'hit_rate': round(hits / segments, 3) if segments else None,
+            'tokens_saved': int(tokens_saved)
+        },
+        'created_at': run.created_at.isoformat() if run.created_at else None,
+        'completed_at': run.completed_at.isoformat() if run.completed_at else None
+    }
+    if run.post_id:
+        # A single post's run is a handful of items; list them all, per language
+        progress['items'] = [item.to_dict() for item in run.items.order_by(TranslationRunItem.id)]
+    return progress
+
+
+def finish_run_if_done(run_id):
+    """Mark a running run completed once none of its items is pending or running"""
+    remaining = TranslationRunItem.query.filter(
+        TranslationRunItem.run_id == run_id,
+        TranslationRunItem.status.in_((ITEM_PENDING, ITEM_RUNNING))
+    ).count()
+    if remaining == 0:
+        count = TranslationRun.query.filter_by(id=run_id, status=RUN_RUNNING).update(
+            {'status': RUN_COMPLETED, 'completed_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if count:
+            logger.info(f"Translation run {run_id} completed")
+
+
+class BulkTranslator:
+    """Bounded worker pool that drains pending TranslationRunItems"""
+
+    def __init__(self, app, workers=3, poll_interval=5.0, stale_after=600, max_attempts=3,
+                 retry_backoff=30, cancel_check_interval=1.0):
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = retry_backoff
+        self.cancel_check_interval = cancel_check_interval
+        self._threads = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self):
+        """Requeue abandoned items and start the worker threads"""
+        if self._threads:
+            return
+        with self.app.app_context():
+            self._requeue_stale_items()
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"translation-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Bulk translator started with {self.workers} workers")
+
+    def wait(self):
+        """Block until stop() is called (see translation_worker.py)"""
+        while not self._stopping.wait(1):
+            pass
+
+    def stop(self, timeout=5):
+        """Signal the workers to exit and wait for them"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self):
+        """Wake the workers after a run was committed or resumed"""
+        self._wakeup.set()
+
+    def _requeue_stale_items(self):
+        """Return items stuck in 'running' by a dead worker to pending"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        try:
+            count = TranslationRunItem.query.filter(
+                TranslationRunItem.status == ITEM_RUNNING,
+                TranslationRunItem.started_at < cutoff
+            ).update({'status': ITEM_PENDING, 'started_at': None}, synchronize_session=False)
+            db.session.commit()
+            if count:
+                logger.warning(f"Requeued {count} stale translation items")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error requeueing stale translation items: {e}")
+
+    def _claim_next(self):
+        """
+        Claim the oldest pending item of a running run, including runs started
+        by other processes; failed items wait for their next_attempt_at.
+
+        Returns:
+            int or None: The claimed item id
+        """
+        while not self._stopping.is_set():
+            item_id = db.session.query(TranslationRunItem.id).join(TranslationRun).filter(
+                TranslationRun.status == RUN_RUNNING,
+                TranslationRunItem.status == ITEM_PENDING,
+                or_(TranslationRunItem.next_attempt_at.is_(None), TranslationRunItem.next_attempt_at <= datetime.utcnow())
+            ).order_by(TranslationRunItem.id).limit(1).scalar()
+            if item_id is None:
+                db.session.commit()
+                return None
+            count = TranslationRunItem.query.filter_by(id=item_id, status=ITEM_PENDING).update(
+                {'status': ITEM_RUNNING, 'started_at': datetime.utcnow(),
+                 'attempts': TranslationRunItem.attempts + 1},
+                synchronize_session=False
+            )
+            db.session.commit()
+            if count == 1:
+                return item_id
+        return None
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            item_id = None
+            with self.app.app_context():
+                try:
+                    item_id = self._claim_next()
+                    if item_id:
+                        self._run(item_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Translation worker error for item {item_id}: {e}", exc_info=True)
+                    if item_id:
+                        self._record_failure(item_id, 'Internal error while translating')
+                finally:
+                    db.session.remove()
+            if item_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _record_failure(self, item_id, error):
+        """Return a failed item to pending, after a backoff, until it has used up its attempts"""
+        try:
+            item = TranslationRunItem.query.get(item_id)
+            if item is None or item.status == ITEM_CANCELLED:
+                return
+            item.error = error[:255]
+            item.started_at = None
+            if item.attempts < self.max_attempts:
+                backoff = min(self.retry_backoff * 2 ** max(0, item.attempts - 1), MAX_RETRY_BACKOFF_SECONDS)
+                item.status = ITEM_PENDING
+                item.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+                logger.info(f"Translation item {item_id} failed ({error}), retrying in {backoff:.0f}s")
+            else:
+                item.status = ITEM_FAILED
+                item.completed_at = datetime.utcnow()
+            db.session.commit()
+            if item.status == ITEM_FAILED:
+                finish_run_if_done(item.run_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not record failure of translation item {item_id}: {e}")
+
+    def _keep_translated_fields(self, item_id, translated, language_name):
+        """
+        The content failed but the other fields were translated: store them on an
+        auto-translated translation that already exists, keeping its content, and
+        retry the item for the content. Without a translation to keep the content
+        of there is nothing to store them on.
+        """
+        item = TranslationRunItem.query.get(item_id)
+        existing = PostTranslation.query.filter_by(post_id=item.post_id, language_code=item.language_code).first()
+        if item.status != ITEM_CANCELLED and existing is not None and existing.is_auto_translated:
+            existing.title = translated.get('title', '')
+            existing.meta_title = translated.get('meta_title', '')
+            existing.meta_description = translated.get('meta_description', '')
+            existing.meta_keywords = translated.get('meta_keywords', '')
+            db.session.commit()
+            self._record_failure(item_id, f"Content translation to {language_name} failed; title and meta updated")
+        else:
+            self._record_failure(item_id, f"Content translation to {language_name} failed")
+
+    def _record_cancelled(self, item_id):
+        """An item stopped mid-translation: cancelled languages stay cancelled, items of a cancelled run wait for resume"""
+        try:
+            item = TranslationRunItem.query.get(item_id)
+            if item is None:
+                return
+            if item.status == ITEM_RUNNING:
+                # The run was cancelled; this attempt does not count
+                item.status = ITEM_PENDING
+                item.started_at = None
+                item.attempts = max(0, item.attempts - 1)
+            db.session.commit()
+            logger.info(f"Translation item {item_id} ({item.language_code}) cancelled mid-translation")
+            finish_run_if_done(item.run_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not record cancellation of translation item {item_id}: {e}")
+
+    def _cancel_check(self, item_id):
+        """
+        A cancel check for the translation service: True once the item or its run
+        is no longer running. Reads the database at most every cancel_check_interval
+        seconds, on a connection of its own, so chunk threads may call it too.
+        """
+        engine = db.engine
+        runs, items = TranslationRun.__table__, TranslationRunItem.__table__
+        query = select(runs.c.status, items.c.status).select_from(
+            items.join(runs, items.c.run_id == runs.c.id)
+        ).where(items.c.id == item_id)
+        lock = threading.Lock()
+        state = {'checked': time.monotonic(), 'cancelled': False}
+
+        def check():
+            with lock:
+                if not state['cancelled'] and time.monotonic() - state['checked'] >= self.cancel_check_interval:
+                    state['checked'] = time.monotonic()
+                    try:
+                        with engine.connect() as connection:
+                            row = connection.execute(query).first()
+                        state['cancelled'] = row is None or row[0] != RUN_RUNNING or row[1] != ITEM_RUNNING
+                    except Exception as e:
+                        logger.warning(f"Cancel check for translation item {item_id} failed: {e}")
+                return state['cancelled'] or self._stopping.is_set()
+        return check
+
+    def _run(self, item_id):
+        """Translate one claimed (post, language) pair and write it"""
+        item = TranslationRunItem.query.get(item_id)
+        options = json.loads(item.run.options or '{}')
+        language_name = options.get('languages', {}).get(item.language_code, item.language_code)
+        run_id, post_id, language_code = item.run_id, item.post_id, item.language_code
+
+        english = PostTranslation.query.filter_by(post_id=post_id, language_code=SOURCE_LANGUAGE).first()
+        existing = PostTranslation.query.filter_by(post_id=post_id, language_code=language_code).first()
+        if english is None or (existing and not existing.is_auto_translated):
+            item.status = ITEM_SKIPPED
+            item.error = 'No English translation' if english is None else 'Edited by hand'
+            item.completed_at = datetime.utcnow()
+            db.session.commit()
+            finish_run_if_done(run_id)
+            return
+
+        source = {
+            'title': english.title,
+            'content': english.content,
+            'meta_title': english.meta_title,
+            'meta_description': english.meta_description,
+            'meta_keywords': english.meta_keywords
+        }
+        # Give the connection back to the pool for the duration of the API calls
+        db.session.commit()
+
+        translated = None
+        usage = {}
+        if not options.get('placeholder_mode') and translation_service.is_available():
+            from_lang_name = translation_service.get_language_name(SOURCE_LANGUAGE)
+            translation_service.set_cancel_check(self._cancel_check(item_id))
+            try:
+                translated = translation_service.translate_post_fields_with_lang_names(
+                    source,
+                    from_lang_code=SOURCE_LANGUAGE,
+                    to_lang_code=language_code,
+                    from_lang_name=from_lang_name,
+                    to_lang_name=language_name,
+                    partial=True
+                )
+            except TranslationCancelled:
+                self._record_cancelled(item_id)
+                return
+            finally:
+                translation_service.set_cancel_check(None)
+            usage = translation_service.last_usage() or {}
+            if translated is None:
+                self._record_failure(item_id, f"Translation to {language_name} failed")
+                return
+            if 'content' not in translated:
+                self._keep_translated_fields(item_id, translated, language_name)
+                return
+        placeholder = translated is None
+        if placeholder:
+            translated = placeholder_fields(source, language_name)
+
+        # Re-read: the translation may have been edited, or the language cancelled, while the API was busy
+        if item.status == ITEM_CANCELLED:
+            finish_run_if_done(run_id)
+            return
+        existing = PostTranslation.query.filter_by(post_id=post_id, language_code=language_code).first()
+        if existing and not existing.is_auto_translated:
+            item.status = ITEM_SKIPPED
+            item.error = 'Edited by hand'
+        else:
+            if existing is None:
+                existing = PostTranslation(post_id=post_id, language_code=language_code)
+                db.session.add(existing)
+            existing.title = translated.get('title', '')
+            existing.content = translated.get('content', '')
+            existing.meta_title = translated.get('meta_title', '')
+            existing.meta_description = translated.get('meta_description', '')
+            existing.meta_keywords = translated.get('meta_keywords', '')
+            existing.is_auto_translated = True
+            item.status = ITEM_DONE
+            item.error = None
+            item.placeholder = placeholder
+            item.memory_segments = usage.get('memory_segments', 0)
+            item.memory_hits = usage.get('memory_hits', 0)
+            item.tokens_saved = usage.get('tokens_saved', 0)
+        item.completed_at = datetime.utcnow()
+        db.session.commit()
+        finish_run_if_done(run_id)
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+
+def build_bulk_translator(app):
+    """A BulkTranslator configured from the app config, not started"""
+    return BulkTranslator(
+        app,
+        workers=app.config.get('CMS_TRANSLATION_WORKERS', 3),
+        poll_interval=app.config.get('CMS_TRANSLATION_POLL_SECONDS', 5),
+        stale_after=app.config.get('CMS_TRANSLATION_STALE_SECONDS', 600),
+        max_attempts=app.config.get('CMS_TRANSLATION_MAX_ATTEMPTS', 3),
+        retry_backoff=app.config.get('CMS_TRANSLATION_RETRY_BACKOFF_SECONDS', 30),
+        cancel_check_interval=app.config.get('CMS_TRANSLATION_CANCEL_CHECK_SECONDS', 1.0)
+    )
+
+
+def get_bulk_translator(app=None):
+    """
+    Return the process-wide bulk translator, starting its workers on first use.
+
+    With CMS_TRANSLATION_IN_PROCESS_WORKERS false it is never started and submit()
+    does nothing; translation_worker.py picks the work up from the database.
+    """
+    global _translator
+    if _translator is None:
+        with _translator_lock:
+            if _translator is None:
+                if app is None:
+                    from flask import current_app
+                    app = current_app._get_current_object()
+                translator = build_bulk_translator(app)
+                if app.config.get('CMS_TRANSLATION_IN_PROCESS_WORKERS', True):
+                    translator.start()
+                _translator = translator
+    return _translator
+
+
+def resume_unfinished_runs(app):
+    """Start the workers at boot if a run was interrupted by the previous process"""
+    if not app.config.get('CMS_TRANSLATION_IN_PROCESS_WORKERS', True):
+        return
+    try:
+        unfinished = TranslationRun.query.filter_by(status=RUN_RUNNING).count()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Could not check for unfinished translation runs: {e}")
+        return
+    if unfinished:
+        logger.info(f"Resuming {unfinished} unfinished translation runs")
+        get_bulk_translator(app)
@@ -0,0 +1,216 @@
+"""
+Process-wide registry of CMS languages
+
+Language rows were read with Language.query on every call (the language
+endpoints, blog post pages, post updates, translation runs) and the
+names, flags and website language codes were repeated in several
+hardcoded lists. The registry loads cms_languages once into an immutable
+snapshot that every caller reads without a database round trip:
+
+    codes, names, is_default, is_active  - from cms_languages
+    flag, rtl, website                   - from the built-in tables below
+
+The snapshot is rebuilt on the next read after a Language row is committed
+through the app session (admin writes, seeding) and at the latest every
+LANGUAGE_REGISTRY_TTL_SECONDS, which also bounds how long other worker
+processes serve a stale list. While cms_languages is empty or unreadable
+the built-in website languages are served instead, as the endpoints did.
+"""
+import logging
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+
+from app import db
+from app.models.cms import Language, LANGUAGE_FLAGS, DEFAULT_FLAG
+
+logger = logging.getLogger('flask.app')
+
+# The languages of the website frontend (see TranslationModal.jsx), in display order
+WEBSITE_LANGUAGES = (
+    ('en', 'English'), ('fr', 'French'), ('es', 'Spanish'), ('de', 'German'), ('it', 'Italian'),
+    ('pt', 'Portuguese'), ('ru', 'Russian'), ('ja', 'Japanese'), ('ko', 'Korean'), ('zh-TW', 'Traditional Chinese'),
+    ('ar', 'Arabic'), ('nl', 'Dutch'), ('sv', 'Swedish'), ('tr', 'Turkish'), ('pl', 'Polish'),
+    ('hu', 'Hungarian'), ('el', 'Greek'), ('no', 'Norwegian'), ('vi', 'Vietnamese'), ('th', 'Thai'),
+    ('id', 'Indonesian'), ('ms', 'Malay')
+)
+WEBSITE_LANGUAGE_CODES = frozenset(code for code, _ in WEBSITE_LANGUAGES)
+
+# Names of languages that may be translated to without being website languages
+KNOWN_LANGUAGE_NAMES = dict(WEBSITE_LANGUAGES, **{'zh-CN': 'Simplified Chinese', 'hi': 'Hindi', 'cs': 'Czech'})
+
+# Translation targets while the database has fewer than MIN_STORED_TARGETS active languages
+FALLBACK_TRANSLATION_CODES = (
+    'en', 'fr', 'es', 'de', 'it', 'pt', 'nl', 'ru', 'zh-CN', 'zh-TW', 'ja',
+    'ko', 'ar', 'hi', 'id', 'ms', 'th', 'vi', 'tr', 'pl', 'cs', 'sv'
+)
+MIN_STORED_TARGETS = 10
+
+RTL_LANGUAGES = frozenset(('ar', 'he', 'ur', 'fa'))
+
+
+def _entry(code, name, is_default, is_active):
+    return {
+        'code': code,
+        'name': name,
+        'is_default': bool(is_default),
+        'is_active': bool(is_active),
+        'flag': LANGUAGE_FLAGS.get(code, DEFAULT_FLAG),
+        'rtl': code in RTL_LANGUAGES,
+        'website': code in WEBSITE_LANGUAGE_CODES
+    }
+
+
+class LanguageSnapshot:
+    """
+    One load of the languages; never changed once built.
+
+    Attributes:
+        languages: Entries in code order (built-in order when not stored)
+        stored: Whether they came from cms_languages
+    """
+
+    def __init__(self, languages, stored, ttl):
+        self.languages = tuple(languages)
+        self.by_code = {language['code']: language for language in self.languages}
+        self.stored = stored
+        self.expires = time.monotonic() + ttl
+
+    @classmethod
+    def builtin(cls, ttl):
+        return cls([_entry(code, name, code == 'en', True) for code, name in WEBSITE_LANGUAGES], False, ttl)
+
+
+class LanguageRegistry:
+    """The current LanguageSnapshot, reloaded when invalidated or expired"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.loads = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.expires > time.monotonic():
+            return snapshot
+        if not has_app_context():
+            # Translation threads without an app: keep serving what was loaded last
+            return snapshot or LanguageSnapshot.builtin(0)
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.expires <= time.monotonic():
+                snapshot = self._load(previous=snapshot)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _load(self, previous=None):
+        table = Language.__table__
+        try:
+            # Own connection, so a read never flushes or commits the caller's session
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(table.c.code, table.c.name, table.c.is_default, table.c.is_active).order_by(table.c.code)
+                ).all()
+        except Exception as e:
+            logger.error(f"Language registry: could not load languages: {e}")
+            # Try again soon rather than serving the built-in list for a whole TTL
+            return LanguageSnapshot(previous.languages, previous.stored, min(self.ttl, 30)) if previous \
+                else LanguageSnapshot.builtin(min(self.ttl, 30))
+        self.loads += 1
+        if not rows:
+            logger.info("Language registry: no languages in the database, using the built-in website languages")
+            return LanguageSnapshot.builtin(self.ttl)
+        return LanguageSnapshot([_entry(*row) for row in rows], True, self.ttl)
+
+    def invalidate(self):
+        """Reload on the next read"""
+        self._snapshot = None
+
+    # Lookups
+
+    def all(self):
+        return list(self.snapshot().languages)
+
+    def get(self, code):
+        return self.snapshot().by_code.get(code)
+
+    def is_stored(self, code):
+        """Whether code is a row of cms_languages"""
+        snapshot = self.snapshot()
+        return snapshot.stored and code in snapshot.by_code
+
+    def name(self, code, default=None):
+        language = self.snapshot().by_code.get(code)
+        if language is not None:
+            return language['name']
+        return KNOWN_LANGUAGE_NAMES.get(code, default)
+
+    def flag(self, code):
+        return LANGUAGE_FLAGS.get(code, DEFAULT_FLAG)
+
+    def is_rtl(self, code):
+        return code in RTL_LANGUAGES
+
+    def active(self):
+        return [language for language in self.snapshot().languages if language['is_active']]
+
+    def website_languages(self):
+        return [language for language in self.snapshot().languages if language['website']]
+
+    def translation_targets(self):
+        """
+        Languages runs translate to, code -> name, in display order (English included).
+
+        The active stored languages, or FALLBACK_TRANSLATION_CODES while fewer than
+        MIN_STORED_TARGETS are stored and active.
+        """
+        snapshot = self.snapshot()
+        active = [language for language in snapshot.languages if language['is_active']] if snapshot.stored else []
+        if len(active) < MIN_STORED_TARGETS:
+            logger.info(f"Using predefined language list instead of database (only {len(active)} found in db)")
+            names = {language['code']: language['name'] for language in active}
+            return {code: names.get(code) or KNOWN_LANGUAGE_NAMES.get(code, code) for code in FALLBACK_TRANSLATION_CODES}
+        return {language['code']: language['name'] for language in active}
+
+
+_language_registry = None
+_language_registry_lock = threading.Lock()
+
+
+def get_language_registry():
+    """Return the process-wide language registry"""
+    global _language_registry
+    if _language_registry is None:
+        with _language_registry_lock:
+            if _language_registry is None:
+                ttl = current_app.config.get('LANGUAGE_REGISTRY_TTL_SECONDS', 300) if has_app_context() else 300
+                _language_registry = LanguageRegistry(ttl=ttl)
+    return _language_registry
+
+
+# Invalidation from session events
+
+def _note_language_changes(session, flush_context):
+    if any(isinstance(instance, Language) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info['language_registry_stale'] = True
+
+
+def _invalidate_committed(session):
+    if session.info.pop('language_registry_stale', None) and _language_registry is not None:
+        _language_registry.invalidate()
+
+
+def _discard_changes(session, previous_transaction=None):
+    session.info.pop('language_registry_stale', None)
+
+
+def register_refresh_hooks(session):
+    """Reload the registry whenever Language rows are committed through session"""
+    if event.contains(session, 'after_commit', _invalidate_committed):
+        return
+    event.listen(session, 'after_flush', _note_language_changes)
+    event.listen(session, 'after_commit', _invalidate_committed)
+    event.listen(session, 'after_soft_rollback', _discard_changes)
@@ -0,0 +1,207 @@
+"""
+Read-side queries for the public blog
+
+The listing used to call Post.to_dict() on each post of a page, which lazily
+loaded every translation (with its full content), the media and the tags
+one post at a time. list_published_posts() instead runs a fixed number of
+queries per page, however many posts or languages there are:
+
+    1. count of matching posts (capped when paging by cursor)
+    2. the page of posts
+    3. their tags            (selectinload)
+    4. their media           (selectinload)
+    5. which languages each post has, with their titles
+    6. the requested-language and English translations, with only a
+       preview of the content
+    7. a first-available translation, only if some post has neither
+
+The dictionaries returned have the same shape as Post.to_dict(language=...),
+except that translation 'content' is cut to LIST_CONTENT_PREVIEW_CHARS
+characters and flagged with 'content_truncated', and the stored 'excerpt',
+'word_count' and 'reading_time' are included. Without a language each post
+also carries 'translations', a summary (id, language_code, title,
+is_auto_translated) of all its translations for the admin post list.
+
+A search is answered from the full-text index (see cms/search.py) when
+BLOG_SEARCH_INDEX is on and the index has been filled: posts come back in
+relevance order and each carries a 'search' dict with its score and a
+highlighted snippet. Otherwise the LIKE filter of published_posts_query is used.
+"""
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models.cms import Post, PostTranslation, Tag
+from app.utils.pagination import keyset_paginate, cursor_for
+from .search import search_posts, snippets
+from .serializers import (
+    FALLBACK_LANGUAGE, LIST_CONTENT_PREVIEW_CHARS, SHAPE_LIST, chosen_translation_dict, serialize_post_fields
+)
+
+# Sort key of the listing, for cursor pagination
+LIST_KEYS = (Post.published_at, Post.id)
+
+_TRANSLATION_COLUMNS = (
+    PostTranslation.id,
+    PostTranslation.post_id,
+    PostTranslation.language_code,
+    PostTranslation.title,
+    PostTranslation.excerpt,
+    PostTranslation.word_count,
+    PostTranslation.reading_time,
+    PostTranslation.meta_title,
+    PostTranslation.meta_description,
+    PostTranslation.meta_keywords,
+    PostTranslation.is_auto_translated,
+    PostTranslation.last_updated_at,
+)
+
+# Every translation of a post, as listed without a language
+_SUMMARY_COLUMNS = (
+    PostTranslation.id,
+    PostTranslation.post_id,
+    PostTranslation.language_code,
+    PostTranslation.title,
+    PostTranslation.is_auto_translated,
+)
+
+
+def published_posts_query(tag=None, search=None):
+    """Published posts filtered by tag slug and a title/content search term"""
+    query = Post.query.filter(Post.status == 'published')
+    if tag:
+        query = query.join(Post.tags).filter(Tag.slug == tag)
+    if search:
+        search_term = f"%{search}%"
+        # EXISTS instead of a join so posts with several matching translations appear once
+        matching = db.session.query(PostTranslation.id).filter(
+            PostTranslation.post_id == Post.id,
+            db.or_(PostTranslation.title.like(search_term), PostTranslation.content.like(search_term))
+        ).exists()
+        query = query.filter(matching)
+    return query
+
+
+def _translation_rows(post_ids, languages=None):
+    """Translation rows for the given posts with a content preview instead of the full body"""
+    preview = func.substr(PostTranslation.content, 1, LIST_CONTENT_PREVIEW_CHARS + 1).label('content')
+    query = db.session.query(*_TRANSLATION_COLUMNS, preview).filter(PostTranslation.post_id.in_(post_ids))
+    if languages is not None:
+        query = query.filter(PostTranslation.language_code.in_(languages))
+    return query.order_by(PostTranslation.post_id, PostTranslation.id).all()
+
+
+def list_published_posts(language=None, tag=None, search=None, page=1, per_page=10, cursor=None):
+    """
+    One page of published posts for the public blog listing.
+
+    With a cursor the page is read by keyset (see app/utils/pagination.py)
+    and the total is approximate; otherwise page is used with OFFSET and an
+    exact total. Either way next_cursor continues after the page.
+
+    Args:
+        language: Preferred translation (default English); English, then the
+            first available translation, is used when a post lacks it
+        tag: Tag slug to filter on
+        search: Substring to look for in translation titles and content
+        page: 1-based page number
+        per_page: Posts per page
+        cursor: next_cursor of the previous page
+
+    Returns:
+        tuple: (list of post dicts, total number of matching posts, is the total
+            an estimate, next_cursor or None); search results are ranked and
+            have no cursor
+
+    Raises:
+        InvalidCursor: If cursor cannot be decoded
+    """
+    if search and current_app.config.get('BLOG_SEARCH_INDEX', True):
+        ranked = search_posts(search, language=language, tag=tag, page=page, per_page=per_page)
+        if ranked is not None:
+            posts, total = _search_results(ranked, search, language)
+            return posts, total, False, None
+
+    query = published_posts_query(tag, search).options(selectinload(Post.tags), selectinload(Post.media))
+
+    if cursor or page == 1:
+        result = keyset_paginate(query, LIST_KEYS, per_page, cursor=cursor,
+                                 total='approximate' if cursor else 'exact')
+        return _post_dicts(result.items, language), result.total, result.total_is_estimate, result.next_cursor
+
+    # Deep OFFSET pages are kept for existing page-number links
+    total = query.order_by(None).count()
+    posts = (query.order_by(*(key.desc() for key in LIST_KEYS))
+             .offset((page - 1) * per_page)
+             .limit(per_page)
+             .all())
+    next_cursor = cursor_for(posts[-1], LIST_KEYS) if posts and page * per_page < total else None
+    return _post_dicts(posts, language), total, False, next_cursor
+
+
+def _search_results(ranked, search, language):
+    """Post dicts for a page of search hits, in relevance order"""
+    hits, total = ranked
+    if not hits:
+        return [], total
+    rank = {hit.post_id: position for position, hit in enumerate(hits)}
+    posts = (Post.query.options(selectinload(Post.tags), selectinload(Post.media))
+             .filter(Post.id.in_(rank))
+             .all())
+    posts.sort(key=lambda post: rank[post.id])
+
+    result = _post_dicts(posts, language)
+    found = snippets(hits, search)
+    for post in result:
+        post['search'] = found.get(post['id'])
+    return result, total
+
+
+def _post_dicts(posts, language):
+    """List dicts for a page of posts, with their tags and media already loaded"""
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+    available = {post_id: [] for post_id in post_ids}
+    for row in (db.session.query(*_SUMMARY_COLUMNS)
+                .filter(PostTranslation.post_id.in_(post_ids))
+                .order_by(PostTranslation.post_id, PostTranslation.id)):
+        available[row.post_id].append(row)
+
+    wanted = [code for code in (language, FALLBACK_LANGUAGE) if code]
+    chosen = {}
+    for row in _translation_rows(post_ids, wanted):
+        current = chosen.get(row.post_id)
+        # Requested language beats English; rows are ordered, so keep the first match per rank
+        if current is None or (row.language_code == language and current.language_code != language):
+            chosen[row.post_id] = row
+
+    missing = [post_id for post_id in post_ids if post_id not in chosen and available[post_id]]
+    if missing:
+        for row in _translation_rows(missing):
+            chosen.setdefault(row.post_id, row)
+
+    requested = language or FALLBACK_LANGUAGE
+    result = []
+    for post in posts:
+        row = chosen.get(post.id)
+        post_dict = dict(
+            serialize_post_fields(post),
+            translation=chosen_translation_dict(row, row.language_code == requested, SHAPE_LIST) if row else None,
+            available_languages=[summary.language_code for summary in available[post.id]]
+        )
+        if language is None:
+            # The admin "All Languages" view lists one row per translation
+            post_dict['translations'] = [
+                {
+                    'id': summary.id,
+                    'language_code': summary.language_code,
+                    'title': summary.title,
+                    'is_auto_translated': summary.is_auto_translated,
+                }
+                for summary in available[post.id]
+            ]
+        result.append(post_dict)
+    return result
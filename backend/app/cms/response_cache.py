@@ -0,0 +1,344 @@
+"""
+Response cache for the public blog and language endpoints
+
+/api/cms/blog, /api/cms/blog/<slug>, /api/cms/languages and
+/api/cms/website-languages are read far more often than the CMS is edited,
+so their JSON bodies are cached by endpoint and query string.
+
+Invalidation is by tag. A view labels its response with what it depends on,
+e.g. 'post:12', 'post:12:lang:fr', 'slug:my-post', 'blog-list', 'languages'.
+Every tag has a version number; an entry remembers the versions it was
+built with and is treated as a miss once any of them has moved on.
+
+Versions are bumped from SQLAlchemy session events, so every code path that
+commits a Post, PostTranslation, PostMedia, Tag or Language change (admin
+endpoints, the auto-translation threads, scripts) invalidates exactly the
+entries built from that row:
+
+    translation added/removed    post:<id>              (available_languages changes)
+    translation edited           post:<id>:lang:<code>
+    post edited                  post:<id>, slug:<old>, slug:<new>
+    post published/unpublished,
+    re-dated, retagged, created
+    or deleted                   + blog-list
+    any post or translation      blog-search            (search results may change)
+    media                        post:<id>
+    tag                          blog
+    language                     languages
+
+Tiers:
+- an in-process LRU (RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+- an optional shared Redis tier (RESPONSE_CACHE_REDIS_URL) holding entries and
+  tag versions, so an edit handled by one worker invalidates all of them
+
+Hits and misses carry an ETag; a matching If-None-Match gets a 304.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, g, current_app
+from sqlalchemy import event, inspect
+
+logger = logging.getLogger('flask.app')
+
+TAG_BLOG = 'blog'
+TAG_BLOG_LIST = 'blog-list'
+TAG_BLOG_SEARCH = 'blog-search'
+TAG_LANGUAGES = 'languages'
+
+# Global generation: bumped on every invalidation so a response built while
+# an invalidation happened is not stored with the new versions
+_GENERATION = '__generation__'
+
+
+def post_tag(post_id, language=None):
+    return f"post:{post_id}:lang:{language}" if language else f"post:{post_id}"
+
+
+def slug_tag(slug):
+    return f"slug:{slug}"
+
+
+class ResponseCache:
+    """In-process LRU of rendered responses with an optional Redis tier"""
+
+    def __init__(self, max_entries=512, ttl=300, redis_client=None, key_prefix='imagenwiz:cms:'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    # Tag versions
+
+    def _version_key(self, tag):
+        return f"{self.key_prefix}tag:{tag}"
+
+    def versions(self, tags):
+        """Current version of each tag"""
+        tags = list(tags)
+        if self.redis is not None:
+            try:
+                values = self.redis.mget([self._version_key(tag) for tag in tags]) if tags else []
+                return {tag: int(value or 0) for tag, value in zip(tags, values)}
+            except Exception as e:
+                logger.warning(f"Response cache: shared tier unavailable, using local versions: {e}")
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def invalidate(self, *tags):
+        """Bump the given tags; every entry built from them becomes stale"""
+        tags = set(tags) | {_GENERATION}
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+        if self.redis is not None:
+            try:
+                pipeline = self.redis.pipeline()
+                for tag in tags:
+                    pipeline.incr(self._version_key(tag))
+                pipeline.execute()
+            except Exception as e:
+                logger.warning(f"Response cache: could not invalidate shared tier: {e}")
+
+    def generation(self):
+        return self.versions([_GENERATION])[_GENERATION]
+
+    # Entries
+
+    def _is_fresh(self, entry):
+        if entry['expires'] < time.time():
+            return False
+        return self.versions(entry['tags'].keys()) == entry['tags']
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None and self.redis is not None:
+            try:
+                raw = self.redis.get(self.key_prefix + key)
+                entry = json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Response cache: shared tier read failed: {e}")
+                entry = None
+            if entry is not None:
+                self._store_local(key, entry)
+
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            return entry
+        if entry is not None:
+            with self._lock:
+                self._entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    def _store_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key, body, mimetype, tags, generation):
+        """
+        Store a response body under key.
+
+        Args:
+            generation: generation() read before the response was built; if an
+                invalidation happened since, the body may be stale and is not stored
+
+        Returns:
+            dict or None: The stored entry
+        """
+        versions = self.versions(set(tags) | {_GENERATION})
+        if versions.pop(_GENERATION) != generation:
+            return None
+        entry = {
+            'body': body.decode('utf-8'),
+            'mimetype': mimetype,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'tags': versions,
+            'expires': time.time() + self.ttl
+        }
+        self._store_local(key, entry)
+        if self.redis is not None:
+            try:
+                self.redis.setex(self.key_prefix + key, self.ttl, json.dumps(entry))
+            except Exception as e:
+                logger.warning(f"Response cache: shared tier write failed: {e}")
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'shared_tier': self.redis is not None
+        }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache(app=None):
+    """Return the process-wide response cache, or None when RESPONSE_CACHE_ENABLED is off"""
+    global _response_cache
+    app = app or current_app
+    if not app.config.get('RESPONSE_CACHE_ENABLED', True):
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                redis_client = None
+                redis_url = app.config.get('RESPONSE_CACHE_REDIS_URL')
+                if redis_url:
+                    try:
+                        import redis
+                        redis_client = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+                    except ImportError:
+                        logger.warning("RESPONSE_CACHE_REDIS_URL is set but the redis package is not installed; "
+                                       "using the in-process cache only")
+                _response_cache = ResponseCache(
+                    max_entries=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 512),
+                    ttl=app.config.get('RESPONSE_CACHE_TTL_SECONDS', 300),
+                    redis_client=redis_client
+                )
+    return _response_cache
+
+
+def add_cache_tags(*tags):
+    """Label the response being built by a cached view with what it depends on"""
+    cache_tags = g.get('response_cache_tags')
+    if cache_tags is not None:
+        cache_tags.update(tags)
+
+
+def _cache_key(arg_names, view_args):
+    parts = [request.endpoint]
+    parts.extend(f"{name}={value}" for name, value in sorted(view_args.items()))
+    parts.extend(f"{name}={request.args.get(name, '')}" for name in arg_names)
+    return '|'.join(parts)
+
+
+def _entry_response(entry):
+    response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+    response.set_etag(entry['etag'])
+    response.headers['X-Cache'] = 'HIT'
+    return response.make_conditional(request)
+
+
+def cached_response(*arg_names, tags=()):
+    """
+    Cache a public GET view's 200 JSON responses.
+
+    Args:
+        *arg_names: Query parameters that are part of the cache key
+        tags: Tags every response of this view depends on; views add
+            row-specific ones with add_cache_tags()
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = _cache_key(arg_names, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                return _entry_response(entry)
+
+            generation = cache.generation()
+            g.response_cache_tags = set(tags)
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.mimetype != 'application/json':
+                return response
+
+            entry = cache.set(key, response.get_data(), response.mimetype, g.response_cache_tags, generation)
+            response.set_etag(entry['etag'] if entry else hashlib.sha1(response.get_data()).hexdigest())
+            response.headers['X-Cache'] = 'MISS'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+# Invalidation from session events
+
+def _changed(instance, *attributes):
+    state = inspect(instance)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+def _tags_for(instance, deleted=False, new=False):
+    from app.models.cms import Post, PostTranslation, PostMedia, Tag, Language
+
+    if isinstance(instance, Post):
+        tags = {post_tag(instance.id), slug_tag(instance.slug), TAG_BLOG_SEARCH}
+        history = inspect(instance).attrs.slug.history
+        tags.update(slug_tag(slug) for slug in history.deleted or ())
+        if new or deleted or _changed(instance, 'status', 'published_at', 'tags'):
+            tags.add(TAG_BLOG_LIST)
+        return tags
+    if isinstance(instance, PostTranslation):
+        tags = {TAG_BLOG_SEARCH, post_tag(instance.post_id, instance.language_code)}
+        if new or deleted or _changed(instance, 'language_code'):
+            tags.add(post_tag(instance.post_id))
+        return tags
+    if isinstance(instance, PostMedia):
+        return {post_tag(instance.post_id)}
+    if isinstance(instance, Tag):
+        return {TAG_BLOG}
+    if isinstance(instance, Language):
+        return {TAG_LANGUAGES}
+    return set()
+
+
+def _collect_tags(session, flush_context):
+    pending = session.info.setdefault('response_cache_tags', set())
+    for instance in session.new:
+        pending.update(_tags_for(instance, new=True))
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            pending.update(_tags_for(instance))
+    for instance in session.deleted:
+        pending.update(_tags_for(instance, deleted=True))
+
+
+def _invalidate_committed(session):
+    tags = session.info.pop('response_cache_tags', None)
+    if tags and _response_cache is not None:
+        _response_cache.invalidate(*tags)
+
+
+def _discard_tags(session, previous_transaction=None):
+    session.info.pop('response_cache_tags', None)
+
+
+def register_invalidation_hooks(session):
+    """Invalidate cached responses whenever CMS rows are committed through session"""
+    if event.contains(session, 'after_commit', _invalidate_committed):
+        return
+    event.listen(session, 'after_flush', _collect_tags)
+    event.listen(session, 'after_commit', _invalidate_committed)
+    event.listen(session, 'after_soft_rollback', _discard_tags)
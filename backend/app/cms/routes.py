@@ -1,20 +1,35 @@
 import os
+import json
 import uuid
 from datetime import datetime
+from types import SimpleNamespace
 from flask import request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from app import db
 from app.models.models import User
-from app.models.cms import Post, PostTranslation, PostMedia, Tag, Language
+from app.models.cms import Post, PostTranslation, PostMedia, Tag, Language, TranslationRun, TranslationRunItem
 from sqlalchemy import or_, and_
+from sqlalchemy.orm import selectinload
 from app.services.translation_service import translation_service
-from .ai_content import generate_blog_content, ai_content_logger
+from .ai_content import generate_blog_content, stream_blog_content, ai_content_logger
+from .queries import list_published_posts
+from .languages import get_language_registry
+from .bulk_translate import (
+    get_bulk_translator, resolve_languages, create_run, run_progress, finish_run_if_done,
+    RUN_RUNNING, RUN_CANCELLED, ITEM_FAILED, ITEM_PENDING, ITEM_RUNNING, ITEM_CANCELLED
+)
+from .serializers import serialize_post, parse_fields, select_fields, SHAPE_ADMIN
+from .response_cache import (
+    cached_response, add_cache_tags, post_tag, slug_tag,
+    TAG_BLOG, TAG_BLOG_LIST, TAG_BLOG_SEARCH, TAG_LANGUAGES
+)
 from . import bp
+from app.utils.html_text import derive_text_fields
+from app.utils.pagination import InvalidCursor
 import markdown
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 # Define allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'pdf', 'doc', 'docx'}
@@ -39,182 +54,30 @@ def check_admin_access():
     return user
 
 # Language management
+def _language_json(language):
+    return {key: language[key] for key in ('code', 'name', 'is_default', 'is_active', 'flag', 'rtl')}
+
+
 @bp.route('/languages', methods=['GET'])
+@cached_response('website_only', 'is_active', tags=(TAG_LANGUAGES,))
 def get_languages():
-    """Get all supported languages"""
-    # Return a comprehensive list of supported languages directly
-    # This ensures language availability without database issues
-    
+    """Get all supported languages (from the language registry, see app/cms/languages.py)"""
     # Optional parameter to filter to only website-supported languages
     website_only = request.args.get('website_only', 'false').lower() == 'true'
     is_active_filter = request.args.get('is_active', 'false').lower() == 'true'
     
-    try:
-        # Try to get languages from database first
-        languages = Language.query.all()
-        
-        if languages:
-            # Convert to list of dictionaries for JSON response
-            language_list = []
-            for lang in languages:
-                language_list.append({
-                    "code": lang.code,
-                    "name": lang.name,
-                    "is_default": lang.is_default,
-                    "is_active": lang.is_active,
-                    "flag": lang.flag if hasattr(lang, 'flag') and lang.flag else None
-                })
-                
-            current_app.logger.info(f"Found {len(language_list)} languages in database")
-                
-            # Add flag field if missing (for backward compatibility)
-            for lang in language_list:
-                if not lang.get('flag'):
-                    # Set default flag based on language code - only the 22 website languages
-                    flags = {
-                        'en': '🇬🇧', 'fr': '🇫🇷', 'es': '🇪🇸', 'de': '🇩🇪', 'it': '🇮🇹', 
-                        'pt': '🇵🇹', 'ru': '🇷🇺', 'ja': '🇯🇵', 'ko': '🇰🇷', 'zh-TW': '🇹🇼',
-                        'ar': '🇸🇦', 'nl': '🇳🇱', 'sv': '🇸🇪', 'tr': '🇹🇷', 'pl': '🇵🇱',
-                        'hu': '🇭🇺', 'el': '🇬🇷', 'no': '🇳🇴', 'vi': '🇻🇳', 'th': '🇹🇭',
-                        'id': '🇮🇩', 'ms': '🇲🇾'
-                    }
-                    lang['flag'] = flags.get(lang['code'], '🌐')
-                    
-            # Filter to only active languages if requested
-            if is_active_filter:
-                language_list = [lang for lang in language_list if lang.get('is_active', False)]
-                
-            # Filter to only website languages if requested
-            if website_only:
-                # These are the language codes supported by the website
-                website_lang_codes = [
-                    'en', 'fr', 'es', 'de', 'it', 'pt', 'ru', 'ja', 'ko', 'zh-TW',
-                    'ar', 'nl', 'sv', 'tr', 'pl', 'hu', 'el', 'no', 'vi', 'th', 'id', 'ms'
-                ]
-                language_list = [lang for lang in language_list if lang.get('code') in website_lang_codes]
-                
-            current_app.logger.info(f"Returning {len(language_list)} languages from database")
-            return jsonify(language_list), 200
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving languages from database: {e}")
-        # Fall back to predefined languages if database query fails
-    
-    # List of 22 languages supported by the website
-    predefined_languages = [
-        {"code": "en", "name": "English", "is_active": True, "is_default": True, "flag": "🇬🇧"},
-        {"code": "fr", "name": "French", "is_active": True, "is_default": False, "flag": "🇫🇷"},
-        {"code": "es", "name": "Spanish", "is_active": True, "is_default": False, "flag": "🇪🇸"},
-        {"code": "de", "name": "German", "is_active": True, "is_default": False, "flag": "🇩🇪"},
-        {"code": "it", "name": "Italian", "is_active": True, "is_default": False, "flag": "🇮🇹"},
-        {"code": "pt", "name": "Portuguese", "is_active": True, "is_default": False, "flag": "🇵🇹"},
-        {"code": "nl", "name": "Dutch", "is_active": True, "is_default": False, "flag": "🇳🇱"},
-        {"code": "ru", "name": "Russian", "is_active": True, "is_default": False, "flag": "🇷🇺"},
-        {"code": "zh-TW", "name": "Traditional Chinese", "is_active": True, "is_default": False, "flag": "🇹🇼"},
-        {"code": "ja", "name": "Japanese", "is_active": True, "is_default": False, "flag": "🇯🇵"},
-        {"code": "ko", "name": "Korean", "is_active": True, "is_default": False, "flag": "🇰🇷"},
-        {"code": "ar", "name": "Arabic", "is_active": True, "is_default": False, "flag": "🇸🇦"},
-        {"code": "id", "name": "Indonesian", "is_active": True, "is_default": False, "flag": "🇮🇩"},
-        {"code": "ms", "name": "Malay", "is_active": True, "is_default": False, "flag": "🇲🇾"},
-        {"code": "th", "name": "Thai", "is_active": True, "is_default": False, "flag": "🇹🇭"},
-        {"code": "vi", "name": "Vietnamese", "is_active": True, "is_default": False, "flag": "🇻🇳"},
-        {"code": "tr", "name": "Turkish", "is_active": True, "is_default": False, "flag": "🇹🇷"},
-        {"code": "pl", "name": "Polish", "is_active": True, "is_default": False, "flag": "🇵🇱"},
-        {"code": "sv", "name": "Swedish", "is_active": True, "is_default": False, "flag": "🇸🇪"},
-        {"code": "hu", "name": "Hungarian", "is_active": True, "is_default": False, "flag": "🇭🇺"},
-        {"code": "el", "name": "Greek", "is_active": True, "is_default": False, "flag": "🇬🇷"},
-        {"code": "no", "name": "Norwegian", "is_active": True, "is_default": False, "flag": "🇳🇴"}
-    ]
-    
-    # Filter to only website languages if requested
-    if website_only:
-        website_lang_codes = [
-            'en', 'fr', 'es', 'de', 'it', 'pt', 'ru', 'ja', 'ko', 'zh-TW',
-            'ar', 'nl', 'sv', 'tr', 'pl', 'hu', 'el', 'no', 'vi', 'th', 'id', 'ms'
-        ]
-        predefined_languages = [lang for lang in predefined_languages if lang.get('code') in website_lang_codes]
-    
-    # Filter to only active languages if requested
+    registry = get_language_registry()
+    languages = registry.website_languages() if website_only else registry.all()
     if is_active_filter:
-        predefined_languages = [lang for lang in predefined_languages if lang.get('is_active', False)]
-    
-    current_app.logger.info(f"Returning predefined list of {len(predefined_languages)} languages")
-    return jsonify(predefined_languages), 200
+        languages = [lang for lang in languages if lang['is_active']]
+    return jsonify([_language_json(lang) for lang in languages]), 200
 
 # Add a dedicated endpoint for website languages
 @bp.route('/website-languages', methods=['GET'])
+@cached_response(tags=(TAG_LANGUAGES,))
 def get_website_languages():
     """Get languages that are specifically supported by the website frontend"""
-    try:
-        # Try to get languages from database first
-        # This approach ensures consistency between all language endpoints
-        languages = Language.query.all()
-        
-        if languages:
-            # Website language codes - ensure consistency with TranslationModal.jsx
-            website_lang_codes = [
-                'en', 'fr', 'es', 'de', 'it', 'pt', 'ru', 'ja', 'ko', 'zh-TW',
-                'ar', 'nl', 'sv', 'tr', 'pl', 'hu', 'el', 'no', 'vi', 'th', 'id', 'ms'
-            ]
-            
-            # Filter to only website languages
-            website_languages = []
-            for lang in languages:
-                if lang.code in website_lang_codes:
-                    website_languages.append({
-                        "code": lang.code,
-                        "name": lang.name,
-                        "is_default": lang.is_default,
-                        "is_active": lang.is_active,
-                        "flag": lang.flag if hasattr(lang, 'flag') and lang.flag else None
-                    })
-            
-            # Add flag field if missing (for backward compatibility)
-            for lang in website_languages:
-                if not lang.get('flag'):
-                    # Set default flag based on language code
-                    flags = {
-                        'en': '🇬🇧', 'fr': '🇫🇷', 'es': '🇪🇸', 'de': '🇩🇪', 'it': '🇮🇹', 
-                        'pt': '🇵🇹', 'ru': '🇷🇺', 'ja': '🇯🇵', 'ko': '🇰🇷', 'zh-TW': '🇹🇼',
-                        'ar': '🇸🇦', 'nl': '🇳🇱', 'sv': '🇸🇪', 'tr': '🇹🇷', 'pl': '🇵🇱',
-                        'hu': '🇭🇺', 'el': '🇬🇷', 'no': '🇳🇴', 'vi': '🇻🇳', 'th': '🇹🇭',
-                        'id': '🇮🇩', 'ms': '🇲🇾'
-                    }
-                    lang['flag'] = flags.get(lang['code'], '🌐')
-                    
-            current_app.logger.info(f"Returning {len(website_languages)} website languages from database")
-            return jsonify(website_languages), 200
-    except Exception as e:
-        current_app.logger.error(f"Error retrieving website languages from database: {e}")
-        # Fall back to predefined languages if database query fails
-    
-    # These are the 22 languages supported by the website frontend
-    website_languages = [
-        {"code": "en", "name": "English", "is_active": True, "is_default": True, "flag": "🇬🇧"},
-        {"code": "fr", "name": "French", "is_active": True, "is_default": False, "flag": "🇫🇷"},
-        {"code": "es", "name": "Spanish", "is_active": True, "is_default": False, "flag": "🇪🇸"},
-        {"code": "de", "name": "German", "is_active": True, "is_default": False, "flag": "🇩🇪"},
-        {"code": "it", "name": "Italian", "is_active": True, "is_default": False, "flag": "🇮🇹"},
-        {"code": "pt", "name": "Portuguese", "is_active": True, "is_default": False, "flag": "🇵🇹"},
-        {"code": "ru", "name": "Russian", "is_active": True, "is_default": False, "flag": "🇷🇺"},
-        {"code": "ja", "name": "Japanese", "is_active": True, "is_default": False, "flag": "🇯🇵"},
-        {"code": "ko", "name": "Korean", "is_active": True, "is_default": False, "flag": "🇰🇷"},
-        {"code": "zh-TW", "name": "Traditional Chinese", "is_active": True, "is_default": False, "flag": "🇹🇼"},
-        {"code": "ar", "name": "Arabic", "is_active": True, "is_default": False, "flag": "🇸🇦"},
-        {"code": "nl", "name": "Dutch", "is_active": True, "is_default": False, "flag": "🇳🇱"},
-        {"code": "sv", "name": "Swedish", "is_active": True, "is_default": False, "flag": "🇸🇪"},
-        {"code": "tr", "name": "Turkish", "is_active": True, "is_default": False, "flag": "🇹🇷"},
-        {"code": "pl", "name": "Polish", "is_active": True, "is_default": False, "flag": "🇵🇱"},
-        {"code": "hu", "name": "Hungarian", "is_active": True, "is_default": False, "flag": "🇭🇺"},
-        {"code": "el", "name": "Greek", "is_active": True, "is_default": False, "flag": "🇬🇷"},
-        {"code": "no", "name": "Norwegian", "is_active": True, "is_default": False, "flag": "🇳🇴"},
-        {"code": "vi", "name": "Vietnamese", "is_active": True, "is_default": False, "flag": "🇻🇳"},
-        {"code": "th", "name": "Thai", "is_active": True, "is_default": False, "flag": "🇹🇭"},
-        {"code": "id", "name": "Indonesian", "is_active": True, "is_default": False, "flag": "🇮🇩"},
-        {"code": "ms", "name": "Malay", "is_active": True, "is_default": False, "flag": "🇲🇾"}
-    ]
-    
-    current_app.logger.info(f"Returning predefined list of {len(website_languages)} website languages")
-    return jsonify(website_languages), 200
+    return jsonify([_language_json(lang) for lang in get_language_registry().website_languages()]), 200
 
 @bp.route('/languages', methods=['POST'])
 @jwt_required()
@@ -411,59 +274,80 @@ def delete_tag(tag_id):
     return jsonify({"message": "Tag deleted successfully"}), 200
 
 # AI Content Generation
+def _generate_content_args():
+    """(title, language, length, refresh) from the request JSON, or an error response"""
+    try:
+        data = request.get_json()
+    except Exception as e:
+        ai_content_logger.warning(f"Invalid JSON for content generation: {e}")
+        return None, (jsonify({"error": "Failed to parse request JSON.", "exception_details": str(e)}), 400)
+    if not data:
+        return None, (jsonify({"error": "Invalid request: No JSON data or data is empty."}), 400)
+    if not data.get('title'):
+        return None, (jsonify({"error": "Blog post title is required in JSON payload"}), 400)
+    return (data['title'], data.get('language', 'en'), data.get('length', 'medium'), bool(data.get('refresh'))), None
+
+
+def _content_to_html(content):
+    """Convert generated Markdown to HTML; HTML passes through unchanged"""
+    try:
+        return markdown.markdown(content)
+    except Exception as md_e:
+        ai_content_logger.error(f"Markdown to HTML conversion failed: {md_e}", exc_info=True)
+        return content  # Fall through with the original markdown
+
+
 @bp.route('/posts/generate-content', methods=['POST'])
 @jwt_required()
 def ai_generate_content():
-    ai_content_logger.info("Entered /api/cms/posts/generate-content route function in routes.py")
+    """
+    Generate post content from a title; repeated titles are answered from the
+    generation cache unless "refresh" is true (see app/cms/ai_content.py).
+    """
     user = check_admin_access()
     if not user:
-        ai_content_logger.warning("Admin access check failed in /generate-content")
         return jsonify({"error": "Admin access required"}), 403
-    
-    data = None
-    try:
-        ai_content_logger.info("Attempting request.get_json() in /generate-content")
-        data = request.get_json()
-        ai_content_logger.info(f"request.get_json() successful. Data (first 200 chars): {str(data)[:200]}...")
-    except Exception as e:
-        ai_content_logger.error(f"Exception during request.get_json(): {e}", exc_info=True)
-        return jsonify({"error": "Failed to parse request JSON.", "exception_details": str(e)}), 400
 
-    if not data:
-        ai_content_logger.warning("Data is None or empty after get_json() in /generate-content")
-        return jsonify({"error": "Invalid request: No JSON data or data is empty."}), 400
+    args, error = _generate_content_args()
+    if error:
+        return error
+    result = generate_blog_content(*args)
 
-    title_to_generate = data.get('title')
-    if not title_to_generate:
-        ai_content_logger.warning("'title' is missing from parsed JSON data.")
-        return jsonify({"error": "Blog post title is required in JSON payload"}), 400
-    
-    language = data.get('language', 'en')
-    length = data.get('length', 'medium')
-    
-    ai_content_logger.info(f"Calling generate_blog_content with title: '{title_to_generate}', lang: '{language}', len: '{length}'")
-    result = generate_blog_content(title_to_generate, language, length)
-    
     if not result.get('success', False):
-        ai_content_logger.error(f"generate_blog_content call failed. Error: {result.get('error')}")
         return jsonify({"error": result.get('error', 'Failed to generate content')}), 500
-    
-    # Convert Markdown content to HTML
-    if result.get('content'):
-        try:
-            ai_content_logger.info("Attempting Markdown to HTML conversion for AI content.")
-            html_content = markdown.markdown(result['content'])
-            result['content'] = html_content # Replace markdown with HTML
-            ai_content_logger.info("Markdown to HTML conversion successful.")
-        except Exception as md_e:
-            ai_content_logger.error(f"Markdown to HTML conversion failed: {md_e}", exc_info=True)
-            # Decide if to return error or just the raw markdown. For now, let it pass with raw markdown.
-            # Potentially return a specific warning to the client here.
-            pass # Fallthrough with original markdown if conversion fails
-
-    ai_content_logger.info("generate_blog_content call successful. Returning content (now HTML if converted).")
+    result['content'] = _content_to_html(result['content'])
     return jsonify(result), 200
 
+
+@bp.route('/posts/generate-content/stream', methods=['POST'])
+@jwt_required()
+def ai_generate_content_stream():
+    """
+    Generate post content as server-sent events: {"delta": text} for each piece as
+    it arrives from the API, then {"done": true, ...} with the whole content as HTML
+    (or {"done": true, "success": false, "error": ...}).
+    """
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
+
+    args, error = _generate_content_args()
+    if error:
+        return error
+
+    def events():
+        for event in stream_blog_content(*args):
+            if 'delta' not in event:
+                event = dict(event, done=True)
+                if event.get('success'):
+                    event['content'] = _content_to_html(event['content'])
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return current_app.response_class(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Let nginx pass events through as they come
+    })
+
 # Post management
 @bp.route('/posts', methods=['GET'])
 def get_posts():
@@ -494,16 +378,14 @@ def get_posts():
             )
         )
     
-    # Execute query
-    posts = query.order_by(Post.created_at.desc()).all()
+    # Execute query; translations, media and tags in one query each instead of per post
+    posts = (query.options(selectinload(Post.translations), selectinload(Post.media), selectinload(Post.tags))
+             .order_by(Post.created_at.desc())
+             .all())
     
-    # Format results
-    result = []
-    for post in posts:
-        post_dict = post.to_dict(include_translations=True, language=language)
-        result.append(post_dict)
-    
-    return jsonify(result), 200
+    # Format results (?fields=id,slug,translation.title trims them)
+    result = [serialize_post(post, SHAPE_ADMIN, language=language) for post in posts]
+    return jsonify(select_fields(result, parse_fields(request.args.get('fields')))), 200
 
 @bp.route('/posts/<int:post_id>', methods=['GET'])
 def get_post(post_id):
@@ -514,7 +396,8 @@ def get_post(post_id):
     if not post:
         return jsonify({"error": "Post not found"}), 404
     
-    return jsonify(post.to_dict(include_translations=True, language=language)), 200
+    result = serialize_post(post, SHAPE_ADMIN, language=language)
+    return jsonify(select_fields(result, parse_fields(request.args.get('fields')))), 200
 
 @bp.route('/posts/by-slug/<slug>', methods=['GET'])
 def get_post_by_slug(slug):
@@ -525,7 +408,8 @@ def get_post_by_slug(slug):
     if not post:
         return jsonify({"error": "Post not found"}), 404
     
-    return jsonify(post.to_dict(include_translations=True, language=language)), 200
+    result = serialize_post(post, SHAPE_ADMIN, language=language)
+    return jsonify(select_fields(result, parse_fields(request.args.get('fields')))), 200
 
 @bp.route('/posts', methods=['POST'])
 @jwt_required()
@@ -661,8 +545,7 @@ def update_post(post_id):
                     current_app.logger.warning(f"UPDATE_POST: Translation data missing language_code for post {post_id}")
                     continue
 
-                lang_obj = Language.query.get(language_code)
-                if not lang_obj:
+                if not get_language_registry().is_stored(language_code):
                     current_app.logger.warning(f"UPDATE_POST: Invalid language_code '{language_code}' for post {post_id}")
                     continue
                 
@@ -790,239 +673,157 @@ def force_translate_es_fr_endpoint():
 @bp.route('/posts/auto-translate-all', methods=['POST'])
 @jwt_required()
 def auto_translate_all_posts():
-    """Auto-translate all posts with English content to all languages"""
+    """
+    Start a background run translating posts with English content to all languages.
+
+    Returns 202 with the run; poll GET /posts/auto-translate-all/<run_id> for progress.
+    """
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
+    
+    data = request.get_json() or {}
+    max_posts = data.get('batch_size', 0)  # 0 = all posts
+    languages_to_translate = data.get('languages', [])  # Default to all languages
+    post_ids_to_translate = data.get('post_ids', [])  # Default to all posts
+    placeholder_mode = data.get('placeholder_mode', True)  # Default to placeholder mode
+    if not isinstance(max_posts, int) or not isinstance(languages_to_translate, list) \
+            or not isinstance(post_ids_to_translate, list):
+        return jsonify({"error": "batch_size must be an integer, languages and post_ids lists"}), 400
+    
+    running = TranslationRun.query.filter_by(status=RUN_RUNNING, post_id=None).order_by(TranslationRun.created_at.desc()).first()
+    if running:
+        return jsonify({
+            'error': 'A translation run is already in progress',
+            'run': run_progress(running)
+        }), 409
+    
     try:
-        # Check admin access
-        user = check_admin_access()
-        if not user:
-            return jsonify({"error": "Admin access required"}), 403
-        
-        # Get optional parameters from request
-        data = request.get_json() or {}
-        batch_size = data.get('batch_size', 10)  # Default to 10 posts at a time
-        languages_to_translate = data.get('languages', [])  # Default to all languages
-        post_ids_to_translate = data.get('post_ids', [])  # Default to all posts
-        placeholder_mode = data.get('placeholder_mode', True)  # Default to placeholder mode
-        
-        # Get predefined languages from our hardcoded list (22 languages)
-        SUPPORTED_LANGUAGES = [
-            {"code": "en", "name": "English"},
-            {"code": "fr", "name": "French"},
-            {"code": "es", "name": "Spanish"},
-            {"code": "de", "name": "German"},
-            {"code": "it", "name": "Italian"},
-            {"code": "pt", "name": "Portuguese"},
-            {"code": "nl", "name": "Dutch"},
-            {"code": "ru", "name": "Russian"},
-            {"code": "zh-CN", "name": "Simplified Chinese"},
-            {"code": "zh-TW", "name": "Traditional Chinese"},
-            {"code": "ja", "name": "Japanese"},
-            {"code": "ko", "name": "Korean"},
-            {"code": "ar", "name": "Arabic"},
-            {"code": "hi", "name": "Hindi"},
-            {"code": "id", "name": "Indonesian"},
-            {"code": "ms", "name": "Malaysian"},
-            {"code": "th", "name": "Thai"},
-            {"code": "vi", "name": "Vietnamese"},
-            {"code": "tr", "name": "Turkish"},
-            {"code": "pl", "name": "Polish"},
-            {"code": "cs", "name": "Czech"},
-            {"code": "sv", "name": "Swedish"}
-        ]
-        
-        # Create dict to map codes to names
-        lang_names = {lang["code"]: lang["name"] for lang in SUPPORTED_LANGUAGES}
-        
-        # Get all active languages from database
-        all_languages = Language.query.filter_by(is_active=True).all()
-        current_app.logger.info(f"Found {len(all_languages)} active languages in database")
-        
-        # Get list of language codes from database
-        db_language_codes = [lang.code for lang in all_languages]
-        
-        # Use predefined language list if database doesn't have enough languages
-        if len(db_language_codes) < 10:
-            current_app.logger.info(f"Using predefined language list instead of database (only {len(db_language_codes)} found in db)")
-            all_language_codes = [lang["code"] for lang in SUPPORTED_LANGUAGES]
-        else:
-            all_language_codes = db_language_codes
-        
-        # Filter languages if specified
-        if languages_to_translate:
-            filtered_language_codes = [code for code in all_language_codes if code in languages_to_translate]
-            current_app.logger.info(f"Filtered to {len(filtered_language_codes)} specific languages: {', '.join(filtered_language_codes)}")
-        else:
-            filtered_language_codes = all_language_codes
-        
-        # Get all published posts that have English translations
-        query = Post.query.join(PostTranslation).filter(
-            PostTranslation.language_code == 'en'
-        )
-        
-        # Filter posts by ID if specified
-        if post_ids_to_translate:
-            query = query.filter(Post.id.in_(post_ids_to_translate))
-            
-        posts = query.all()
-        current_app.logger.info(f"Found {len(posts)} posts with English content to translate")
-        
-        # Process all posts if requested, otherwise limit to batch size
-        posts_to_process = posts[:batch_size] if batch_size > 0 else posts
-        remaining_posts = len(posts) - len(posts_to_process)
-        
-        current_app.logger.info(f"Processing batch of {len(posts_to_process)} posts ({remaining_posts} remaining)")
-        
-        results = {
-            'total_posts': len(posts_to_process),
-            'remaining_posts': remaining_posts,
-            'total_languages': len(filtered_language_codes),
-            'successfully_translated_posts': 0,
-            'failed_posts': 0,
-            'skipped_languages': 0,
-            'translated_languages': 0,
-            'details': []
-        }
+        languages = resolve_languages(languages_to_translate)
+        run = create_run(user.id, languages, post_ids=post_ids_to_translate,
+                         placeholder_mode=placeholder_mode, max_posts=max_posts)
+        db.session.commit()
+        finish_run_if_done(run.id)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error starting auto-translate-all run: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to start auto-translation', 'details': str(e)}), 500
     
-        # Process each post
-        for post in posts_to_process:
-            post_result = {
-                'post_id': post.id,
-                'post_slug': post.slug,
-                'successful_languages': [],
-                'failed_languages': [],
-                'skipped_languages': []
-            }
-            
-            # Get English translation
-            english_translation = next((t for t in post.translations if t.language_code == 'en'), None)
-            if not english_translation:
-                current_app.logger.warning(f"Post {post.id} has no English translation despite query filter")
-                continue
-                
-            # Prepare English translation data
-            english_translation_data = {
-                'title': english_translation.title,
-                'content': english_translation.content,
-                'meta_title': english_translation.meta_title,
-                'meta_description': english_translation.meta_description,
-                'meta_keywords': english_translation.meta_keywords
-            }
-            
-            # Check if the original post has a featured image
-            has_featured_image = post.featured_image is not None and post.featured_image.strip() != ''
-            current_app.logger.info(f"Post {post.id} has featured image: {has_featured_image}")
-            
-            # Translate to each language
-            for lang_code in filtered_language_codes:
-                if lang_code == 'en':  # Skip English
-                    continue
-                    
-                # Check if translation exists
-                existing_translation = next((t for t in post.translations if t.language_code == lang_code), None)
-                
-                # Skip if translation exists and is manually edited
-                if existing_translation and not existing_translation.is_auto_translated:
-                    post_result['skipped_languages'].append(lang_code)
-                    results['skipped_languages'] += 1
-                    continue
-                
-                # Get language name
-                lang_name = lang_names.get(lang_code, lang_code)
-                    
-                # Try to use translation service if available and not in placeholder mode
-                translated_data = None
-                if not placeholder_mode and translation_service.is_available():
-                    # Perform translation
-                    current_app.logger.info(f"Translating post {post.id} to {lang_code} using DeepSeek")
-                    translated_data = translation_service.translate_post_fields(
-                        english_translation_data, 
-                        from_lang_code='en', 
-                        to_lang_code=lang_code
-                    )
-                
-                # If translation service failed or we're in placeholder mode, create placeholder
-                if not translated_data:
-                    current_app.logger.info(f"Creating placeholder translation for post {post.id} to {lang_code}")
-                    # Create placeholder translations
-                    translated_data = {
-                        'title': f"[{lang_name}] {english_translation.title}",
-                        'content': f"""
-[This is an automatic placeholder for {lang_name} translation]
+    get_bulk_translator().submit()
+    progress = run_progress(run)
+    current_app.logger.info(f"Started translation run {run.id}: {progress['total']} items, {len(languages)} languages")
+    return jsonify({
+        'message': 'Auto-translation started',
+        'run': progress,
+        'status_url': f"/api/cms/posts/auto-translate-all/{run.id}"
+    }), 202
 
-{english_translation.content}
+@bp.route('/posts/auto-translate-all', methods=['GET'])
+@jwt_required()
+def list_translation_runs():
+    """Recent bulk translation runs, newest first"""
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
+    
+    get_bulk_translator()
+    runs = TranslationRun.query.order_by(TranslationRun.created_at.desc()).limit(10).all()
+    return jsonify({'runs': [run_progress(run, failures=0) for run in runs]}), 200
 
-[End of placeholder translation. This will be replaced with proper {lang_name} translation.]
-                        """.strip(),
-                        'meta_title': f"[{lang_name}] {english_translation.meta_title}" if english_translation.meta_title else "",
-                        'meta_description': english_translation.meta_description,
-                        'meta_keywords': english_translation.meta_keywords
-                    }
-                
-                # Update if translation exists, create if not
-                try:
-                    if existing_translation:
-                        existing_translation.title = translated_data.get('title', existing_translation.title)
-                        existing_translation.content = translated_data.get('content', existing_translation.content)
-                        existing_translation.meta_title = translated_data.get('meta_title', existing_translation.meta_title)
-                        existing_translation.meta_description = translated_data.get('meta_description', existing_translation.meta_description)
-                        existing_translation.meta_keywords = translated_data.get('meta_keywords', existing_translation.meta_keywords)
-                        existing_translation.is_auto_translated = True
-                        existing_translation.updated_at = datetime.utcnow()
-                    else:
-                        # Create new translation
-                        new_translation = PostTranslation(
-                            post_id=post.id,
-                            language_code=lang_code,
-                            title=translated_data.get('title', ''),
-                            content=translated_data.get('content', ''),
-                            meta_title=translated_data.get('meta_title', ''),
-                            meta_description=translated_data.get('meta_description', ''),
-                            meta_keywords=translated_data.get('meta_keywords', ''),
-                            is_auto_translated=True
-                        )
-                        post.translations.append(new_translation)
-                    
-                    post_result['successful_languages'].append(lang_code)
-                    results['translated_languages'] += 1
-                except Exception as ex:
-                    current_app.logger.error(f"Error creating translation for post {post.id} to {lang_code}: {str(ex)}")
-                    post_result['failed_languages'].append(lang_code)
-                    results['failed_posts'] += 1
-            
-            # If the original post doesn't have a featured image, ensure it's not set
-            if not has_featured_image and post.featured_image:
-                current_app.logger.info(f"Removing featured image from post {post.id} since it shouldn't have one")
-                post.featured_image = None
-                
-            # Add this post's results to the overall results
-            if len(post_result['successful_languages']) > 0:
-                results['successfully_translated_posts'] += 1
-                
-            results['details'].append(post_result)
-            
-            # Commit after each post to avoid losing all work if there's an error
-            db.session.commit()
-        
-        return jsonify({
-            'message': 'Auto-translation of all posts completed',
-            'results': results
-        }), 200
+@bp.route('/posts/auto-translate-all/<run_id>', methods=['GET'])
+@jwt_required()
+def get_translation_run(run_id):
+    """Progress of a bulk translation run"""
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
     
-    except Exception as e:
-        current_app.logger.error(f"Error in auto-translate-all posts: {str(e)}", exc_info=True)
-        # Try to rollback if needed
-        try:
-            db.session.rollback()
-        except:
-            pass
-        return jsonify({
-            'error': 'Failed to auto-translate all posts',
-            'details': str(e)
-        }), 500
+    run = TranslationRun.query.get(run_id)
+    if not run:
+        return jsonify({"error": "Translation run not found"}), 404
+    if run.status == RUN_RUNNING:
+        get_bulk_translator()
+    return jsonify({'run': run_progress(run)}), 200
+
+@bp.route('/posts/auto-translate-all/<run_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_translation_run(run_id):
+    """
+    Stop a run, or with {"languages": [...]} only those languages of it.
+
+    Items being translated stop at their next API call or streamed token. A
+    cancelled run keeps its unfinished items for resume; cancelled languages
+    are finished as 'cancelled'.
+    """
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
+    
+    run = TranslationRun.query.get(run_id)
+    if not run:
+        return jsonify({"error": "Translation run not found"}), 404
+    
+    languages = (request.get_json(silent=True) or {}).get('languages')
+    if languages is not None and not isinstance(languages, list):
+        return jsonify({"error": "languages must be a list of language codes"}), 400
+    if languages:
+        run.items.filter(
+            TranslationRunItem.language_code.in_(languages),
+            TranslationRunItem.status.in_((ITEM_PENDING, ITEM_RUNNING))
+        ).update({'status': ITEM_CANCELLED, 'completed_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        finish_run_if_done(run.id)
+    elif run.status == RUN_RUNNING:
+        run.status = RUN_CANCELLED
+        run.completed_at = datetime.utcnow()
+        db.session.commit()
+    return jsonify({'run': run_progress(run)}), 200
+
+@bp.route('/posts/auto-translate-all/<run_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_translation_run(run_id):
+    """Continue a cancelled run and retry its failed and cancelled items"""
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
+    
+    run = TranslationRun.query.get(run_id)
+    if not run:
+        return jsonify({"error": "Translation run not found"}), 404
+    
+    run.items.filter(TranslationRunItem.status.in_((ITEM_FAILED, ITEM_CANCELLED))).update(
+        {'status': ITEM_PENDING, 'attempts': 0, 'next_attempt_at': None, 'completed_at': None}, synchronize_session=False
+    )
+    run.status = RUN_RUNNING
+    run.completed_at = None
+    db.session.commit()
+    finish_run_if_done(run.id)
+    get_bulk_translator().submit()
+    return jsonify({'run': run_progress(run)}), 202
+    
+@bp.route('/translation-stats', methods=['GET'])
+@jwt_required()
+def get_translation_stats():
+    """Latency, API calls and tokens per post translation, by mode, since this process started"""
+    user = check_admin_access()
+    if not user:
+        return jsonify({"error": "Admin access required"}), 403
+    
+    return jsonify({
+        'mode': translation_service.translation_mode,
+        'modes': translation_service.stats.snapshot()
+    }), 200
     
 @bp.route('/posts/<int:post_id>/auto-translate', methods=['POST'])
 @jwt_required()
 def auto_translate_post(post_id):
+    """
+    Start translating a post from English to target_languages in the background.
+
+    Returns 202 with the run at once. GET /posts/auto-translate-all/<run_id> reports
+    each language's status, POST /posts/auto-translate-all/<run_id>/cancel stops
+    the run or some of its languages, also while they are being translated.
+    """
     try:
         user = check_admin_access()
         if not user: return jsonify({"error": "Admin access required"}), 403
@@ -1034,203 +835,49 @@ def auto_translate_post(post_id):
             current_app.logger.error("Translation service is not available - DEEPSEEK_API_KEY may be missing or invalid")
             return jsonify({"error": "Translation service is not available. Please check your DEEPSEEK_API_KEY."}), 503
         
-        english_translation = next((t for t in post.translations if t.language_code == 'en'), None)
-        if not english_translation:
+        has_english = db.session.query(PostTranslation.id).filter_by(post_id=post_id, language_code='en').first()
+        if not has_english:
             return jsonify({"error": "English translation not found. Auto-translation requires English content as the source."}), 400
-            
-        english_translation_data = {
-            'title': english_translation.title,
-            'content': english_translation.content,
-            'meta_title': english_translation.meta_title,
-            'meta_description': english_translation.meta_description,
-            'meta_keywords': english_translation.meta_keywords
-        }
-        
-        # Pre-fetch language names in the main thread where we have application context
-        from_lang_code = 'en'
-        from_lang_name = translation_service.get_language_name(from_lang_code)
-        
-        # Pre-fetch all potential target language names
-        language_names = {}  # Will store language code -> name mappings
-        language_names[from_lang_code] = from_lang_name  # Add source language
-        
-        # Get all language codes and names from the database while we're in the request context
-        try:
-            all_languages = Language.query.all()
-            for lang in all_languages:
-                language_names[lang.code] = lang.name
-            current_app.logger.info(f"Pre-fetched names for {len(language_names)} languages from database.")
-        except Exception as e:
-            current_app.logger.error(f"Error pre-fetching language names from database: {str(e)}", exc_info=True)
-            # If DB fetch fails, load fallback common language names
-            fallback_names = {
-                'en': 'English', 'fr': 'French', 'es': 'Spanish', 'de': 'German', 
-                'it': 'Italian', 'pt': 'Portuguese', 'ru': 'Russian', 'ja': 'Japanese', 
-                'ko': 'Korean', 'zh-TW': 'Traditional Chinese', 'ar': 'Arabic',
-                'nl': 'Dutch', 'sv': 'Swedish', 'tr': 'Turkish', 'pl': 'Polish',
-                'hu': 'Hungarian', 'el': 'Greek', 'no': 'Norwegian', 
-                'vi': 'Vietnamese', 'th': 'Thai', 'id': 'Indonesian', 'ms': 'Malaysian'
-            }
-            for code, name in fallback_names.items():
-                if code not in language_names:
-                    language_names[code] = name
-            current_app.logger.info(f"Using fallback language names. Total languages: {len(language_names)}")
         
         data = request.get_json() or {}
         target_languages = data.get('target_languages', [])
         if not isinstance(target_languages, list) or not all(isinstance(lang, str) for lang in target_languages):
             return jsonify({"error": "target_languages must be a list of strings"}), 400
+        if not target_languages:
+            # Unlike auto-translate-all, an empty list does not mean every language
+            return jsonify({"error": "target_languages must name at least one language"}), 400
         
-        current_app.logger.info(f"Attempting to translate post {post_id} to languages: {target_languages}")
-        
-        results = {'successful': [], 'failed': [], 'skipped': []}
-        has_featured_image = post.featured_image is not None and post.featured_image.strip() != ''
-
-        TRANSLATION_TASK_TIMEOUT = current_app.config.get('TRANSLATION_TASK_TIMEOUT_SECONDS', 240) 
-        MAX_WORKERS = current_app.config.get('TRANSLATION_MAX_WORKERS', 5)
-
         if request.headers.get('X-Cancel-Translation'):
             current_app.logger.info(f"Translation cancelled by client before starting for post {post_id}")
-            for lang_code in target_languages:
-                if lang_code != 'en':
-                    results['skipped'].append(lang_code)
-            return jsonify({'message': 'Auto-translation process cancelled by client request.', 'translations': results}), 200
-
-        # Simplified task runner function that doesn't need app context
-        def _translate_task_runner(task_english_data, task_from_lang, task_to_lang, 
-                                 task_from_lang_name, task_to_lang_name):
-            return translation_service.translate_post_fields_with_lang_names(
-                task_english_data, 
-                from_lang_code=task_from_lang, 
-                to_lang_code=task_to_lang,
-                from_lang_name=task_from_lang_name,
-                to_lang_name=task_to_lang_name
-            )
-
-        futures_map = {}
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            for lang_code in target_languages:
-                if lang_code == 'en':
-                    continue
-
-                existing_translation = next((t for t in post.translations if t.language_code == lang_code), None)
-                if existing_translation and not existing_translation.is_auto_translated:
-                    current_app.logger.info(f"Skipping {lang_code} (manual edit) for post {post_id}")
-                    results['skipped'].append(lang_code)
-                    continue
-                
-                # Get language name for this target language
-                to_lang_name = language_names.get(lang_code)
-                if not to_lang_name:
-                    # If name isn't in our pre-fetched list, use a placeholder to avoid DB lookup in thread
-                    to_lang_name = f"Language ({lang_code})"
-                    current_app.logger.warning(f"No pre-fetched name found for language code '{lang_code}'. Using placeholder.")
-                
-                current_app.logger.info(f"Submitting translation task for {lang_code} ('{to_lang_name}') for post {post_id}")
-                future = executor.submit(
-                    _translate_task_runner,  # Use the new wrapper function
-                    english_translation_data,  # Pass the data
-                    from_lang_code,
-                    lang_code,
-                    from_lang_name,  # Pass pre-fetched language names
-                    to_lang_name     # Pass pre-fetched language names
-                )
-                futures_map[future] = lang_code
-
-            for future in as_completed(futures_map):
-                lang_code = futures_map[future]
-                try:
-                    translated_data = future.result(timeout=TRANSLATION_TASK_TIMEOUT)
-                
-                    if translated_data is None:
-                        current_app.logger.error(f"Translation service returned None for {lang_code}, post {post_id}. Marking as failed.")
-                        results['failed'].append(lang_code)
-                    else:
-                        existing_translation = next((t for t in post.translations if t.language_code == lang_code), None)
-                        
-                        if existing_translation:
-                            existing_translation.title = translated_data.get('title', existing_translation.title)
-                            existing_translation.content = translated_data.get('content', existing_translation.content)
-                            existing_translation.meta_title = translated_data.get('meta_title', existing_translation.meta_title)
-                            existing_translation.meta_description = translated_data.get('meta_description', existing_translation.meta_description)
-                            existing_translation.meta_keywords = translated_data.get('meta_keywords', existing_translation.meta_keywords)
-                            existing_translation.is_auto_translated = True
-                            existing_translation.updated_at = datetime.utcnow()
-                        else:
-                            new_translation = PostTranslation(
-                                post_id=post_id, language_code=lang_code,
-                                title=translated_data.get('title', ''), 
-                                content=translated_data.get('content', ''),
-                                meta_title=translated_data.get('meta_title', ''), 
-                                meta_description=translated_data.get('meta_description', ''),
-                                meta_keywords=translated_data.get('meta_keywords', ''),
-                                is_auto_translated=True
-                            )
-                            post.translations.append(new_translation)
-                        
-                        current_app.logger.info(f"Successfully processed {lang_code} for post {post_id}. Committing.")
-                        db.session.commit()
-                    results['successful'].append(lang_code)
-                    current_app.logger.info(f"Committed {lang_code} translation for post {post_id}")
-            
-                except FuturesTimeoutError:
-                    current_app.logger.warning(f"Translation for {lang_code} post {post_id} timed out after {TRANSLATION_TASK_TIMEOUT}s in ThreadPoolExecutor.")
-                    results['failed'].append(lang_code)
-                    db.session.rollback()
-                except Exception as e:
-                    current_app.logger.error(f"Error processing translation result for {lang_code}, post {post_id}: {str(e)}", exc_info=True)
-                    results['failed'].append(lang_code)
-                    db.session.rollback()
-        
-        if not has_featured_image and results['successful']:
-            original_featured_image = post.featured_image
-            if original_featured_image: 
-                current_app.logger.info(f"Post {post_id} originally had a featured image '{original_featured_image}' but now marked as not having one due to successful translations. Nullifying featured image.")
-                post.featured_image = None
-                db.session.commit() 
-        
-        current_app.logger.info(f"Overall translation results for post {post_id}: {results}")
-        
-        # Format a more detailed message with language names
-        successful_language_names = []
-        failed_language_names = []
-        skipped_language_names = []
-        
-        # Convert language codes to language names for better readability
-        for lang_code in results['successful']:
-            name = language_names.get(lang_code, lang_code)
-            successful_language_names.append(name)
-            
-        for lang_code in results['failed']:
-            name = language_names.get(lang_code, lang_code)
-            failed_language_names.append(name)
-            
-        for lang_code in results['skipped']:
-            name = language_names.get(lang_code, lang_code)
-            skipped_language_names.append(name)
-        
-        # Create detailed message including language names
-        message_parts = []
-        message_parts.append('Auto-translation process completed.')
-        
-        if successful_language_names:
-            message_parts.append(f"Successfully translated: {', '.join(successful_language_names)}")
-        
-        if failed_language_names:
-            message_parts.append(f"Failed to translate: {', '.join(failed_language_names)}")
-            
-        if skipped_language_names:
-            message_parts.append(f"Skipped (manually edited): {', '.join(skipped_language_names)}")
-        
-        detailed_message = " ".join(message_parts)
+            skipped = [lang_code for lang_code in target_languages if lang_code != 'en']
+            return jsonify({'message': 'Auto-translation process cancelled by client request.',
+                            'translations': {'successful': [], 'failed': [], 'skipped': skipped}}), 200
+        
+        running = TranslationRun.query.filter_by(post_id=post_id, status=RUN_RUNNING).first()
+        if running:
+            return jsonify({
+                'error': 'This post is already being translated',
+                'run': run_progress(running)
+            }), 409
+        
+        languages = resolve_languages(target_languages)
+        unsupported = [code for code in target_languages if code != 'en' and code not in languages]
+        if unsupported:
+            current_app.logger.warning(f"Not translating post {post_id} to unsupported languages: {unsupported}")
+        
+        run = create_run(user.id, languages, post_ids=[post_id], placeholder_mode=False)
+        run.post_id = post_id
+        db.session.commit()
+        finish_run_if_done(run.id)
+        get_bulk_translator().submit()
         
+        current_app.logger.info(f"Started translation run {run.id} for post {post_id}: {list(languages)}")
         return jsonify({
-            'message': detailed_message, 
-            'translations': results, 
-            'successful_names': successful_language_names,
-            'failed_names': failed_language_names,
-            'skipped_names': skipped_language_names
-        }), 200
+            'message': f"Auto-translation to {len(languages)} languages started",
+            'run': run_progress(run),
+            'unsupported_languages': unsupported,
+            'status_url': f"/api/cms/posts/auto-translate-all/{run.id}"
+        }), 202
         
     except Exception as e:
         current_app.logger.error(f"Major error in auto-translate post {post_id}: {str(e)}", exc_info=True)
@@ -1376,6 +1023,7 @@ def delete_media(media_id):
 
 # Public Blog API
 @bp.route('/blog', methods=['GET'])
+@cached_response('language', 'tag', 'search', 'page', 'limit', 'cursor', 'fields', tags=(TAG_BLOG, TAG_BLOG_LIST))
 def get_blog_posts():
     """Get published blog posts for public consumption"""
     try:
@@ -1385,74 +1033,47 @@ def get_blog_posts():
         search = request.args.get('search')
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('limit', 10, type=int)  # Use 'limit' for consistency with frontend
+        cursor = request.args.get('cursor')  # next_cursor of the previous page; replaces page
         
         current_app.logger.info(f"GET /blog - Params: language={language}, tag={tag}, search={search}, page={page}, per_page={per_page}")
         
         # Limit per_page to avoid potential performance issues
         per_page = min(per_page, 50)
         
-        # Base query - only published posts
-        query = Post.query.filter_by(status='published')
-        
-        # Log the initial query SQL
-        current_app.logger.info(f"Initial query: {str(query)}")
-        current_app.logger.info(f"Total posts in database: {Post.query.count()}")
-        current_app.logger.info(f"Published posts: {Post.query.filter_by(status='published').count()}")
-        
-        # We don't filter by language anymore - instead we'll include all posts and handle 
-        # fallback translations in the response formatting
-        if language:
-            current_app.logger.info(f"Language requested: {language} - Will provide fallbacks if needed")
-            
-        # Apply tag filter
-        if tag:
-            query = query.join(Post.tags).filter(Tag.slug == tag)
-        
-        # Apply search filter
-        if search:
-            search_term = f"%{search}%"
-            # Search in translations
-            if not language:  # Only add this join if we haven't already joined for language filtering
-                query = query.join(PostTranslation)
-            query = query.filter(
-                or_(
-                    PostTranslation.title.like(search_term),
-                    PostTranslation.content.like(search_term)
-                )
+        # A fixed number of queries per page; of translations other than the
+        # requested language and English only a summary is loaded (see cms/queries.py)
+        try:
+            result, total, total_is_estimate, next_cursor = list_published_posts(
+                language=language, tag=tag, search=search, page=page, per_page=per_page, cursor=cursor
             )
+        except InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Order by published date (newest first)
-        query = query.order_by(Post.published_at.desc())
-        
-        # Get total count for pagination
-        total = query.count()
-        current_app.logger.info(f"Total posts matching filters: {total}")
-        
-        # Paginate
-        posts = query.offset((page - 1) * per_page).limit(per_page).all()
-        current_app.logger.info(f"Retrieved posts count: {len(posts)}")
-        
-        # Format results
-        result = []
-        for post in posts:
-            post_dict = post.to_dict(include_translations=True, language=language)
-            
-            # The post_dict will always have 'translation' for the requested language
-            # because our query is already filtering for posts with the right language
-            result.append(post_dict)
+        # Cached until one of these posts, or the listing itself, changes
+        if search:
+            add_cache_tags(TAG_BLOG_SEARCH)
+        for post in result:
+            add_cache_tags(post_tag(post['id']))
+            if post['translation']:
+                add_cache_tags(post_tag(post['id'], post['translation']['language_code']))
+            for translation in post.get('translations', ()):
+                add_cache_tags(post_tag(post['id'], translation['language_code']))
         
         # Calculate total pages
         total_pages = (total + per_page - 1) // per_page if total > 0 else 1
         
         # Return with pagination metadata
         return jsonify({
-            'posts': result,
+            'posts': select_fields(result, parse_fields(request.args.get('fields'))),
             'total_pages': total_pages,
             'pagination': {
                 'total': total,
+                'total_is_estimate': total_is_estimate,
                 'page': page,
                 'per_page': per_page,
-                'pages': total_pages
+                'pages': total_pages,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         }), 200
     except Exception as e:
@@ -1462,6 +1083,7 @@ def get_blog_posts():
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
 @bp.route('/blog/<slug>', methods=['GET'])
+@cached_response('language', 'fields', tags=(TAG_BLOG, TAG_BLOG_LIST, TAG_LANGUAGES))
 def get_blog_post_by_slug(slug):
     """Get a specific published blog post by slug for public consumption"""
     try:
@@ -1508,9 +1130,6 @@ def get_blog_post_by_slug(slug):
                     "suggested_language": suggested_language
                 }), 404
     
-        # Format the post with comprehensive data
-        post_data = post.to_dict(include_translations=True, language=language)
-        
         # Get author details
         author = User.query.get(post.author_id)
         author_data = {
@@ -1521,6 +1140,7 @@ def get_blog_post_by_slug(slug):
         
         # Find related posts (similar tags, limit to 3)
         # Also filter related posts to only include those available in the requested language
+        # They keep the shape of Post.to_dict(): full content, all translations without a language
         if post.tags:
             tag_ids = [tag.id for tag in post.tags]
             related_posts_query = Post.query.filter(
@@ -1547,7 +1167,7 @@ def get_blog_post_by_slug(slug):
                 .limit(3)
             )
             
-            related_posts = [p.to_dict(include_translations=True, language=language) for p in related_posts_query.all()]
+            related_posts = [serialize_post(p, SHAPE_ADMIN, language=language) for p in related_posts_query.all()]
         else:
             # If no tags, get the latest 3 published posts that aren't this one
             related_posts_query = Post.query.filter(
@@ -1571,18 +1191,17 @@ def get_blog_post_by_slug(slug):
                 .limit(3)
             )
             
-            related_posts = [p.to_dict(include_translations=True, language=language) for p in related_posts_query.all()]
+            related_posts = [serialize_post(p, SHAPE_ADMIN, language=language) for p in related_posts_query.all()]
         
         # Get available languages for this post
         available_languages = []
         used_languages = set(trans.language_code for trans in post.translations)
-        all_languages = Language.query.all()
-        for lang in all_languages:
-            if lang.code in used_languages:
+        for lang in get_language_registry().all():
+            if lang['code'] in used_languages:
                 available_languages.append({
-                    "code": lang.code,
-                    "name": lang.name,
-                    "is_default": lang.is_default
+                    "code": lang['code'],
+                    "name": lang['name'],
+                    "is_default": lang['is_default']
                 })
         
         # Get the content for the requested language
@@ -1590,28 +1209,42 @@ def get_blog_post_by_slug(slug):
         title = None
         meta_description = None
         excerpt = None
+        word_count = None
+        reading_time = None
         for trans in post.translations:
             if (language and trans.language_code == language) or (not language and trans.language_code == 'en'):
                 content = trans.content
                 title = trans.title
                 meta_description = trans.meta_description
                 
-                # Generate excerpt from content if not provided
-                if trans.content:
-                    # Strip HTML tags and limit to ~200 characters
-                    import re
-                    plain_text = re.sub(r'<[^>]*>', '', trans.content)
-                    excerpt = plain_text[:200] + ('...' if len(plain_text) > 200 else '')
+                # Excerpt and reading time are stored on write; rows saved before
+                # that was added get them computed here
+                fields = trans if trans.content_hash else SimpleNamespace(**derive_text_fields(trans.content))
+                excerpt = fields.excerpt
+                word_count = fields.word_count
+                reading_time = fields.reading_time
                 break
         
+        # Cached until this post, its translations or a related post changes
+        add_cache_tags(post_tag(post.id), slug_tag(post.slug),
+                       *(post_tag(post.id, trans.language_code) for trans in post.translations))
+        for related in related_posts:
+            add_cache_tags(post_tag(related['id']))
+            # The chosen translation, or every translation when no language was requested
+            shown = [related['translation']] if related.get('translation') else related.get('translations', [])
+            add_cache_tags(*(post_tag(related['id'], trans['language_code']) for trans in shown))
+        
         # Return a more comprehensive response for the blog post page
-        return jsonify({
+        # (?fields=post.title,related_posts.slug trims it)
+        return jsonify(select_fields({
             "post": {
                 "id": post.id,
                 "slug": post.slug,
                 "title": title,
                 "content": content,
                 "excerpt": excerpt,
+                "word_count": word_count,
+                "reading_time": reading_time,
                 "meta_description": meta_description,
                 "featured_image": post.featured_image,
                 "created_at": post.created_at.isoformat(),
@@ -1623,7 +1256,7 @@ def get_blog_post_by_slug(slug):
             "related_posts": related_posts,
             "available_languages": available_languages,
             "current_language": language or "en"
-        }), 200
+        }, parse_fields(request.args.get('fields')))), 200
     except Exception as e:
         current_app.logger.error(f"Error in get_blog_post_by_slug: {str(e)}")
         import traceback
@@ -0,0 +1,300 @@
+"""
+Full-text search over blog post translations
+
+The blog search used to run LIKE '%term%' over every translation's HTML body.
+Translations are now indexed into cms_post_search_terms, one row per
+(translation, term), and a search only reads the rows of its query terms.
+
+Tokenizing:
+- the translation's stored plain text is used (HTML stripped on write)
+- text is NFKC-normalized and case-folded
+- whitespace languages are split into words
+- Chinese, Japanese and Thai are written without spaces, so runs of those
+  scripts are indexed as their single characters and overlapping character
+  bigrams ("東京都" -> "東", "京", "都", "東京", "京都"); a multi-character
+  query word matches wherever its bigrams all occur, a single character
+  wherever it occurs
+
+Ranking is tf-idf: each row stores a log-scaled term frequency with title
+occurrences boosted, and idf is computed per query. Every query term must
+match. Posts are ranked by their best-matching translation, preferring the
+requested language, and each hit gets a snippet with the terms in <mark>.
+
+The index is kept current from session events whenever a translation's
+title or content is committed. The background migrations fill it for
+existing posts (see app/utils/migrate_search_index.py), and
+rebuild_search_index.py rebuilds it; while it has no rows at all a search
+returns None so the caller falls back to LIKE.
+"""
+import html
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+from sqlalchemy import event, inspect, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models.cms import Post, PostTranslation, PostSearchTerm, Tag
+from app.utils.html_text import html_to_text
+
+logger = logging.getLogger('flask.app')
+
+TITLE_BOOST = 5
+MAX_TERM_LENGTH = 64
+SNIPPET_CHARS = 160
+
+# Scripts written without spaces between words: Thai, kana, CJK ideographs
+_UNSEGMENTED = '\u0e00-\u0e7f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN = re.compile(rf'(?P<run>[{_UNSEGMENTED}]+)|(?P<word>(?:(?![{_UNSEGMENTED}])[^\W_])+)')
+
+SearchHit = namedtuple('SearchHit', 'post_id translation_id language_code score')
+
+
+def tokenize(text, query=False):
+    """
+    Yield the terms of plain text.
+
+    Unsegmented runs yield their characters and bigrams; with query=True,
+    runs longer than one character only yield their bigrams, which already
+    pin down every character.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    for match in _TOKEN.finditer(text):
+        run = match.group('run')
+        if run:
+            if len(run) == 1 or not query:
+                yield from run
+            for i in range(len(run) - 1):
+                yield run[i:i + 2]
+            continue
+        word = match.group('word')
+        if len(word) > 1 or word.isdigit():
+            yield word[:MAX_TERM_LENGTH]
+
+
+def index_terms(title, plain_text):
+    """
+    Weighted terms of one translation.
+
+    Returns:
+        dict: term -> weight
+    """
+    counts = Counter(tokenize(plain_text))
+    for term in tokenize(title or ''):
+        counts[term] += TITLE_BOOST
+    return {term: 1 + math.log(count) for term, count in counts.items()}
+
+
+def _posting_rows(translation_id, post_id, language_code, title, plain_text):
+    return [
+        {
+            'term': term,
+            'translation_id': translation_id,
+            'post_id': post_id,
+            'language_code': language_code,
+            'weight': weight
+        }
+        for term, weight in index_terms(title, plain_text).items()
+    ]
+
+
+def index_translations(connection, translations, removed_ids=()):
+    """
+    Replace the postings of the given translations.
+
+    Args:
+        connection: Connection or session to execute on
+        translations: PostTranslation objects (or rows with the same attributes) to index
+        removed_ids: Ids of translations whose postings should only be dropped
+    """
+    table = PostSearchTerm.__table__
+    stale_ids = [translation.id for translation in translations] + list(removed_ids)
+    if stale_ids:
+        connection.execute(table.delete().where(table.c.translation_id.in_(stale_ids)))
+    rows = []
+    for translation in translations:
+        # plain_text is stored on write (see PostTranslation.refresh_text_fields)
+        plain_text = translation.plain_text if translation.plain_text is not None else html_to_text(translation.content)
+        rows.extend(_posting_rows(translation.id, translation.post_id, translation.language_code,
+                                  translation.title, plain_text))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def rebuild_index(batch_size=100):
+    """
+    Re-index every translation, in batches so the index stays usable meanwhile.
+
+    Returns:
+        int: Number of translations indexed
+    """
+    indexed = 0
+    last_id = 0
+    columns = (PostTranslation.id, PostTranslation.post_id, PostTranslation.language_code,
+               PostTranslation.title, PostTranslation.content, PostTranslation.plain_text)
+    while True:
+        batch = (db.session.query(*columns)
+                 .filter(PostTranslation.id > last_id)
+                 .order_by(PostTranslation.id)
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+        index_translations(db.session, batch)
+        db.session.commit()
+        indexed += len(batch)
+        last_id = batch[-1].id
+
+    # Postings left behind by translations deleted outside the ORM
+    table = PostSearchTerm.__table__
+    db.session.execute(table.delete().where(~table.c.translation_id.in_(db.session.query(PostTranslation.id))))
+    db.session.commit()
+    return indexed
+
+
+def search_posts(text, language=None, tag=None, page=1, per_page=10):
+    """
+    Rank published posts against a search query.
+
+    Args:
+        text: Search query
+        language: Preferred translation language for ties and snippets
+        tag: Tag slug to filter on
+        page: 1-based page number
+        per_page: Hits per page
+
+    Returns:
+        tuple: (list of SearchHit for the page, total number of matching posts),
+            or None if the query has no indexable terms or the index is empty
+    """
+    terms = sorted(set(tokenize(text, query=True)))
+    if not terms:
+        return None
+
+    query = (db.session.query(PostSearchTerm.translation_id, PostSearchTerm.post_id,
+                              PostSearchTerm.language_code, PostSearchTerm.term,
+                              PostSearchTerm.weight, Post.published_at)
+             .join(Post, Post.id == PostSearchTerm.post_id)
+             .filter(PostSearchTerm.term.in_(terms), Post.status == 'published'))
+    if tag:
+        query = query.filter(Post.tags.any(Tag.slug == tag))
+
+    matched = defaultdict(dict)
+    details = {}
+    for row in query:
+        matched[row.translation_id][row.term] = row.weight
+        details[row.translation_id] = row
+    if not matched:
+        # Not filled yet on a database that predates the index: let the caller use LIKE
+        if db.session.query(PostSearchTerm.translation_id).first() is None:
+            return None
+        return [], 0
+
+    documents = db.session.query(func.count(PostTranslation.id)).scalar() or 1
+    frequency = Counter(term for weights in matched.values() for term in weights)
+    idf = {term: math.log(1 + (documents - count + 0.5) / (count + 0.5)) for term, count in frequency.items()}
+
+    by_post = defaultdict(list)
+    for translation_id, weights in matched.items():
+        if len(weights) < len(terms):
+            continue
+        row = details[translation_id]
+        by_post[row.post_id].append(SearchHit(row.post_id, translation_id, row.language_code,
+                                              sum(weight * idf[term] for term, weight in weights.items())))
+
+    # A post ranks by its best translation but shows the requested language when that matched too
+    best = []
+    for hits in by_post.values():
+        top = max(hits, key=lambda hit: hit.score)
+        shown = next((hit for hit in hits if language and hit.language_code == language), top)
+        best.append(shown._replace(score=top.score))
+
+    published_at = {row.post_id: row.published_at or datetime.min for row in details.values()}
+    ranked = sorted(best, key=lambda hit: (hit.score, published_at[hit.post_id]), reverse=True)
+    start = (page - 1) * per_page
+    return ranked[start:start + per_page], len(ranked)
+
+
+def highlight(text, query, length=SNIPPET_CHARS):
+    """
+    An HTML-escaped excerpt of plain text around the first query match,
+    with matches wrapped in <mark>.
+    """
+    text = ' '.join(unicodedata.normalize('NFKC', text).split())
+    terms = sorted(set(tokenize(query, query=True)), key=len, reverse=True)
+    if not terms:
+        return html.escape(text[:length])
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+
+    first = pattern.search(text)
+    start = max(0, first.start() - length // 3) if first else 0
+    end = min(len(text), start + length)
+    excerpt = text[start:end]
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(html.escape(excerpt[position:]))
+    return ('…' if start > 0 else '') + ''.join(parts) + ('…' if end < len(text) else '')
+
+
+def snippets(hits, query):
+    """Highlighted snippets for a page of hits, keyed by post id"""
+    translation_ids = [hit.translation_id for hit in hits]
+    if not translation_ids:
+        return {}
+    # Stored plain text, or the HTML body for rows not backfilled yet
+    text = func.coalesce(PostTranslation.plain_text, PostTranslation.content).label('text')
+    rows = (db.session.query(PostTranslation.id, PostTranslation.title, text,
+                             PostTranslation.plain_text.is_(None).label('is_html'))
+            .filter(PostTranslation.id.in_(translation_ids)))
+    by_translation = {row.id: row for row in rows}
+    result = {}
+    for hit in hits:
+        row = by_translation.get(hit.translation_id)
+        if row is None:
+            continue
+        result[hit.post_id] = {
+            'score': round(hit.score, 4),
+            'language_code': hit.language_code,
+            'title': highlight(row.title or '', query, length=len(row.title or '')),
+            'snippet': highlight(html_to_text(row.text) if row.is_html else row.text, query)
+        }
+    return result
+
+
+# Incremental updates from session events
+
+def _reindex_flushed(session, flush_context):
+    changed = []
+    for instance in list(session.new) + list(session.dirty):
+        if not isinstance(instance, PostTranslation):
+            continue
+        state = inspect(instance)
+        if instance in session.new or any(state.attrs[name].history.has_changes()
+                                          for name in ('title', 'content', 'language_code', 'post_id')):
+            changed.append(instance)
+    removed = [instance.id for instance in session.deleted if isinstance(instance, PostTranslation)]
+    if changed or removed:
+        connection = session.connection()
+        try:
+            # In a savepoint: a failed index write is rolled back on its own and
+            # leaves the flushed translations and the rest of the transaction usable
+            with connection.begin_nested():
+                index_translations(connection, changed, removed)
+        except SQLAlchemyError as e:
+            # A missing table (index not migrated yet) must not break saving posts
+            logger.error(f"Could not update the blog search index: {e}")
+
+
+def register_index_hooks(session):
+    """Keep the search index in step with translations flushed through session"""
+    if not event.contains(session, 'after_flush', _reindex_flushed):
+        event.listen(session, 'after_flush', _reindex_flushed)
@@ -0,0 +1,157 @@
+"""
+JSON shapes of blog posts
+
+Post.to_dict() used to log several lines per post, scan post.translations
+once per language lookup and, without a language, emit every translation
+with its full HTML. Serialization now lives here, without logging, with one
+dict of translations per post, in three shapes:
+
+    list    - one translation (requested, else English, else the first) with a
+              content preview and the stored excerpt, plus available_languages
+    detail  - the same with the full content of the chosen translation
+    admin   - what Post.to_dict() returns: like detail with a language, or
+              every translation in full without one
+
+Endpoints accept ?fields= to trim the output, e.g.
+fields=id,slug,translation.title,translation.excerpt (see select_fields).
+"""
+FALLBACK_LANGUAGE = 'en'
+
+# List cards only show a short excerpt; the full body is loaded by the detail endpoint
+LIST_CONTENT_PREVIEW_CHARS = 600
+
+SHAPE_LIST = 'list'
+SHAPE_DETAIL = 'detail'
+SHAPE_ADMIN = 'admin'
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def serialize_translation(translation, shape=SHAPE_DETAIL):
+    """
+    Dict for a PostTranslation, or a row with the same attribute names.
+
+    In the list shape content is cut to LIST_CONTENT_PREVIEW_CHARS and flagged
+    with content_truncated.
+    """
+    result = {
+        'id': translation.id,
+        'post_id': translation.post_id,
+        'language_code': translation.language_code,
+        'title': translation.title,
+        'content': translation.content,
+        'excerpt': translation.excerpt,
+        'word_count': translation.word_count,
+        'reading_time': translation.reading_time,
+        'meta_title': translation.meta_title,
+        'meta_description': translation.meta_description,
+        'meta_keywords': translation.meta_keywords,
+        'is_auto_translated': translation.is_auto_translated,
+        'last_updated_at': _isoformat(translation.last_updated_at)
+    }
+    if shape == SHAPE_LIST:
+        content = translation.content or ''
+        result['content'] = content[:LIST_CONTENT_PREVIEW_CHARS]
+        result['content_truncated'] = len(content) > LIST_CONTENT_PREVIEW_CHARS
+    return result
+
+
+def choose_translation(translations, language):
+    """
+    Translation to show for a language: the requested one, else English, else the first.
+
+    Args:
+        translations: dict of language code -> translation, in their original order
+
+    Returns:
+        tuple: (translation or None, whether it is the requested language)
+    """
+    requested = language or FALLBACK_LANGUAGE
+    if requested in translations:
+        return translations[requested], True
+    if FALLBACK_LANGUAGE in translations:
+        return translations[FALLBACK_LANGUAGE], False
+    return next(iter(translations.values()), None), False
+
+
+def chosen_translation_dict(translation, is_requested_language, shape=SHAPE_DETAIL):
+    if translation is None:
+        return None
+    result = serialize_translation(translation, shape)
+    result['is_requested_language'] = is_requested_language
+    if not is_requested_language:
+        result['is_fallback'] = True
+    return result
+
+
+def serialize_post_fields(post):
+    """The post columns shared by every shape; media and tags must be loaded or loadable"""
+    return {
+        'id': post.id,
+        'slug': post.slug,
+        'featured_image': post.featured_image,
+        'author_id': post.author_id,
+        'status': post.status,
+        'created_at': _isoformat(post.created_at),
+        'updated_at': _isoformat(post.updated_at),
+        'published_at': _isoformat(post.published_at),
+        'media': [media.to_dict() for media in post.media],
+        'tags': [tag.to_dict() for tag in post.tags]
+    }
+
+
+def serialize_post(post, shape=SHAPE_LIST, language=None, include_translations=True):
+    """
+    Dict for a Post in one of the list, detail or admin shapes.
+
+    Args:
+        language: Translation to pick; in the admin shape, None means all translations
+        include_translations: Admin shape only, omit translations entirely when False
+    """
+    result = serialize_post_fields(post)
+    if shape == SHAPE_ADMIN and not include_translations:
+        return result
+
+    translations = {translation.language_code: translation for translation in post.translations}
+    if shape == SHAPE_ADMIN and not language:
+        result['translations'] = [serialize_translation(translation) for translation in translations.values()]
+        return result
+
+    translation, is_requested = choose_translation(translations, language)
+    result['translation'] = chosen_translation_dict(
+        translation, is_requested, SHAPE_LIST if shape == SHAPE_LIST else SHAPE_DETAIL
+    )
+    result['available_languages'] = list(translations)
+    return result
+
+
+def parse_fields(value):
+    """
+    Field selection from a fields= query parameter.
+
+    Returns:
+        dict or None: Nested dict of selected fields ({'translation': {'title': {}}}),
+            or None when every field is wanted
+    """
+    if not value:
+        return None
+    selection = {}
+    for path in value.split(','):
+        node = selection
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return selection or None
+
+
+def select_fields(data, selection):
+    """Keep only the selected fields of a dict (or each dict of a list)"""
+    if not selection:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, selection) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: select_fields(data[key], selection[key]) for key in selection if key in data}
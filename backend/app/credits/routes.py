@@ -1,6 +1,7 @@
 from flask import jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.models import User, CreditLog, db
+from app.utils.pagination import keyset_paginate, cursor_for, InvalidCursor
 from . import bp
 
 @bp.route('/history', methods=['GET'])
@@ -13,22 +14,41 @@ def get_credit_history():
         return jsonify({"error": "User not found"}), 404
 
     page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    cursor = request.args.get('cursor')  # next_cursor of the previous page; replaces page
+
+    keys = (CreditLog.timestamp, CreditLog.id)
+    query = CreditLog.query.filter_by(user_id=user.id)
 
     try:
-        credit_logs_pagination = CreditLog.query.filter_by(user_id=user.id)\
-            .order_by(CreditLog.timestamp.desc())\
-            .paginate(page=page, per_page=limit, error_out=False)
-        
-        credit_logs = credit_logs_pagination.items
-        
+        if cursor or page == 1:
+            # Keyset page on (user_id, timestamp, id); the total is only capped-counted after page 1
+            result = keyset_paginate(query, keys, limit, cursor=cursor,
+                                     total='approximate' if cursor else 'exact')
+            credit_logs, total, next_cursor = result.items, result.total, result.next_cursor
+            total_is_estimate = result.total_is_estimate
+        else:
+            # Page numbers past the first still work, with OFFSET
+            total = query.count()
+            credit_logs = query.order_by(*(key.desc() for key in keys))\
+                .offset((page - 1) * limit).limit(limit).all()
+            next_cursor = cursor_for(credit_logs[-1], keys) if credit_logs and page * limit < total else None
+            total_is_estimate = False
+
         return jsonify({
             "history": [log.to_dict() for log in credit_logs],
-            "total_pages": credit_logs_pagination.pages,
-            "current_page": page,
-            "total_items": credit_logs_pagination.total
+            # A cursor page has no page number, and its total is only an estimate
+            "total_pages": None if cursor else (total + limit - 1) // limit,
+            "current_page": None if cursor else page,
+            "total_items": total,
+            "total_is_estimate": total_is_estimate,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         # Log the exception e
         return jsonify({"error": "Could not retrieve credit history", "message": str(e)}), 500 
\ No newline at end of file
@@ -1,5 +1,10 @@
 from flask import Blueprint
 
+from .streaming import discard_spooled_uploads
+
 bp = Blueprint('matting', __name__, url_prefix='/matting')
 
-from . import routes
\ No newline at end of file
+# Remove spooled upload files the view did not keep (see streaming.py)
+bp.teardown_request(discard_spooled_uploads)
+
+from . import routes
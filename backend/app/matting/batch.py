@@ -0,0 +1,367 @@
+"""
+Batch matting for catalogs
+
+A batch request carries many images (as repeated file fields or a zip) and
+is answered in one round trip:
+
+1. Every image is saved and hashed; invalid entries get a per-item error.
+2. Credits for all valid images are reserved under a single row lock on the
+   user, counting jobs the user already has queued.
+3. Cached results are reused; the rest are sent to the matting backend by a
+   bounded thread pool (MATTING_BATCH_CONCURRENCY).
+4. MattingHistory and CreditLog rows for the whole batch are written with
+   one executemany each, and credits for failed images are refunded, in a
+   single transaction.
+
+The per-item results are stored on a MattingBatch row so the processed
+images can be downloaded later as a zip that is streamed, not built in memory.
+"""
+import json
+import logging
+import os
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.models import User, MattingHistory, CreditLog, MattingBatch
+from .service import process_image, generate_unique_filename
+from .cache import save_and_hash, get_result_cache, CHUNK_SIZE
+from .derivatives import generate_eagerly
+
+logger = logging.getLogger('flask.app')
+
+ITEM_COMPLETED = 'completed'
+ITEM_FAILED = 'failed'
+ITEM_REJECTED = 'rejected'
+
+
+class BatchItem:
+    """One image of a batch and its outcome"""
+
+    def __init__(self, index, filename):
+        self.index = index
+        self.filename = filename
+        self.original_path = None
+        self.processed_path = None
+        self.original_url = None
+        self.processed_url = None
+        self.content_hash = None
+        self.status = None
+        self.cached = False
+        self.credit_spent = 0
+        self.error = None
+
+    @property
+    def accepted(self):
+        return self.status != ITEM_REJECTED
+
+    def reject(self, error):
+        self.status = ITEM_REJECTED
+        self.error = error
+        return self
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'filename': self.filename,
+            'status': self.status,
+            'cached': self.cached,
+            'original_image': self.original_url,
+            'processed_image': self.processed_url if self.status == ITEM_COMPLETED else None,
+            'processed_file': os.path.basename(self.processed_path) if self.status == ITEM_COMPLETED else None,
+            'credit_spent': self.credit_spent,
+            'error': self.error
+        }
+
+
+def _is_zip(file):
+    return file.filename.lower().endswith('.zip') or file.mimetype in ('application/zip', 'application/x-zip-compressed')
+
+
+def _store_item(item, source, upload_folder, processed_folder, host):
+    """Save one image under a unique name and fill in its paths and URLs"""
+    unique_original = generate_unique_filename(secure_filename(item.filename) or 'image')
+    unique_processed = f"processed_{unique_original}"
+    item.original_path = os.path.join(upload_folder, unique_original)
+    item.processed_path = os.path.join(processed_folder, unique_processed)
+    item.original_url = f"{host}/api/uploads/{unique_original}"
+    item.processed_url = f"{host}/api/processed/{unique_processed}"
+    item.content_hash, _ = save_and_hash(source, item.original_path)
+
+
+def collect_items(files, upload_folder, processed_folder, host, allowed_file, max_items, max_file_bytes):
+    """
+    Save the uploaded images of a batch, expanding zip archives.
+
+    Args:
+        files: FileStorage objects from the request
+        allowed_file: Callable deciding whether a filename has an allowed extension
+        max_items: Maximum number of images in one batch
+        max_file_bytes: Largest uncompressed zip member accepted
+
+    Returns:
+        list: BatchItem objects in request order; rejected items carry an error
+    """
+    items = []
+
+    def next_item(filename):
+        return BatchItem(len(items), filename)
+
+    for file in files:
+        if not file or not file.filename:
+            continue
+        if _is_zip(file):
+            try:
+                with zipfile.ZipFile(file.stream) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or os.path.basename(info.filename).startswith('.'):
+                            continue
+                        item = next_item(os.path.basename(info.filename))
+                        items.append(item)
+                        if len(items) > max_items:
+                            item.reject('Batch size limit exceeded')
+                        elif not allowed_file(item.filename):
+                            item.reject('File type not allowed')
+                        elif info.file_size > max_file_bytes:
+                            item.reject('File too large')
+                        else:
+                            with archive.open(info) as member:
+                                _store_item(item, member, upload_folder, processed_folder, host)
+            except zipfile.BadZipFile:
+                items.append(next_item(file.filename).reject('Invalid zip archive'))
+            continue
+
+        item = next_item(file.filename)
+        items.append(item)
+        if len(items) > max_items:
+            item.reject('Batch size limit exceeded')
+        elif not allowed_file(file.filename):
+            item.reject('File type not allowed')
+        else:
+            _store_item(item, file, upload_folder, processed_folder, host)
+    return items
+
+
+def reserve_credits(user_id, count, pending):
+    """
+    Deduct credits for `count` images under a row lock, leaving enough for
+    the `pending` jobs the user already has queued.
+
+    Returns:
+        int or None: The balance before the reservation, or None if too low
+    """
+    user = User.query.filter_by(id=user_id).with_for_update().populate_existing().first()
+    if user is None or (user.credits or 0) < count + pending:
+        db.session.rollback()
+        return None
+    balance = user.credits
+    user.credits = balance - count
+    db.session.commit()
+    return balance
+
+
+def _process_items(app, items, concurrency):
+    """Run the uncached items through the matting backend concurrently"""
+    def run(item):
+        with app.app_context():
+            try:
+                ok = process_image(item.original_path, item.processed_path)
+            except Exception as e:
+                logger.error(f"Batch item {item.index} failed: {e}")
+                ok = False
+        item.status = ITEM_COMPLETED if ok else ITEM_FAILED
+        if not ok:
+            item.error = 'Failed to process image'
+
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items))),
+                            thread_name_prefix='matting-batch') as pool:
+        list(pool.map(run, items))
+
+
+def run_batch(app, user_id, items, balance_before, charge_cache_hits=True, concurrency=4):
+    """
+    Process the accepted items of a batch whose credits were reserved, then
+    record the results and refund what was not used.
+
+    Returns:
+        MattingBatch: The committed batch row
+    """
+    accepted = [item for item in items if item.accepted]
+    result_cache = get_result_cache(app)
+
+    to_process = []
+    for item in accepted:
+        cached_path = result_cache.lookup(item.content_hash)
+        if cached_path:
+            try:
+                result_cache.restore(cached_path, item.processed_path)
+                item.status = ITEM_COMPLETED
+                item.cached = True
+                continue
+            except OSError as e:
+                logger.warning(f"Could not restore cached result for batch item {item.index}: {e}")
+        to_process.append(item)
+
+    _process_items(app, to_process, concurrency)
+
+    for item in accepted:
+        if item.status == ITEM_COMPLETED:
+            item.credit_spent = 0 if item.cached and not charge_cache_hits else 1
+        elif item.status is None:
+            item.status = ITEM_FAILED
+
+    batch = record_batch(user_id, items, balance_before, reserved=len(accepted))
+
+    for item in accepted:
+        if item.status == ITEM_COMPLETED:
+            generate_eagerly(app, item.processed_path)
+
+    for item in to_process:
+        if item.status == ITEM_COMPLETED:
+            try:
+                result_cache.store(item.content_hash, item.original_path, item.processed_path)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Could not cache result of batch item {item.index}: {e}")
+    return batch
+
+
+def record_batch(user_id, items, balance_before, reserved):
+    """
+    Write history and credit log rows for a batch with one bulk insert each,
+    refund unused reserved credits and store the MattingBatch row.
+    """
+    now = datetime.utcnow()
+    batch_id = str(uuid.uuid4())
+    charged = [item for item in items if item.status == ITEM_COMPLETED]
+
+    history_rows = [{
+        'user_id': user_id,
+        'original_image_url': item.original_url,
+        'processed_image_url': item.processed_url,
+        'credit_spent': item.credit_spent,
+        'created_at': now
+    } for item in charged]
+
+    log_rows = []
+    balance = balance_before
+    for item in charged:
+        if not item.credit_spent:
+            continue
+        balance -= item.credit_spent
+        log_rows.append({
+            'user_id': user_id,
+            'timestamp': now,
+            'change_amount': -item.credit_spent,
+            'balance_after_change': balance,
+            'source_type': 'image_processing',
+            'source_details': json.dumps({
+                'matting_batch_id': batch_id,
+                'original_image_url': item.original_url,
+                'processed_image_url': item.processed_url,
+                'cached': item.cached
+            }),
+            'description': f'Processed image: {item.filename}'
+        })
+
+    spent = sum(item.credit_spent for item in charged)
+    batch = MattingBatch(
+        id=batch_id,
+        user_id=user_id,
+        item_count=len(items),
+        succeeded=len(charged),
+        credits_spent=spent,
+        items=json.dumps([item.to_dict() for item in items]),
+        created_at=now
+    )
+    try:
+        if history_rows:
+            db.session.execute(db.insert(MattingHistory), history_rows)
+        if log_rows:
+            db.session.execute(db.insert(CreditLog), log_rows)
+        refund = reserved - spent
+        if refund:
+            User.query.filter_by(id=user_id).update(
+                {'credits': User.credits + refund}, synchronize_session=False
+            )
+        db.session.add(batch)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.error(f"CRITICAL: Failed to record matting batch {batch_id} for user {user_id}; "
+                     f"{reserved} credits remain reserved", exc_info=True)
+        raise
+    return batch
+
+
+def release_reservation(user_id, count):
+    """Give back reserved credits when a batch could not run at all"""
+    User.query.filter_by(id=user_id).update(
+        {'credits': User.credits + count}, synchronize_session=False
+    )
+    db.session.commit()
+
+
+def discard_files(items):
+    """Delete the saved uploads of a batch that was refused"""
+    for item in items:
+        if item.original_path and os.path.exists(item.original_path):
+            os.remove(item.original_path)
+
+
+class _ZipStream:
+    """Write-only file object that hands written bytes to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_results_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    Generate a zip of processed images piece by piece.
+
+    Args:
+        entries: (path on disk, name inside the archive) pairs
+
+    Yields:
+        bytes: Consecutive pieces of the zip file
+    """
+    stream = _ZipStream()
+    # PNGs are already compressed; storing them keeps this cheap
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for path, name in entries:
+            if not os.path.exists(path):
+                continue
+            info = zipfile.ZipInfo.from_file(path, name)
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
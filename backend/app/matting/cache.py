@@ -0,0 +1,199 @@
+"""
+Content-addressed cache of matting results
+
+Uploads are hashed with SHA-256 while they are written to disk. Finished
+originals and processed images are hard-linked (or copied, across devices)
+into MATTING_CACHE_FOLDER under their hash and indexed in the matting_cache
+table. A repeat upload of the same bytes is answered from the cache without
+calling the matting API.
+
+The cache is bounded by MATTING_CACHE_MAX_BYTES and evicts least recently
+used entries. Eviction only removes the cache's own links, never the files
+in UPLOAD_FOLDER / PROCESSED_FOLDER that history rows point to.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+
+from app import db
+from app.models.models import MattingCacheEntry
+from .streaming import HashingSpoolFile
+
+logger = logging.getLogger('flask.app')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_and_hash(file, destination):
+    """
+    Stream an uploaded file to disk, hashing it in the same pass.
+
+    Uploads that werkzeug already spooled into the upload folder (see
+    streaming.spool_uploads_to) were hashed while being received and are
+    just renamed into place.
+
+    Args:
+        file: A werkzeug FileStorage (or any object with a readable .stream)
+        destination: Path to write the bytes to
+
+    Returns:
+        tuple: (hex SHA-256 digest, size in bytes)
+    """
+    stream = getattr(file, 'stream', file)
+    if isinstance(stream, HashingSpoolFile):
+        return stream.finalize(destination)
+
+    digest = hashlib.sha256()
+    size = 0
+    with open(destination, 'wb') as output:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            output.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _link_or_copy(source, destination):
+    """Hard-link source to destination, copying when linking is not possible"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class MattingResultCache:
+    """Index and storage for content-addressed matting results"""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, content_hash):
+        directory = os.path.join(self.folder, content_hash[:2])
+        return (os.path.join(directory, content_hash),
+                os.path.join(directory, f"{content_hash}.png"))
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, content_hash):
+        """
+        Find a cached result for the given hash and mark it as recently used.
+
+        Returns:
+            str or None: Path of the cached processed image
+        """
+        entry = MattingCacheEntry.query.get(content_hash)
+        _, processed = self._paths(content_hash)
+        if entry is None or not os.path.exists(processed):
+            if entry is not None:
+                db.session.delete(entry)
+                db.session.commit()
+            self._count(False)
+            return None
+
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_used_at = datetime.utcnow()
+        db.session.commit()
+        self._count(True)
+        return processed
+
+    def restore(self, cached_path, destination):
+        """Materialise a cached result at a new user-facing path"""
+        _link_or_copy(cached_path, destination)
+
+    def store(self, content_hash, original_path, processed_path):
+        """Add a finished result to the cache and evict if over budget"""
+        original_link, processed_link = self._paths(content_hash)
+        os.makedirs(os.path.dirname(original_link), exist_ok=True)
+        _link_or_copy(original_path, original_link)
+        _link_or_copy(processed_path, processed_link)
+
+        size = os.path.getsize(original_link) + os.path.getsize(processed_link)
+        entry = MattingCacheEntry.query.get(content_hash)
+        now = datetime.utcnow()
+        if entry is None:
+            entry = MattingCacheEntry(content_hash=content_hash, created_at=now, hit_count=0)
+            db.session.add(entry)
+        entry.size_bytes = size
+        entry.last_used_at = now
+        db.session.commit()
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        total = db.session.query(db.func.coalesce(db.func.sum(MattingCacheEntry.size_bytes), 0)).scalar()
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        for entry in MattingCacheEntry.query.order_by(MattingCacheEntry.last_used_at).all():
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(entry.content_hash):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= entry.size_bytes or 0
+            db.session.delete(entry)
+            removed += 1
+        db.session.commit()
+        logger.info(f"Matting cache evicted {removed} entries")
+        return removed
+
+    def stats(self):
+        """Hit/miss counters for this process plus totals from the index"""
+        entries, total_bytes, total_hits = db.session.query(
+            db.func.count(MattingCacheEntry.content_hash),
+            db.func.coalesce(db.func.sum(MattingCacheEntry.size_bytes), 0),
+            db.func.coalesce(db.func.sum(MattingCacheEntry.hit_count), 0)
+        ).one()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'entries': entries,
+            'total_bytes': int(total_bytes),
+            'max_bytes': self.max_bytes,
+            'total_hits': int(total_hits)
+        }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache(app=None):
+    """Return the process-wide result cache"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                if app is None:
+                    from flask import current_app
+                    app = current_app._get_current_object()
+                folder = app.config.get('MATTING_CACHE_FOLDER', 'app/static/matting_cache')
+                os.makedirs(folder, exist_ok=True)
+                _result_cache = MattingResultCache(
+                    folder,
+                    app.config.get('MATTING_CACHE_MAX_BYTES', 5 * 1024 ** 3)
+                )
+    return _result_cache
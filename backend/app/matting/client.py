@@ -0,0 +1,294 @@
+"""
+Shared HTTP client for the remote matting backend
+
+One pooled requests.Session is reused for every job so connections to the
+matting nodes are kept alive. Requests are spread round-robin over the nodes
+listed in MATTING_BACKEND_URLS. Each node has a circuit breaker: after
+consecutive failures it is skipped for a cool-down period, and when every
+node is open the client raises BackendUnavailable so callers can go straight
+to the local fallback engine instead of waiting on timeouts.
+
+Retries move to the next node and are limited by a retry budget (a fraction
+of recent requests), so a struggling backend is not hit with a retry storm.
+Latency is recorded in per-outcome histograms exposed by stats().
+
+Uploads are sent as a streamed multipart body and responses are returned
+unread (stream=True), so neither side of a large image is held in memory.
+"""
+import bisect
+import itertools
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .streaming import MultipartFileBody
+
+logger = logging.getLogger('flask.app')
+
+DEFAULT_BACKEND_URL = 'http://8.130.113.102:5000/api/process-image-api'
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+OUTCOME_SUCCESS = 'success'
+OUTCOME_HTTP_ERROR = 'http_error'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_CONNECTION_ERROR = 'connection_error'
+OUTCOME_CIRCUIT_OPEN = 'circuit_open'
+
+
+class BackendUnavailable(Exception):
+    """Raised when no matting node can take a request"""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open after `reset_timeout`"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a request may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Matting backend circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """
+    Allows retries up to `ratio` of the requests made in the last `window`
+    seconds, plus a small floor so an idle service can still retry.
+    """
+
+    def __init__(self, ratio=0.2, min_per_window=3, window=10):
+        self.ratio = ratio
+        self.min_per_window = min_per_window
+        self.window = window
+        self._requests = []
+        self._retries = []
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        cutoff = now - self.window
+        self._requests = [t for t in self._requests if t >= cutoff]
+        self._retries = [t for t in self._retries if t >= cutoff]
+
+    def record_request(self):
+        with self._lock:
+            self._requests.append(time.monotonic())
+
+    def try_spend(self):
+        """Consume a retry if the budget allows it"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowed = self.min_per_window + self.ratio * len(self._requests)
+            if len(self._retries) < allowed:
+                self._retries.append(now)
+                return True
+            return False
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, one per outcome"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = {}
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def observe(self, outcome, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self.counts.setdefault(outcome, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self.totals[outcome] = self.totals.get(outcome, 0.0) + seconds
+
+    def snapshot(self):
+        labels = [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+        with self._lock:
+            return {
+                outcome: {
+                    'count': sum(counts),
+                    'mean_seconds': round(self.totals[outcome] / sum(counts), 4) if sum(counts) else None,
+                    'buckets': dict(zip(labels, counts))
+                }
+                for outcome, counts in self.counts.items()
+            }
+
+
+class MattingBackendClient:
+    """Pooled, load-balanced client for the matting API nodes"""
+
+    def __init__(self, urls, connect_timeout=5, read_timeout=60, pool_size=10,
+                 max_attempts=3, failure_threshold=5, reset_timeout=30, retry_ratio=0.2):
+        if not urls:
+            raise ValueError("At least one matting backend URL is required")
+        self.urls = list(urls)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_attempts = max(1, max_attempts)
+        self.breakers = {url: CircuitBreaker(failure_threshold, reset_timeout) for url in self.urls}
+        self.retry_budget = RetryBudget(ratio=retry_ratio)
+        self.histogram = LatencyHistogram()
+        self._round_robin = itertools.cycle(range(len(self.urls)))
+        self._rr_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _next_node(self, exclude):
+        """Pick the next node in round-robin order whose breaker allows a request"""
+        with self._rr_lock:
+            start = next(self._round_robin)
+        for offset in range(len(self.urls)):
+            url = self.urls[(start + offset) % len(self.urls)]
+            if url not in exclude and self.breakers[url].allow():
+                return url
+        return None
+
+    def post_image(self, input_path, filename=None, content_type='image/jpeg'):
+        """
+        Send an image to a matting node.
+
+        The body is streamed from disk and the response is returned before
+        its body is read; the caller must consume or close it (see
+        streaming.stream_response_to_file).
+
+        Returns:
+            requests.Response: A streaming 200 response from the backend
+
+        Raises:
+            BackendUnavailable: If every node is open or all attempts failed
+        """
+        body = MultipartFileBody(input_path, filename=filename, content_type=content_type)
+        tried = set()
+        last_error = None
+        self.retry_budget.record_request()
+
+        for attempt in range(self.max_attempts):
+            if attempt > 0 and not self.retry_budget.try_spend():
+                logger.warning("Matting backend retry budget exhausted")
+                break
+
+            url = self._next_node(tried) or self._next_node(set())
+            if url is None:
+                self.histogram.observe(OUTCOME_CIRCUIT_OPEN, 0.0)
+                raise BackendUnavailable(last_error or "All matting backend circuits are open")
+            tried.add(url)
+
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    url,
+                    data=body,
+                    headers={'Content-Type': body.content_type},
+                    timeout=self.timeout,
+                    stream=True
+                )
+            except requests.exceptions.Timeout as e:
+                outcome, last_error = OUTCOME_TIMEOUT, f"Timeout from {url}: {e}"
+            except requests.exceptions.RequestException as e:
+                outcome, last_error = OUTCOME_CONNECTION_ERROR, f"Connection error from {url}: {e}"
+            else:
+                if response.status_code == 200:
+                    self.histogram.observe(OUTCOME_SUCCESS, time.monotonic() - started)
+                    self.breakers[url].record_success()
+                    return response
+                outcome = OUTCOME_HTTP_ERROR
+                last_error = f"{url} returned {response.status_code}: {response.text[:200]}"
+                response.close()
+                # Client errors are about the image, not the node; retrying will not help
+                if response.status_code < 500:
+                    self.histogram.observe(outcome, time.monotonic() - started)
+                    raise BackendUnavailable(last_error)
+
+            self.histogram.observe(outcome, time.monotonic() - started)
+            self.breakers[url].record_failure()
+            logger.warning(f"Matting backend attempt {attempt + 1} failed: {last_error}")
+
+        raise BackendUnavailable(last_error or "Matting backend request failed")
+
+    def stats(self):
+        """Breaker states and latency histograms for monitoring"""
+        return {
+            'nodes': {
+                url: {'state': breaker.state, 'consecutive_failures': breaker.failures}
+                for url, breaker in self.breakers.items()
+            },
+            'latency': self.histogram.snapshot()
+        }
+
+
+_backend_client = None
+_backend_client_lock = threading.Lock()
+
+
+def _config_value(app, key, default):
+    if app is not None:
+        return app.config.get(key, default)
+    value = os.environ.get(key)
+    return default if value is None else type(default)(value)
+
+
+def get_backend_client(app=None):
+    """Return the process-wide matting backend client"""
+    global _backend_client
+    if _backend_client is None:
+        with _backend_client_lock:
+            if _backend_client is None:
+                if app is None:
+                    from flask import current_app, has_app_context
+                    app = current_app._get_current_object() if has_app_context() else None
+                urls = _config_value(app, 'MATTING_BACKEND_URLS', DEFAULT_BACKEND_URL)
+                if isinstance(urls, str):
+                    urls = [url.strip() for url in urls.split(',') if url.strip()]
+                _backend_client = MattingBackendClient(
+                    urls,
+                    connect_timeout=_config_value(app, 'MATTING_BACKEND_CONNECT_TIMEOUT', 5.0),
+                    read_timeout=_config_value(app, 'MATTING_BACKEND_READ_TIMEOUT', 60.0),
+                    pool_size=_config_value(app, 'MATTING_BACKEND_POOL_SIZE', 10),
+                    max_attempts=_config_value(app, 'MATTING_BACKEND_MAX_ATTEMPTS', 3),
+                    failure_threshold=_config_value(app, 'MATTING_BACKEND_FAILURE_THRESHOLD', 5),
+                    reset_timeout=_config_value(app, 'MATTING_BACKEND_RESET_SECONDS', 30.0)
+                )
+    return _backend_client
@@ -0,0 +1,253 @@
+"""
+Resized and re-encoded variants of processed images
+
+The dashboard history grid only needs small previews, yet /api/processed
+used to send the full-size PNG every time. Variants are generated from the
+processed PNG and kept in an on-disk cache:
+
+    thumb   - longest edge 200px
+    preview - longest edge 800px
+    full    - original size
+
+Each variant can be encoded as PNG, WebP or AVIF (when Pillow supports it).
+Clients choose with ?variant=thumb|preview|full and optionally ?format=; for
+thumb and preview the format is otherwise negotiated from the Accept header.
+Without ?variant the original PNG is sent unchanged, so existing links and
+downloads keep their lossless file.
+
+Variants are made lazily on first request and, with MATTING_DERIVATIVES_EAGER,
+right after matting in a background thread. The cache is bounded by
+MATTING_DERIVATIVE_MAX_BYTES and evicts least recently used files.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
+
+logger = logging.getLogger('flask.app')
+
+VARIANTS = {
+    'thumb': 200,
+    'preview': 800,
+    'full': None,
+}
+
+FORMATS = {
+    'png': ('PNG', 'image/png', {'optimize': True}),
+    'webp': ('WEBP', 'image/webp', {'quality': 82, 'method': 4}),
+    'avif': ('AVIF', 'image/avif', {'quality': 60}),
+}
+
+# Preferred order when negotiating from the Accept header
+NEGOTIATION_ORDER = ('avif', 'webp')
+
+
+def supported_formats():
+    """Formats this Pillow build can encode"""
+    available = ['png']
+    if features.check('webp'):
+        available.append('webp')
+    if features.check('avif'):
+        available.append('avif')
+    return available
+
+
+def select_variant(request):
+    """
+    Work out which variant a request wants.
+
+    Returns:
+        tuple: (variant, format), or (None, None) for the original file
+    """
+    variant = request.args.get('variant')
+    requested_format = (request.args.get('format') or '').lower()
+    available = supported_formats()
+
+    if variant not in VARIANTS:
+        if requested_format in available and requested_format != 'png':
+            return 'full', requested_format
+        return None, None
+
+    if requested_format in available:
+        return variant, requested_format
+    if variant == 'full':
+        # Full size stays lossless unless a format is asked for explicitly
+        return 'full', 'png'
+    # Only formats the client names explicitly; */* is not taken as AVIF support
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    for candidate in NEGOTIATION_ORDER:
+        if candidate in available and FORMATS[candidate][1] in accepted:
+            return variant, candidate
+    return variant, 'png'
+
+
+def mimetype_for(image_format):
+    return FORMATS[image_format][1]
+
+
+class DerivativeCache:
+    """Size-bounded directory of generated variants"""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._total = None
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def path_for(self, source_path, variant, image_format):
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(self.folder, variant, f"{name}.{image_format}")
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, source_path, variant, image_format):
+        """
+        Return the path of a variant, generating it if needed.
+
+        Returns:
+            str or None: Path to the variant, or None if the source is missing
+        """
+        if not os.path.exists(source_path):
+            return None
+        if variant == 'full' and image_format == 'png':
+            return source_path
+
+        target = self.path_for(source_path, variant, image_format)
+        lock = self._key_lock(target)
+        with lock:
+            try:
+                if os.path.getmtime(target) >= os.path.getmtime(source_path):
+                    os.utime(target)  # mark as recently used for eviction
+                    return target
+            except FileNotFoundError:
+                pass
+            self._generate(source_path, target, variant, image_format)
+        with self._lock:
+            self._key_locks.pop(target, None)
+        self._account(os.path.getsize(target))
+        return target
+
+    def _generate(self, source_path, target, variant, image_format):
+        pil_format, _, options = FORMATS[image_format]
+        max_edge = VARIANTS[variant]
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with Image.open(source_path) as image:
+            if max_edge and max(image.size) > max_edge:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+            else:
+                image.load()
+            partial = f"{target}.part"
+            image.save(partial, format=pil_format, **options)
+        os.replace(partial, target)
+
+    def _scan(self):
+        total = 0
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def _account(self, added):
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan()
+            else:
+                self._total += added
+            over_budget = self._total > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used variants until the cache fits in max_bytes"""
+        files = []
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._total = total
+        if removed:
+            logger.info(f"Derivative cache evicted {removed} files")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan()
+            return {'total_bytes': self._total, 'max_bytes': self.max_bytes}
+
+
+_derivative_cache = None
+_derivative_cache_lock = threading.Lock()
+_eager_pool = None
+
+
+def get_derivative_cache(app=None):
+    """Return the process-wide derivative cache"""
+    global _derivative_cache
+    if _derivative_cache is None:
+        with _derivative_cache_lock:
+            if _derivative_cache is None:
+                if app is None:
+                    from flask import current_app
+                    app = current_app._get_current_object()
+                folder = app.config.get('MATTING_DERIVATIVE_FOLDER', 'app/static/processed_variants')
+                os.makedirs(folder, exist_ok=True)
+                _derivative_cache = DerivativeCache(
+                    folder,
+                    app.config.get('MATTING_DERIVATIVE_MAX_BYTES', 1024 ** 3)
+                )
+    return _derivative_cache
+
+
+def generate_eagerly(app, processed_path):
+    """
+    Queue thumb and preview variants of a freshly processed image, if
+    MATTING_DERIVATIVES_EAGER is on. Runs in a background thread.
+    """
+    global _eager_pool
+    if not app.config.get('MATTING_DERIVATIVES_EAGER', True):
+        return
+    formats = [name.strip().lower() for name in
+               app.config.get('MATTING_DERIVATIVE_EAGER_FORMATS', 'webp').split(',')]
+    formats = [name for name in formats if name in supported_formats()]
+    cache = get_derivative_cache(app)
+
+    with _derivative_cache_lock:
+        if _eager_pool is None:
+            _eager_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='matting-derivatives')
+
+    def generate():
+        for variant in ('thumb', 'preview'):
+            for image_format in formats:
+                try:
+                    cache.get(processed_path, variant, image_format)
+                except Exception as e:
+                    logger.warning(f"Could not generate {variant}.{image_format} for {processed_path}: {e}")
+
+    _eager_pool.submit(generate)
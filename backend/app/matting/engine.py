@@ -0,0 +1,227 @@
+"""
+Local matting engines used when the remote background-removal API is unavailable
+
+Every engine works on whole bands with Pillow's C-level operations (point
+lookup tables, ImageChops, filters) instead of visiting pixels from Python,
+so a 12MP photo takes a fraction of a second and releases the GIL while it
+runs. Large images are processed in tiles to keep intermediate bands small.
+
+Engines are registered by name in ENGINES and chosen with the
+MATTING_FALLBACK_ENGINE setting:
+
+    threshold  - pixels brighter than the threshold in every channel become transparent
+    feather    - a soft ramp around the threshold, blurred for smooth edges
+    floodfill  - like feather, but only background connected to the image border is removed
+"""
+import logging
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+logger = logging.getLogger('flask.app')
+
+DEFAULT_ENGINE = 'threshold'
+
+
+def _tile_boxes(size, tile_size):
+    """Yield (left, upper, right, lower) boxes covering an image of the given size"""
+    width, height = size
+    if not tile_size or tile_size <= 0:
+        yield (0, 0, width, height)
+        return
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            yield (left, top, min(left + tile_size, width), min(top + tile_size, height))
+
+
+def _expand_box(box, margin, size):
+    """Grow a box by margin pixels on each side, clamped to the image"""
+    left, top, right, bottom = box
+    width, height = size
+    return (max(0, left - margin), max(0, top - margin),
+            min(width, right + margin), min(height, bottom + margin))
+
+
+def _min_channel(tile):
+    """Per-pixel minimum of the R, G and B bands; high values mean whitish"""
+    r, g, b = tile.split()[:3]
+    return ImageChops.darker(ImageChops.darker(r, g), b)
+
+
+class LocalMattingEngine:
+    """Base class for local engines. Subclasses implement tile_mask()."""
+
+    name = None
+
+    def __init__(self, threshold=200, softness=40, feather_radius=1.5, tile_size=1024):
+        self.threshold = int(threshold)
+        self.softness = max(1, int(softness))
+        self.feather_radius = float(feather_radius)
+        self.tile_size = int(tile_size) if tile_size else 0
+
+    @property
+    def overlap(self):
+        """Extra pixels read around each tile so filters see their neighbours"""
+        return 0
+
+    def prepare(self, image):
+        """Compute whole-image state shared by every tile. Returns a context object."""
+        return None
+
+    def tile_mask(self, tile, box, context):
+        """
+        Return an 'L' mask for one tile: 255 keeps a pixel, 0 makes it transparent.
+
+        Args:
+            tile: RGBA crop of the image
+            box: Position of the crop within the full image
+            context: Whatever prepare() returned
+        """
+        raise NotImplementedError
+
+    def matte(self, image):
+        """Return an RGBA copy of image with the background made transparent"""
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
+        else:
+            image = image.copy()
+
+        context = self.prepare(image)
+        alpha = image.getchannel('A')
+        keep = Image.new('L', image.size, 0)
+        margin = self.overlap
+
+        for box in _tile_boxes(image.size, self.tile_size):
+            padded = _expand_box(box, margin, image.size)
+            tile_keep = self.tile_mask(image.crop(padded), padded, context)
+            if padded != box:
+                offset_x, offset_y = box[0] - padded[0], box[1] - padded[1]
+                tile_keep = tile_keep.crop((offset_x, offset_y,
+                                            offset_x + box[2] - box[0],
+                                            offset_y + box[3] - box[1]))
+            keep.paste(tile_keep, box[:2])
+
+        image.putalpha(ImageChops.multiply(alpha, keep))
+        return image
+
+    def process_file(self, input_path, output_path):
+        """Matte the image at input_path and save it as PNG to output_path"""
+        with Image.open(input_path) as source:
+            result = self.matte(source)
+        result.save(output_path, format='PNG')
+        return True
+
+
+class ThresholdEngine(LocalMattingEngine):
+    """Hard cut-out of pixels brighter than the threshold in all channels"""
+
+    name = 'threshold'
+
+    def tile_mask(self, tile, box, context):
+        threshold = self.threshold
+        lut = [0 if value > threshold else 255 for value in range(256)]
+        return _min_channel(tile).point(lut)
+
+
+class FeatherEngine(LocalMattingEngine):
+    """Soft cut-out: opacity ramps down across `softness` levels below the threshold"""
+
+    name = 'feather'
+
+    @property
+    def overlap(self):
+        return int(self.feather_radius * 3) + 1
+
+    def _ramp(self):
+        upper = self.threshold
+        lower = upper - self.softness
+        lut = []
+        for value in range(256):
+            if value <= lower:
+                lut.append(255)
+            elif value > upper:
+                lut.append(0)
+            else:
+                lut.append(int(255 * (upper - value) / self.softness))
+        return lut
+
+    def tile_mask(self, tile, box, context):
+        mask = _min_channel(tile).point(self._ramp())
+        if self.feather_radius > 0:
+            mask = mask.filter(ImageFilter.GaussianBlur(self.feather_radius))
+        return mask
+
+
+class FloodFillEngine(FeatherEngine):
+    """
+    Removes only background that is connected to the image border, so white
+    areas inside the subject (teeth, labels, highlights) are kept.
+
+    Connectivity is resolved on a downscaled copy by repeated 3x3 dilation
+    constrained to the background candidates, then scaled back up and
+    intersected with the full-resolution candidates.
+    """
+
+    name = 'floodfill'
+
+    connectivity_size = 256
+
+    def prepare(self, image):
+        candidates = _min_channel(image).point(
+            [255 if value > self.threshold - self.softness else 0 for value in range(256)]
+        )
+        scale = min(1.0, self.connectivity_size / max(image.size))
+        small_size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        small = candidates.resize(small_size, Image.BOX).point([255 if v > 127 else 0 for v in range(256)])
+
+        border = Image.new('L', small.size, 0)
+        ImageDraw.Draw(border).rectangle((0, 0, small.width - 1, small.height - 1), outline=255)
+        region = ImageChops.multiply(small, border)
+
+        # Grow a few steps between convergence checks; the check costs as much as a step
+        dilate = ImageFilter.MaxFilter(3)
+        for _ in range(small.width + small.height):
+            grown = region
+            for _ in range(4):
+                grown = ImageChops.multiply(grown.filter(dilate), small)
+            if ImageChops.difference(grown, region).getbbox() is None:
+                break
+            region = grown
+
+        # Pad by a pixel so block edges from the upscale do not clip the background
+        return region.filter(dilate).resize(image.size, Image.NEAREST)
+
+    def tile_mask(self, tile, box, context):
+        connected = context.crop(box)
+        keep = FeatherEngine.tile_mask(self, tile, box, None)
+        background = ImageChops.multiply(ImageChops.invert(keep), connected)
+        return ImageChops.invert(background)
+
+
+ENGINES = {
+    ThresholdEngine.name: ThresholdEngine,
+    FeatherEngine.name: FeatherEngine,
+    FloodFillEngine.name: FloodFillEngine,
+}
+
+
+def register_engine(engine_class):
+    """Make an engine selectable by its name"""
+    ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+
+def get_engine(name=None, **options):
+    """
+    Build a local matting engine.
+
+    Args:
+        name: Engine name from ENGINES; unknown names fall back to DEFAULT_ENGINE
+        **options: threshold, softness, feather_radius, tile_size
+
+    Returns:
+        LocalMattingEngine: The configured engine
+    """
+    engine_class = ENGINES.get(name or DEFAULT_ENGINE)
+    if engine_class is None:
+        logger.warning(f"Unknown matting engine '{name}', using '{DEFAULT_ENGINE}'")
+        engine_class = ENGINES[DEFAULT_ENGINE]
+    return engine_class(**options)
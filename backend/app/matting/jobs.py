@@ -0,0 +1,299 @@
+"""
+Background job queue for image matting
+
+Uploads are recorded as MattingJob rows and drained by a bounded pool of
+worker threads, so the request thread returns immediately instead of waiting
+on the external matting API. The table is the source of truth: workers claim
+rows atomically, which keeps several gunicorn processes from running the same
+job, and rows left behind by a crashed process are picked up again on start.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from queue import Queue, Empty
+
+from app import db
+from app.models.models import MattingJob, MattingHistory
+from app.credits.utils import log_credit_change
+from .service import process_image
+from .cache import get_result_cache
+from .derivatives import generate_eagerly
+
+logger = logging.getLogger('flask.app')
+
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+PENDING_STATUSES = (JOB_QUEUED, JOB_PROCESSING)
+
+
+class MattingJobQueue:
+    """Bounded worker pool that drains the persistent matting job queue"""
+
+    def __init__(self, app, workers=4, poll_interval=2.0, stale_after=300):
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._queue = Queue()
+        self._threads = []
+        self._stopping = threading.Event()
+        self._changed = threading.Condition()
+
+    def start(self):
+        """Requeue abandoned jobs and start the worker threads"""
+        if self._threads:
+            return
+        with self.app.app_context():
+            self._requeue_stale_jobs()
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"matting-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Matting job queue started with {self.workers} workers")
+
+    def stop(self, timeout=5):
+        """Signal the workers to exit and wait for them"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def create_job(self, user_id, original_filename, original_path, processed_path,
+                   original_image_url, processed_image_url, content_hash=None):
+        """Persist a new job row. The caller commits and then calls submit()."""
+        job = MattingJob(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            status=JOB_QUEUED,
+            original_filename=original_filename,
+            original_path=original_path,
+            processed_path=processed_path,
+            original_image_url=original_image_url,
+            processed_image_url=processed_image_url,
+            content_hash=content_hash
+        )
+        db.session.add(job)
+        return job
+
+    def submit(self, job_id):
+        """Hand a committed job to the local workers"""
+        self._queue.put(job_id)
+
+    def pending_count(self, user_id):
+        """Number of jobs a user has waiting or running"""
+        return MattingJob.query.filter(
+            MattingJob.user_id == user_id,
+            MattingJob.status.in_(PENDING_STATUSES)
+        ).count()
+
+    def wait_for(self, job_id, timeout):
+        """
+        Block until the job finishes or the timeout elapses.
+
+        Jobs may be completed by a worker in another process, so the row is
+        re-read on every wake-up rather than trusting the local notification.
+
+        Returns:
+            MattingJob or None: The latest job row, or None if it does not exist
+        """
+        deadline = time.monotonic() + max(0, timeout)
+        while True:
+            db.session.expire_all()
+            job = MattingJob.query.get(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _requeue_stale_jobs(self):
+        """Return jobs stuck in 'processing' by a dead worker to the queue"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        try:
+            count = MattingJob.query.filter(
+                MattingJob.status == JOB_PROCESSING,
+                MattingJob.started_at < cutoff
+            ).update({'status': JOB_QUEUED, 'started_at': None}, synchronize_session=False)
+            db.session.commit()
+            if count:
+                logger.warning(f"Requeued {count} stale matting jobs")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error requeueing stale matting jobs: {e}")
+
+    def _claim(self, job_id):
+        """Atomically move a job from queued to processing. Returns True if we own it."""
+        count = MattingJob.query.filter_by(id=job_id, status=JOB_QUEUED).update(
+            {'status': JOB_PROCESSING, 'started_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        return count == 1
+
+    def _claim_next_persisted(self):
+        """Claim the oldest queued job, including ones submitted by other processes"""
+        job = MattingJob.query.filter_by(status=JOB_QUEUED).order_by(MattingJob.created_at).first()
+        if job and self._claim(job.id):
+            return job.id
+        return None
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except Empty:
+                job_id = None
+
+            with self.app.app_context():
+                try:
+                    if job_id is None:
+                        job_id = self._claim_next_persisted()
+                    elif not self._claim(job_id):
+                        job_id = None
+                    if job_id:
+                        self._run(job_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Matting worker error for job {job_id}: {e}", exc_info=True)
+                    if job_id:
+                        self._mark_failed(job_id, 'Internal error while processing image')
+                finally:
+                    db.session.remove()
+                    if job_id:
+                        self._notify()
+
+    def _mark_failed(self, job_id, error):
+        try:
+            MattingJob.query.filter_by(id=job_id).update(
+                {'status': JOB_FAILED, 'error': error, 'completed_at': datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not mark matting job {job_id} as failed: {e}")
+
+    def _run(self, job_id):
+        """Process one claimed job and charge the user only if it succeeds"""
+        job = MattingJob.query.get(job_id)
+        if job is None:
+            return
+
+        started = time.monotonic()
+        if not process_image(job.original_path, job.processed_path):
+            self._mark_failed(job_id, 'Failed to process image')
+            return
+
+        history = record_matting_history(
+            user_id=job.user_id,
+            original_filename=job.original_filename,
+            original_image_url=job.original_image_url,
+            processed_image_url=job.processed_image_url,
+            credit_spent=1,
+            details={'matting_job_id': job.id}
+        )
+
+        job.status = JOB_COMPLETED
+        job.history_id = history.id
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+        logger.info(f"Matting job {job.id} completed in {time.monotonic() - started:.2f}s")
+        generate_eagerly(self.app, job.processed_path)
+
+        if job.content_hash:
+            try:
+                get_result_cache(self.app).store(job.content_hash, job.original_path, job.processed_path)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Could not cache result of matting job {job.id}: {e}")
+
+
+def record_matting_history(user_id, original_filename, original_image_url, processed_image_url,
+                           credit_spent=1, details=None):
+    """
+    Add the MattingHistory row for a finished image and deduct its credits.
+    The caller commits.
+
+    Returns:
+        MattingHistory: The new (flushed) history row
+    """
+    history = MattingHistory(
+        user_id=user_id,
+        original_image_url=original_image_url,
+        processed_image_url=processed_image_url,
+        credit_spent=credit_spent
+    )
+    db.session.add(history)
+    db.session.flush()
+
+    if credit_spent:
+        source_details = {
+            'matting_history_id': history.id,
+            'original_image_url': original_image_url,
+            'processed_image_url': processed_image_url
+        }
+        source_details.update(details or {})
+        log_entry = log_credit_change(
+            user_id=user_id,
+            change_amount=-credit_spent,
+            source_type='image_processing',
+            description=f'Processed image: {original_filename}',
+            source_details=json.dumps(source_details)
+        )
+        if not log_entry:
+            logger.error(f"CRITICAL: Failed to log credit change for image processing. User ID: {user_id}, Image: {original_filename}")
+    return history
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(app=None):
+    """Return the process-wide job queue, starting its workers on first use"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                if app is None:
+                    from flask import current_app
+                    app = current_app._get_current_object()
+                queue = MattingJobQueue(
+                    app,
+                    workers=app.config.get('MATTING_WORKERS', 4),
+                    poll_interval=app.config.get('MATTING_QUEUE_POLL_SECONDS', 2),
+                    stale_after=app.config.get('MATTING_JOB_STALE_SECONDS', 300)
+                )
+                queue.start()
+                _job_queue = queue
+    return _job_queue
+
+
+def resume_unfinished_jobs(app):
+    """Start the workers at boot if jobs were left queued or processing by the previous process"""
+    try:
+        unfinished = MattingJob.query.filter(MattingJob.status.in_(PENDING_STATUSES)).count()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Could not check for unfinished matting jobs: {e}")
+        return
+    if unfinished:
+        logger.info(f"Resuming {unfinished} unfinished matting jobs")
+        get_job_queue(app)
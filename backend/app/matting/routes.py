@@ -1,14 +1,22 @@
 import os
 import json
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, url_for, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from app.models.models import User, MattingHistory
+from app.models.models import User, MattingHistory, MattingJob, MattingBatch
 from app import db
 from . import bp
-from .service import process_image, generate_unique_filename
+from .service import generate_unique_filename, stage_stats
+from .jobs import get_job_queue, record_matting_history, JOB_COMPLETED, JOB_FAILED
+from .cache import get_result_cache, save_and_hash
+from .client import get_backend_client
+from .derivatives import generate_eagerly
+from .streaming import spool_uploads_to
+from .batch import (collect_items as collect_batch_items, reserve_credits, run_batch,
+                    release_reservation, discard_files as discard_batch_files, iter_results_zip)
+from app.utils.auth import admin_required
+from app.utils.pagination import keyset_paginate, InvalidCursor
 from datetime import datetime, timedelta
-from app.credits.utils import log_credit_change
 
 # Ensure we have access to os.path functions
 from os import path
@@ -29,9 +37,9 @@ def process_matting():
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    # Check if user has enough credits
-    if user.credits < 1:
-        return jsonify({"error": "Insufficient credits. Please recharge your account."}), 402
+    # Have werkzeug write the upload straight into the upload folder while
+    # hashing it, so saving it below is a rename instead of another copy
+    spool_uploads_to(request, current_app.config['UPLOAD_FOLDER'])
     
     # Check if file part exists in request
     if 'file' not in request.files:
@@ -47,6 +55,12 @@ def process_matting():
     if not allowed_file(file.filename):
         return jsonify({"error": "File type not allowed"}), 400
     
+    # Reserve credits for jobs that are already waiting so a burst of uploads
+    # cannot overdraw the account before the workers charge for them
+    job_queue = get_job_queue()
+    if user.credits < job_queue.pending_count(user.id) + 1:
+        return jsonify({"error": "Insufficient credits. Please recharge your account."}), 402
+    
     # Create secure filenames
     original_filename = secure_filename(file.filename)
     unique_original = generate_unique_filename(original_filename)
@@ -58,19 +72,196 @@ def process_matting():
     processed_folder = current_app.config['PROCESSED_FOLDER']
     
     original_path = upload_folder + '/' + unique_original
-    file.save(original_path)
-    
-    # Process image
+    content_hash, _ = save_and_hash(file, original_path)
     processed_path = processed_folder + '/' + unique_processed
-    success = process_image(original_path, processed_path)
-    
-    if not success:
-        return jsonify({"error": "Failed to process image"}), 500
     
     # Generate URLs for the images
-    # Import the os module at the top level
-    import os
+    host = get_public_host()
+    original_url = f"{host}/api/uploads/{unique_original}"
+    processed_url = f"{host}/api/processed/{unique_processed}"
+    
+    # The same bytes were processed before: reuse the result without calling the API
+    result_cache = get_result_cache()
+    cached_path = result_cache.lookup(content_hash)
+    if cached_path:
+        return cached_result_response(user, cached_path, original_filename, processed_path,
+                                      original_url, processed_url, content_hash)
+    
+    # Queue the job; credits are deducted by the worker once processing succeeds
+    job = job_queue.create_job(
+        user_id=user.id,
+        original_filename=original_filename,
+        original_path=original_path,
+        processed_path=processed_path,
+        original_image_url=original_url,
+        processed_image_url=processed_url,
+        content_hash=content_hash
+    )
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error queueing matting job: {e}. User ID: {user.id}, Image: {original_filename}")
+        return jsonify({"error": "Failed to queue image for processing"}), 500
+    job_queue.submit(job.id)
+    
+    # Clients may ask to wait briefly so small images still finish in one round trip
+    wait = request.values.get('wait', 0, type=float)
+    if wait > 0:
+        return job_status_response(job.id, wait)
+    
+    response = job.to_dict()
+    response["message"] = "Image queued for processing"
+    response["status_url"] = url_for('.get_job_status', job_id=job.id)
+    return jsonify(response), 202
+
+def cached_result_response(user, cached_path, original_filename, processed_path,
+                           original_url, processed_url, content_hash):
+    """Answer an upload from the result cache, charging according to MATTING_CACHE_CHARGE_HITS"""
+    credit_spent = 1 if current_app.config.get('MATTING_CACHE_CHARGE_HITS', True) else 0
+    try:
+        get_result_cache().restore(cached_path, processed_path)
+        history = record_matting_history(
+            user_id=user.id,
+            original_filename=original_filename,
+            original_image_url=original_url,
+            processed_image_url=processed_url,
+            credit_spent=credit_spent,
+            details={'content_hash': content_hash, 'cached': True}
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error serving cached matting result: {e}. User ID: {user.id}, Image: {original_filename}")
+        return jsonify({"error": "Failed to finalize image processing transaction"}), 500
     
+    generate_eagerly(current_app._get_current_object(), processed_path)
+    
+    return jsonify({
+        "message": "Image processed successfully",
+        "status": JOB_COMPLETED,
+        "cached": True,
+        "original_image": original_url,
+        "processed_image": processed_url,
+        "credits_remaining": user.credits,
+        "history_id": history.id
+    }), 200
+
+@bp.route('/batch', methods=['POST'])
+@jwt_required()
+def process_batch():
+    """Process many images in one request; send files as 'files' (repeated) or a zip"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    spool_uploads_to(request, current_app.config['UPLOAD_FOLDER'])
+    files = request.files.getlist('files') + request.files.getlist('file')
+    if not files:
+        return jsonify({"error": "No files in the request"}), 400
+
+    items = collect_batch_items(
+        files,
+        current_app.config['UPLOAD_FOLDER'],
+        current_app.config['PROCESSED_FOLDER'],
+        get_public_host(),
+        allowed_file,
+        max_items=current_app.config.get('MATTING_BATCH_MAX_ITEMS', 100),
+        max_file_bytes=current_app.config.get('MATTING_BATCH_MAX_FILE_BYTES', 50 * 1024 ** 2)
+    )
+    accepted = [item for item in items if item.accepted]
+    if not accepted:
+        return jsonify({
+            "error": "No valid images in the batch",
+            "items": [item.to_dict() for item in items]
+        }), 400
+
+    # One locked check for the whole batch; unused credits are refunded afterwards
+    balance = reserve_credits(user.id, len(accepted), get_job_queue().pending_count(user.id))
+    if balance is None:
+        discard_batch_files(items)
+        return jsonify({
+            "error": "Insufficient credits. Please recharge your account.",
+            "required": len(accepted)
+        }), 402
+
+    try:
+        batch = run_batch(
+            current_app._get_current_object(),
+            user.id,
+            items,
+            balance,
+            charge_cache_hits=current_app.config.get('MATTING_CACHE_CHARGE_HITS', True),
+            concurrency=current_app.config.get('MATTING_BATCH_CONCURRENCY', 4)
+        )
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error processing matting batch: {e}. User ID: {user.id}")
+        release_reservation(user.id, len(accepted))
+        return jsonify({"error": "Failed to process batch"}), 500
+
+    db.session.refresh(user)
+    response = batch.to_dict()
+    response["credits_remaining"] = user.credits
+    response["download_url"] = url_for('.download_batch', batch_id=batch.id)
+    return jsonify(response), 200
+
+@bp.route('/batch/<batch_id>', methods=['GET'])
+@jwt_required()
+def get_batch(batch_id):
+    """Get the per-item results of a batch"""
+    user_id = get_jwt_identity()
+    batch = MattingBatch.query.filter_by(id=batch_id, user_id=user_id).first()
+    if not batch:
+        return jsonify({"error": "Matting batch not found or not authorized"}), 404
+
+    response = batch.to_dict()
+    response["download_url"] = url_for('.download_batch', batch_id=batch.id)
+    return jsonify(response), 200
+
+@bp.route('/batch/<batch_id>/download', methods=['GET'])
+@jwt_required()
+def download_batch(batch_id):
+    """Download the processed images of a batch as a streamed zip"""
+    user_id = get_jwt_identity()
+    batch = MattingBatch.query.filter_by(id=batch_id, user_id=user_id).first()
+    if not batch:
+        return jsonify({"error": "Matting batch not found or not authorized"}), 404
+
+    processed_folder = current_app.config['PROCESSED_FOLDER']
+    entries = []
+    for item in json.loads(batch.items):
+        if item.get('processed_file'):
+            name, _ = path.splitext(secure_filename(item['filename']) or 'image')
+            entries.append((path.join(processed_folder, item['processed_file']),
+                            f"{item['index'] + 1:04d}_{name}.png"))
+
+    return Response(
+        iter_results_zip(entries),
+        mimetype='application/zip',
+        headers={"Content-Disposition": f"attachment; filename=matting_batch_{batch.id}.zip"}
+    )
+
+@bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_cache_stats():
+    """Get hit/miss counters and size of the matting result cache"""
+    return jsonify(get_result_cache().stats()), 200
+
+@bp.route('/backend/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_backend_stats():
+    """Get circuit breaker states, latency histograms and pre-processing totals for the matting backend"""
+    stats = get_backend_client().stats()
+    stats['stages'] = stage_stats.snapshot()
+    return jsonify(stats), 200
+
+def get_public_host():
+    """Return the external base URL used in image links"""
     # Hardcode the external URL for now to ensure consistent URLs
     host = "https://e3d010d3-10b7-4398-916c-9569531b7cb9-00-nzrxz81n08w.kirk.replit.dev"
     
@@ -90,54 +281,36 @@ def process_matting():
             server_url = current_app.config.get('SERVER_EXTERNAL_URL')
             if server_url:
                 host = server_url
-            
-    original_url = f"{host}/api/uploads/{unique_original}"
-    processed_url = f"{host}/api/processed/{unique_processed}"
-    
-    # Deduct credit from user
-    # This will be handled by log_credit_change now
-    # user.credits -= 1 
-    credit_deducted = 1
-    
-    # Record the matting history
-    history = MattingHistory(
-        user_id=user.id,
-        original_image_url=original_url,
-        processed_image_url=processed_url,
-        credit_spent=credit_deducted
-    )
-    db.session.add(history) # Add history first
-
-    # Log the credit change
-    log_entry = log_credit_change(
-        user_id=user.id,
-        change_amount=-credit_deducted,
-        source_type='image_processing',
-        description=f'Processed image: {original_filename}', # Use original_filename for clarity
-        source_details=json.dumps({'matting_history_id': history.id, 'original_image_url': original_url, 'processed_image_url': processed_url})
-    )
+    return host
 
-    if not log_entry:
-        # If logging fails, we might want to roll back the credit deduction and history, 
-        # or at least log a critical error. For now, we proceed but this is a point of consideration.
-        # db.session.rollback() # Example: Rollback if credit logging is absolutely critical to be atomic with deduction
-        current_app.logger.error(f"CRITICAL: Failed to log credit change for image processing. User ID: {user.id}, Image: {original_filename}")
-        # Potentially return an error to the user or mark the transaction for review
+def job_status_response(job_id, wait=0):
+    """Build the status response for a job, long-polling up to `wait` seconds"""
+    max_wait = current_app.config.get('MATTING_JOB_MAX_WAIT_SECONDS', 30)
+    job = get_job_queue().wait_for(job_id, min(wait, max_wait))
+    if not job:
+        return jsonify({"error": "Matting job not found"}), 404
+    
+    response = job.to_dict()
+    if job.status == JOB_COMPLETED:
+        user = User.query.get(job.user_id)
+        response["message"] = "Image processed successfully"
+        response["credits_remaining"] = user.credits if user else None
+        return jsonify(response), 200
+    if job.status == JOB_FAILED:
+        return jsonify(response), 200
+    return jsonify(response), 202
 
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Error during commit for image processing: {e}. User ID: {user.id}, Image: {original_filename}")
-        return jsonify({"error": "Failed to finalize image processing transaction"}), 500
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    """Get the status of a matting job. Pass ?wait=<seconds> to long-poll."""
+    user_id = get_jwt_identity()
+    job = MattingJob.query.filter_by(id=job_id, user_id=user_id).first()
+    if not job:
+        return jsonify({"error": "Matting job not found or not authorized"}), 404
     
-    return jsonify({
-        "message": "Image processed successfully",
-        "original_image": original_url,
-        "processed_image": processed_url,
-        "credits_remaining": user.credits,
-        "history_id": history.id
-    }), 200
+    wait = request.args.get('wait', 0, type=float)
+    return job_status_response(job.id, wait)
 
 @bp.route('/history', methods=['GET'])
 @jwt_required()
@@ -149,11 +322,26 @@ def get_history():
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    # Get history entries for the user
-    history = MattingHistory.query.filter_by(user_id=user.id).order_by(MattingHistory.created_at.desc()).all()
+    # Newest first, one keyset page at a time (see app/utils/pagination.py)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 100))
+    total = request.args.get('total')  # optional: 'exact' or 'approximate'
+    try:
+        page = keyset_paginate(
+            MattingHistory.query.filter_by(user_id=user.id),
+            (MattingHistory.created_at, MattingHistory.id),
+            limit,
+            cursor=request.args.get('cursor'),
+            total=total if total in ('exact', 'approximate') else None
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     
     return jsonify({
-        "history": [entry.to_dict() for entry in history]
+        "history": [entry.to_dict() for entry in page.items],
+        "next_cursor": page.next_cursor,
+        "has_more": page.has_more,
+        "total": page.total,
+        "total_is_estimate": page.total_is_estimate
     }), 200
 
 @bp.route('/history/<int:id>', methods=['GET'])
@@ -173,121 +361,3 @@ def get_matting_detail(id):
         return jsonify({"error": "Matting history not found or not authorized"}), 404
     
     return jsonify(history.to_dict()), 200
-
-from threading import Lock
-from queue import Queue
-import time
-
-request_queue = Queue(maxsize=10)
-queue_lock = Lock()
-
-def process_queue():
-    while True:
-        if not request_queue.empty():
-            with queue_lock:
-                request = request_queue.get()
-                # Process request
-                time.sleep(1)  # Rate limiting
-
-# Sample data for matting history
-mock_matting_history = [
-    {
-        'id': 1,
-        'created_at': (datetime.now() - timedelta(days=5)).isoformat(),
-        'image_url': '/static/samples/matting1_result.png',
-        'original_url': '/static/samples/matting1_original.jpg',
-        'status': 'completed',
-        'type': 'background_removal'
-    },
-    {
-        'id': 2,
-        'created_at': (datetime.now() - timedelta(days=3)).isoformat(),
-        'image_url': '/static/samples/matting2_result.png',
-        'original_url': '/static/samples/matting2_original.jpg',
-        'status': 'completed',
-        'type': 'background_change'
-    },
-    {
-        'id': 3,
-        'created_at': (datetime.now() - timedelta(days=1)).isoformat(),
-        'image_url': '/static/samples/matting3_result.png',
-        'original_url': '/static/samples/matting3_original.jpg',
-        'status': 'completed',
-        'type': 'background_removal'
-    }
-]
-
-@bp.route('/history', methods=['GET'])
-def get_matting_history():
-    """Get user's image matting history"""
-    # In a real app, we would fetch from database based on user_id
-    # from authenticated session
-    
-    current_app.logger.info('Fetching matting history')
-    
-    # Add pagination parameters (optional)
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 10, type=int)
-    
-    # Return mock data for now
-    return jsonify({
-        'success': True,
-        'history': mock_matting_history,
-        'pagination': {
-            'total': len(mock_matting_history),
-            'page': page,
-            'limit': limit
-        }
-    })
-
-# Sample data for matting history
-mock_matting_history = [
-    {
-        'id': 1,
-        'created_at': (datetime.now() - timedelta(days=5)).isoformat(),
-        'image_url': '/static/samples/matting1_result.png',
-        'original_url': '/static/samples/matting1_original.jpg',
-        'status': 'completed',
-        'type': 'background_removal'
-    },
-    {
-        'id': 2,
-        'created_at': (datetime.now() - timedelta(days=3)).isoformat(),
-        'image_url': '/static/samples/matting2_result.png',
-        'original_url': '/static/samples/matting2_original.jpg',
-        'status': 'completed',
-        'type': 'background_change'
-    },
-    {
-        'id': 3,
-        'created_at': (datetime.now() - timedelta(days=1)).isoformat(),
-        'image_url': '/static/samples/matting3_result.png',
-        'original_url': '/static/samples/matting3_original.jpg',
-        'status': 'completed',
-        'type': 'background_removal'
-    }
-]
-
-@bp.route('/history', methods=['GET'])
-def get_matting_history():
-    """Get user's image matting history"""
-    # In a real app, we would fetch from database based on user_id
-    # from authenticated session
-    
-    current_app.logger.info('Fetching matting history')
-    
-    # Add pagination parameters (optional)
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 10, type=int)
-    
-    # Return mock data for now
-    return jsonify({
-        'success': True,
-        'history': mock_matting_history,
-        'pagination': {
-            'total': len(mock_matting_history),
-            'page': page,
-            'limit': limit
-        }
-    })
-
@@ -1,14 +1,82 @@
 import os
-import uuid
-from PIL import Image
+import threading
 import time
+import uuid
+from PIL import Image, ImageOps
+from flask import current_app, has_app_context
+from .engine import get_engine
+from .client import get_backend_client, BackendUnavailable
+from .streaming import stream_response_to_file
+
+ORIENTATION_TAG = 0x0112
+
+# Formats the pre-processing stage may re-encode to, with the upload content type
+PREPROCESS_FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+
+
+class StageStats:
+    """Running totals of time and bytes for the pre/post-processing stages"""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, bytes_in=0, bytes_out=0):
+        with self._lock:
+            totals = self._totals.setdefault(stage, {'count': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['bytes_in'] += bytes_in
+            totals['bytes_out'] += bytes_out
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                stage: {
+                    'count': totals['count'],
+                    'mean_seconds': round(totals['seconds'] / totals['count'], 4),
+                    'bytes_in': totals['bytes_in'],
+                    'bytes_out': totals['bytes_out'],
+                    'bytes_saved': totals['bytes_in'] - totals['bytes_out']
+                }
+                for stage, totals in self._totals.items()
+            }
+
+
+stage_stats = StageStats()
+
+
+class PreparedImage:
+    """Result of preprocess_image(): what to send for matting and how it differs from the upload"""
+
+    def __init__(self, path, content_type, original_size, size, resized, temporary):
+        self.path = path
+        self.content_type = content_type
+        self.original_size = original_size
+        self.size = size
+        self.resized = resized
+        self.temporary = temporary
+
+    def cleanup(self):
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
 
 def process_image(input_path, output_path):
     """
     Process the image to remove background using an external API
 
     This function sends the image to a specialized background removal API 
-    and saves the processed result.
+    and saves the processed result. If the backend is unavailable (including
+    when its circuit breaker is open) the local fallback engine is used.
+
+    Unless MATTING_PREPROCESS is off, the image is first oriented, capped at
+    MATTING_MAX_EDGE and re-encoded (see preprocess_image), and with
+    MATTING_UPSCALE_ALPHA the resulting mask is applied to the full-size
+    original afterwards.
 
     Args:
         input_path: Path to the original image
@@ -17,74 +85,190 @@ def process_image(input_path, output_path):
     Returns:
         bool: True if processing was successful, False otherwise
     """
-    import requests
-
-    # External API endpoint for image processing
-    API_URL = 'http://8.130.113.102:5000/api/process-image-api'
+    prepared = None
+    if _setting('MATTING_PREPROCESS', True):
+        try:
+            prepared = preprocess_image(input_path)
+        except Exception as e:
+            print(f"Pre-processing failed, sending the original image: {e}")
+    source_path = prepared.path if prepared else input_path
 
     try:
-        # Open the file in binary mode
-        with open(input_path, 'rb') as file:
-            # Create the multipart form data
-            files = {'file': (os.path.basename(input_path), file, 'image/jpeg')}
+        if not _remove_background(source_path, output_path,
+                                  prepared.content_type if prepared else 'image/jpeg'):
+            return False
+        if prepared and prepared.resized and _setting('MATTING_UPSCALE_ALPHA', True):
+            try:
+                upscale_alpha(input_path, output_path)
+            except Exception as e:
+                print(f"Could not upscale the mask, keeping the reduced result: {e}")
+        return True
+    finally:
+        if prepared:
+            prepared.cleanup()
 
-            # Make the API request
-            print(f"Sending request to {API_URL} for image processing...")
-            response = requests.post(API_URL, files=files, timeout=60)
+def _remove_background(input_path, output_path, content_type):
+    """Run the matting API on input_path, falling back to a local engine"""
+    client = get_backend_client()
 
-            # Check if the request was successful
-            if response.status_code != 200:
-                print(f"API request failed with status code: {response.status_code}")
-                print(f"Response content: {response.text}")
-                return False
+    try:
+        # Send the image to the next available matting node
+        print(f"Sending request to matting backend for image processing...")
+        response = client.post_image(input_path, content_type=content_type)
 
-            # Save the processed image
-            with open(output_path, 'wb') as output_file:
-                output_file.write(response.content)
+        # Save the processed image as it arrives instead of buffering it
+        stream_response_to_file(response, output_path)
 
-            print(f"Successfully processed image and saved to {output_path}")
-            return True
+        print(f"Successfully processed image and saved to {output_path}")
+        return True
 
+    except BackendUnavailable as e:
+        print(f"Matting backend unavailable: {e}")
     except Exception as e:
         print(f"Error processing image: {e}")
+
+    # Fallback to local processing if the API call fails
+    if not _setting('MATTING_LOCAL_FALLBACK', True):
         return False
+    print("API call failed. Using fallback processing method...")
+    return process_image_locally(input_path, output_path)
+
+def _open_oriented(input_path, max_edge=None):
+    """
+    Open an image upright, decoding JPEGs at reduced scale when it is larger than max_edge.
+
+    Returns:
+        tuple: (PIL image, format of the file, full-size (width, height), whether it was rotated)
+    """
+    image = Image.open(input_path)
+    file_format = 'JPEG' if image.format == 'MPO' else image.format
+    full_size = image.size
+    if max_edge and file_format == 'JPEG' and max(full_size) > max_edge:
+        # draft() makes the JPEG decoder itself scale by 1/2, 1/4 or 1/8,
+        # never below the requested size, which is far cheaper than resizing
+        ratio = max_edge / max(full_size)
+        image.draft('RGB', (int(image.width * ratio), int(image.height * ratio)))
+
+    rotated = image.getexif().get(ORIENTATION_TAG, 1) not in (0, 1)
+    if rotated:
+        upright = ImageOps.exif_transpose(image)
+        image.close()
+        image = upright
+    return image, file_format, full_size, rotated
 
-    # Fallback to simple processing if the API call fails
+def preprocess_image(input_path):
+    """
+    Prepare an upload for matting: apply EXIF orientation, cap the longest
+    edge at MATTING_MAX_EDGE and re-encode as MATTING_PREPROCESS_FORMAT.
+
+    Images that already fit, are upright and are in an accepted format are
+    sent unchanged. Images with transparency are re-encoded as PNG rather
+    than JPEG so the existing alpha is not lost.
+
+    Returns:
+        PreparedImage: The file to send; call cleanup() when done
+    """
+    started = time.monotonic()
+    original_size = os.path.getsize(input_path)
+    max_edge = _setting('MATTING_MAX_EDGE', 2048)
+    target_format = _setting('MATTING_PREPROCESS_FORMAT', 'JPEG').upper()
+    if target_format not in PREPROCESS_FORMATS:
+        target_format = 'JPEG'
+
+    image, file_format, full_size, rotated = _open_oriented(input_path, max_edge)
     try:
-        print("API call failed. Using fallback processing method...")
-        # Open the input image
-        image = Image.open(input_path)
-
-        # Convert to RGBA if it isn't already
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-
-        # Create a new image with transparency
-        width, height = image.size
-        new_image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-
-        # Process the image - simple placeholder effect
-        pixels = image.load()
-        new_pixels = new_image.load()
-
-        # Simple processing - make bright pixels more transparent
-        for y in range(height):
-            for x in range(width):
-                r, g, b, a = pixels[x, y]
-                # Simple adjustment
-                if r > 200 and g > 200 and b > 200:  # If pixel is whitish
-                    a = 0  # Make it transparent
-                new_pixels[x, y] = (r, g, b, a)
-
-        # Save the processed image
-        new_image.save(output_path, format='PNG')
-        print(f"Used fallback processing and saved to {output_path}")
+        too_large = bool(max_edge) and max(full_size) > max_edge
+        if not too_large and not rotated and file_format in PREPROCESS_FORMATS:
+            stage_stats.record('preprocess', time.monotonic() - started, original_size, original_size)
+            return PreparedImage(input_path, PREPROCESS_FORMATS[file_format][1],
+                                 original_size, original_size, resized=False, temporary=False)
+
+        if too_large:
+            # reducing_gap lets Pillow use reduce() for the bulk of the shrink
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        output_format = 'PNG' if has_alpha and target_format == 'JPEG' else target_format
+        extension, content_type = PREPROCESS_FORMATS[output_format]
+        if output_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        prepared_path = f"{os.path.splitext(input_path)[0]}.prep{extension}"
+        save_options = {'optimize': True}
+        if output_format in ('JPEG', 'WEBP'):
+            save_options['quality'] = _setting('MATTING_PREPROCESS_QUALITY', 90)
+        image.save(prepared_path, format=output_format, **save_options)
+    finally:
+        image.close()
+
+    prepared_size = os.path.getsize(prepared_path)
+    elapsed = time.monotonic() - started
+    stage_stats.record('preprocess', elapsed, original_size, prepared_size)
+    print(f"Pre-processed {full_size[0]}x{full_size[1]} image in {elapsed:.2f}s: "
+          f"{original_size} -> {prepared_size} bytes")
+    return PreparedImage(prepared_path, content_type, original_size, prepared_size,
+                         resized=too_large, temporary=True)
+
+def upscale_alpha(original_path, output_path):
+    """
+    Replace a reduced-size matting result with the full-resolution original
+    cut out by the result's alpha mask, scaled up to match.
+    """
+    started = time.monotonic()
+    reduced_bytes = os.path.getsize(output_path)
+    with Image.open(output_path) as result:
+        mask = result.convert('RGBA').getchannel('A')
+
+    original, _, _, _ = _open_oriented(original_path)
+    try:
+        full = original.convert('RGBA')
+    finally:
+        original.close()
+    if mask.size != full.size:
+        mask = mask.resize(full.size, Image.LANCZOS)
+    full.putalpha(mask)
+    full.save(output_path, format='PNG')
+
+    stage_stats.record('upscale_alpha', time.monotonic() - started,
+                       reduced_bytes, os.path.getsize(output_path))
+
+def process_image_locally(input_path, output_path, engine_name=None):
+    """
+    Remove the background with a local engine from engine.py
+
+    Args:
+        input_path: Path to the original image
+        output_path: Path where the PNG result will be saved
+        engine_name: Engine to use; defaults to the MATTING_FALLBACK_ENGINE setting
+
+    Returns:
+        bool: True if processing was successful, False otherwise
+    """
+    try:
+        engine = get_engine(
+            engine_name or _setting('MATTING_FALLBACK_ENGINE', 'threshold'),
+            threshold=_setting('MATTING_FALLBACK_THRESHOLD', 200),
+            tile_size=_setting('MATTING_FALLBACK_TILE_SIZE', 1024)
+        )
+        engine.process_file(input_path, output_path)
+        print(f"Used fallback processing ({engine.name}) and saved to {output_path}")
         return True
 
     except Exception as e:
         print(f"Error in fallback processing: {e}")
         return False
 
+def _setting(key, default):
+    """Read a matting setting from the app config when available, else the environment"""
+    if has_app_context():
+        return current_app.config.get(key, default)
+    value = os.environ.get(key)
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes')
+    return type(default)(value)
+
 def generate_unique_filename(filename):
     """Generate a unique filename to avoid conflicts"""
     # Extract file extension
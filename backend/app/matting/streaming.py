@@ -0,0 +1,173 @@
+"""
+Streaming I/O for large matting uploads
+
+Without this, a 20-50MB upload is copied several times: werkzeug spools the
+multipart body to a temporary file, the route copies it into UPLOAD_FOLDER,
+requests builds the whole multipart body for the backend in memory, and the
+processed image is held in memory as response.content before being written.
+
+- spool_uploads_to() makes werkzeug write file parts straight into a
+  temporary file inside the upload folder, hashing them as they arrive, so
+  saving the upload is a rename rather than a second copy.
+- MultipartFileBody sends a file to the backend as a multipart body read from
+  disk chunk by chunk, with an exact Content-Length.
+- stream_response_to_file() writes a streamed response to disk chunk by chunk.
+
+Memory use per upload stays at a few chunks regardless of the image size.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+
+from flask import g
+
+logger = logging.getLogger('flask.app')
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingSpoolFile:
+    """
+    Writable/readable temporary file that hashes everything written to it.
+
+    werkzeug writes the upload into it while parsing the request; finalize()
+    then moves it to its permanent name.
+    """
+
+    def __init__(self, folder):
+        fd, self.path = tempfile.mkstemp(prefix='.upload-', suffix='.part', dir=folder)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.finalized = False
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, flush... are served by the real file
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def finalize(self, destination):
+        """
+        Close the spool file and rename it to destination.
+
+        Returns:
+            tuple: (hex SHA-256 digest, size in bytes)
+        """
+        self._file.close()
+        # mkstemp creates the file owner-only; match what open() would give
+        os.chmod(self.path, 0o644)
+        os.replace(self.path, destination)
+        self.finalized = True
+        return self.hexdigest(), self.size
+
+    def discard(self):
+        """Remove the spool file if it was never finalized"""
+        if self.finalized:
+            return
+        try:
+            self._file.close()
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def spool_uploads_to(request, folder):
+    """
+    Make werkzeug stream the file parts of this request into `folder`.
+
+    Must be called before request.files is first accessed. Spool files that
+    the view does not finalize are removed by discard_spooled_uploads().
+    """
+    spooled = g.setdefault('matting_spooled_uploads', [])
+
+    def stream_factory(total_content_length, content_type, filename=None, content_length=None):
+        spool = HashingSpoolFile(folder)
+        spooled.append(spool)
+        return spool
+
+    request._get_file_stream = stream_factory
+
+
+def discard_spooled_uploads(exc=None):
+    """Teardown hook: delete spool files left behind by rejected uploads"""
+    for spool in g.pop('matting_spooled_uploads', []):
+        spool.discard()
+
+
+class MultipartFileBody:
+    """
+    A multipart/form-data request body with a single file field, generated
+    from disk in CHUNK_SIZE pieces.
+
+    requests sends iterables with a known length using Content-Length rather
+    than buffering them, and iterating again re-reads the file, so the same
+    body can be retried against another node.
+    """
+
+    def __init__(self, path, field='file', filename=None, content_type='application/octet-stream',
+                 chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        boundary = uuid.uuid4().hex
+        filename = (filename or os.path.basename(path)).replace('"', '')
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+    def __len__(self):
+        return len(self._head) + os.path.getsize(self.path) + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        with open(self.path, 'rb') as file:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self._tail
+
+
+def stream_response_to_file(response, destination, chunk_size=CHUNK_SIZE):
+    """
+    Write a streamed requests.Response to destination without buffering it.
+
+    The body goes to a temporary file next to destination that is renamed
+    into place once complete, so readers never see a half-written image.
+
+    Returns:
+        int: Number of bytes written
+    """
+    partial = f"{destination}.part"
+    written = 0
+    try:
+        with open(partial, 'wb') as output:
+            for chunk in response.iter_content(chunk_size):
+                output.write(chunk)
+                written += len(chunk)
+        os.replace(partial, destination)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+        raise
+    finally:
+        response.close()
+    return written
@@ -2,11 +2,15 @@ from datetime import datetime
 # Fix circular import issue - import from parent package
 from .. import db
 from sqlalchemy import Text
+from sqlalchemy.orm import deferred
+from ..utils.html_text import derive_text_fields
 
 # Association table for many-to-many relationship between posts and tags
 post_tags = db.Table('cms_post_tags',
     db.Column('post_id', db.Integer, db.ForeignKey('cms_posts.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('cms_tags.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('cms_tags.id'), primary_key=True),
+    # The primary key serves post -> tags; this serves tag -> posts
+    db.Index('ix_cms_post_tags_tag', 'tag_id', 'post_id')
 )
 
 class Post(db.Model):
@@ -29,74 +33,13 @@ class Post(db.Model):
     media = db.relationship('PostMedia', backref='post', lazy=True, cascade="all, delete-orphan")
     tags = db.relationship('Tag', secondary=post_tags, backref=db.backref('posts', lazy='dynamic'))
     
+    # Published listing, newest first, paged by (published_at, id)
+    __table_args__ = (db.Index('ix_cms_posts_status_published', 'status', 'published_at', 'id'),)
+    
     def to_dict(self, include_translations=True, language=None):
-        """Convert post to dictionary for API responses"""
-        import logging
-        logger = logging.getLogger('flask.app')
-        
-        logger.info(f"Converting post {self.id} to dict, include_translations={include_translations}, language={language}")
-        
-        # Log some debug info about this post
-        logger.info(f"Post {self.id}: slug={self.slug}, status={self.status}, translations_count={len(self.translations)}")
-        
-        result = {
-            'id': self.id,
-            'slug': self.slug,
-            'featured_image': self.featured_image,
-            'author_id': self.author_id,
-            'status': self.status,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'published_at': self.published_at.isoformat() if self.published_at else None,
-            'media': [media.to_dict() for media in self.media],
-            'tags': [tag.to_dict() for tag in self.tags]
-        }
-        
-        if include_translations:
-            if language:
-                # First try to get the requested language
-                logger.info(f"Looking for translation in language: {language}")
-                translation = next((t for t in self.translations if t.language_code == language), None)
-                
-                if translation:
-                    logger.info(f"Found translation for language {language}")
-                    result['translation'] = translation.to_dict()
-                    # Set a flag to indicate this is the requested language
-                    result['translation']['is_requested_language'] = True
-                else:
-                    # Try to get English as fallback
-                    logger.info(f"No translation found for language {language}, trying English fallback")
-                    en_translation = next((t for t in self.translations if t.language_code == 'en'), None)
-                    
-                    if en_translation:
-                        logger.info(f"Using English translation as fallback")
-                        result['translation'] = en_translation.to_dict()
-                        # Set a flag to indicate this is a fallback language
-                        result['translation']['is_requested_language'] = False
-                        result['translation']['is_fallback'] = True
-                    else:
-                        # If there's no English, use the first available translation
-                        if self.translations:
-                            first_translation = self.translations[0]
-                            logger.info(f"No English translation, using {first_translation.language_code} as fallback")
-                            result['translation'] = first_translation.to_dict()
-                            result['translation']['is_requested_language'] = False
-                            result['translation']['is_fallback'] = True
-                        else:
-                            logger.info(f"No translations available at all")
-                            result['translation'] = None
-                
-                # Always include available languages
-                result['available_languages'] = [t.language_code for t in self.translations]
-            else:
-                # Get all translations
-                logger.info(f"Including all {len(self.translations)} translations")
-                result['translations'] = [trans.to_dict() for trans in self.translations]
-                # Log language codes of available translations
-                trans_langs = [t.language_code for t in self.translations]
-                logger.info(f"Translation languages: {trans_langs}")
-        
-        return result
+        """Convert post to dictionary for API responses (the admin shape, see app/cms/serializers.py)"""
+        from app.cms.serializers import serialize_post, SHAPE_ADMIN
+        return serialize_post(self, SHAPE_ADMIN, language=language, include_translations=include_translations)
 
 class PostTranslation(db.Model):
     """
@@ -121,23 +64,53 @@ class PostTranslation(db.Model):
     # Track the last update timestamp
     last_updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Derived from content on write (see refresh_text_fields); plain_text is
+    # as long as content and only search indexing reads it, so it is loaded on access
+    plain_text = deferred(db.Column(Text))
+    excerpt = db.Column(db.String(255))
+    word_count = db.Column(db.Integer)
+    reading_time = db.Column(db.Integer)  # minutes
+    content_hash = db.Column(db.String(64))  # SHA-256 of content
+    
     # Add unique constraint to ensure one translation per language for each post
-    __table_args__ = (db.UniqueConstraint('post_id', 'language_code', name='uix_post_language'),)
+    # The unique constraint also serves lookups by post; the index serves "posts available in a language"
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'language_code', name='uix_post_language'),
+        db.Index('ix_post_translations_language_post', 'language_code', 'post_id'),
+    )
+    
+    def refresh_text_fields(self):
+        """Recompute the derived text fields if content changed since they were stored"""
+        fields = derive_text_fields(self.content)
+        if fields['content_hash'] != self.content_hash:
+            for name, value in fields.items():
+                setattr(self, name, value)
     
     def to_dict(self):
         """Convert translation to dictionary for API responses"""
-        return {
-            'id': self.id,
-            'post_id': self.post_id,
-            'language_code': self.language_code,
-            'title': self.title,
-            'content': self.content,
-            'meta_title': self.meta_title,
-            'meta_description': self.meta_description,
-            'meta_keywords': self.meta_keywords,
-            'is_auto_translated': self.is_auto_translated,
-            'last_updated_at': self.last_updated_at.isoformat() if self.last_updated_at else None
-        }
+        from app.cms.serializers import serialize_translation
+        return serialize_translation(self)
+
+@db.event.listens_for(PostTranslation, 'before_insert')
+@db.event.listens_for(PostTranslation, 'before_update')
+def _refresh_translation_text_fields(mapper, connection, target):
+    if target.content_hash is None or db.inspect(target).attrs.content.history.has_changes():
+        target.refresh_text_fields()
+
+class PostSearchTerm(db.Model):
+    """
+    Inverted index of post translations for blog search (see app/cms/search.py)
+    """
+    __tablename__ = 'cms_post_search_terms'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(64), nullable=False)
+    translation_id = db.Column(db.Integer, db.ForeignKey('cms_post_translations.id', ondelete='CASCADE'), nullable=False, index=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('cms_posts.id', ondelete='CASCADE'), nullable=False)
+    language_code = db.Column(db.String(10), nullable=False)
+    weight = db.Column(db.Float, nullable=False)  # log-scaled term frequency, title occurrences boosted
+    
+    __table_args__ = (db.Index('ix_search_term_post', 'term', 'post_id'),)
 
 class PostMedia(db.Model):
     """
@@ -146,7 +119,7 @@ class PostMedia(db.Model):
     __tablename__ = 'cms_post_media'
     
     id = db.Column(db.Integer, primary_key=True)
-    post_id = db.Column(db.Integer, db.ForeignKey('cms_posts.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('cms_posts.id'), nullable=False, index=True)
     file_path = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # image, video, document, etc.
     alt_text = db.Column(db.String(255))
@@ -186,6 +159,17 @@ class Tag(db.Model):
             'description': self.description
         }
 
+# Flags of the 22 website languages; others get DEFAULT_FLAG
+LANGUAGE_FLAGS = {
+    'en': '🇬🇧', 'fr': '🇫🇷', 'es': '🇪🇸', 'de': '🇩🇪', 'it': '🇮🇹',
+    'pt': '🇵🇹', 'ru': '🇷🇺', 'ja': '🇯🇵', 'ko': '🇰🇷', 'zh-TW': '🇹🇼',
+    'ar': '🇸🇦', 'nl': '🇳🇱', 'sv': '🇸🇪', 'tr': '🇹🇷', 'pl': '🇵🇱',
+    'hu': '🇭🇺', 'el': '🇬🇷', 'no': '🇳🇴', 'vi': '🇻🇳', 'th': '🇹🇭',
+    'id': '🇮🇩', 'ms': '🇲🇾'
+}
+DEFAULT_FLAG = '🌐'
+
+
 class Language(db.Model):
     """
     Supported languages for the CMS
@@ -200,15 +184,7 @@ class Language(db.Model):
     # Virtual property for flag since it's not in the database yet
     @property
     def flag(self):
-        # 22 website languages with appropriate flag emojis
-        flags = {
-            'en': '🇬🇧', 'fr': '🇫🇷', 'es': '🇪🇸', 'de': '🇩🇪', 'it': '🇮🇹', 
-            'pt': '🇵🇹', 'ru': '🇷🇺', 'ja': '🇯🇵', 'ko': '🇰🇷', 'zh-TW': '🇹🇼',
-            'ar': '🇸🇦', 'nl': '🇳🇱', 'sv': '🇸🇪', 'tr': '🇹🇷', 'pl': '🇵🇱',
-            'hu': '🇭🇺', 'el': '🇬🇷', 'no': '🇳🇴', 'vi': '🇻🇳', 'th': '🇹🇭',
-            'id': '🇮🇩', 'ms': '🇲🇾'
-        }
-        return flags.get(self.code, '🌐')
+        return LANGUAGE_FLAGS.get(self.code, DEFAULT_FLAG)
     
     def to_dict(self):
         """Convert language to dictionary for API responses"""
@@ -219,4 +195,80 @@ class Language(db.Model):
             'is_default': self.is_default,
             'is_active': self.is_active,
             'flag': self.flag
-        }
\ No newline at end of file
+        }
+
+class TranslationSegment(db.Model):
+    """
+    Translation memory: one translated block of post content, keyed by the hash
+    of (model, from language, to language, source HTML) (see app/services/translation_memory.py)
+    """
+    __tablename__ = 'cms_translation_segments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_hash = db.Column(db.String(64), nullable=False, unique=True)
+    from_lang = db.Column(db.String(10), nullable=False)
+    to_lang = db.Column(db.String(10), nullable=False)
+    model = db.Column(db.String(50), nullable=False)
+    translated_text = db.Column(Text, nullable=False)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # LRU and age eviction
+
+class TranslationRun(db.Model):
+    """
+    A background auto-translation of many posts (/posts/auto-translate-all) or of
+    one (/posts/<id>/auto-translate). Its items are the per-(post, language)
+    checkpoints worked off in the background (see app/cms/bulk_translate.py),
+    so an interrupted run resumes where it stopped.
+    """
+    __tablename__ = 'cms_translation_runs'
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(20), default='running', nullable=False, index=True)  # running, completed, cancelled
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    post_id = db.Column(db.Integer, db.ForeignKey('cms_posts.id'), index=True)  # A single post's auto-translate; None for bulk runs
+    options = db.Column(db.Text)  # JSON: placeholder_mode and language code -> name
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    items = db.relationship('TranslationRunItem', backref='run', lazy='dynamic', cascade="all, delete-orphan")
+
+class TranslationRunItem(db.Model):
+    """
+    One (post, language) pair of a TranslationRun
+    """
+    __tablename__ = 'cms_translation_run_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(36), db.ForeignKey('cms_translation_runs.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('cms_posts.id'), nullable=False)
+    language_code = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, done, failed, skipped, cancelled
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime)  # Retry backoff after a failed attempt
+    error = db.Column(db.String(255))
+    placeholder = db.Column(db.Boolean, default=False)  # Written as a placeholder instead of a real translation
+    memory_segments = db.Column(db.Integer, default=0)  # Content blocks looked up in the translation memory
+    memory_hits = db.Column(db.Integer, default=0)
+    tokens_saved = db.Column(db.Integer, default=0)  # Estimated
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'post_id', 'language_code', name='uix_run_post_language'),
+        # Workers claim the next pending item of a run
+        db.Index('ix_translation_run_items_run_status', 'run_id', 'status', 'id'),
+    )
+
+    def to_dict(self):
+        """Convert run item to dictionary for API responses"""
+        return {
+            'post_id': self.post_id,
+            'language_code': self.language_code,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'placeholder': self.placeholder,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 # Fix circular import issue - import from parent package
 from .. import db, bcrypt
@@ -79,6 +80,12 @@ class RechargeHistory(db.Model):
     package_id = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Payment history per user, and payment lookups by Stripe session/intent id
+    __table_args__ = (
+        db.Index('ix_recharge_history_user_created', 'user_id', 'created_at'),
+        db.Index('ix_recharge_history_stripe_payment', 'stripe_payment_id'),
+    )
+    
     def to_dict(self):
         """Convert recharge history to dictionary for API responses"""
         result = {
@@ -115,6 +122,9 @@ class MattingHistory(db.Model):
     credit_spent = db.Column(db.Integer, default=1, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Keyset pagination of a user's history, newest first
+    __table_args__ = (db.Index('ix_matting_history_user_created', 'user_id', 'created_at', 'id'),)
+    
     def to_dict(self):
         """Convert matting history to dictionary for API responses"""
         return {
@@ -126,6 +136,84 @@ class MattingHistory(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class MattingJob(db.Model):
+    """
+    A queued background-removal job. Rows double as the persistent work queue
+    drained by the matting worker pool, so pending jobs survive a restart.
+    """
+    __tablename__ = 'matting_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, processing, completed, failed
+    original_filename = db.Column(db.String(255), nullable=False)
+    original_path = db.Column(db.String(512), nullable=False)
+    processed_path = db.Column(db.String(512), nullable=False)
+    original_image_url = db.Column(db.String(255), nullable=False)
+    processed_image_url = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64))  # SHA-256 of the upload, used to fill the result cache
+    history_id = db.Column(db.Integer, db.ForeignKey('matting_history.id'), nullable=True)
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Convert matting job to dictionary for API responses"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'original_image': self.original_image_url,
+            'processed_image': self.processed_image_url if self.status == 'completed' else None,
+            'history_id': self.history_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class MattingBatch(db.Model):
+    """
+    A multi-image request to /matting/batch. Per-item results are kept as JSON
+    so the zip-of-results download can be served later.
+    """
+    __tablename__ = 'matting_batches'
+
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    item_count = db.Column(db.Integer, default=0, nullable=False)
+    succeeded = db.Column(db.Integer, default=0, nullable=False)
+    credits_spent = db.Column(db.Integer, default=0, nullable=False)
+    items = db.Column(db.Text, nullable=False)  # JSON list of per-item results
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert matting batch to dictionary for API responses"""
+        return {
+            'batch_id': self.id,
+            'item_count': self.item_count,
+            'succeeded': self.succeeded,
+            'failed': self.item_count - self.succeeded,
+            'credits_spent': self.credits_spent,
+            'items': [
+                {key: value for key, value in item.items() if key != 'processed_file'}
+                for item in json.loads(self.items or '[]')
+            ],
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class MattingCacheEntry(db.Model):
+    """
+    Index of the content-addressed matting result cache (see app/matting/cache.py)
+    """
+    __tablename__ = 'matting_cache'
+
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 of the original upload
+    size_bytes = db.Column(db.BigInteger, default=0, nullable=False)
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 # New CreditLog model
 class CreditLog(db.Model):
     __tablename__ = 'credit_logs'
@@ -139,6 +227,9 @@ class CreditLog(db.Model):
     source_details = db.Column(db.Text, nullable=True) # Can store JSON as string or simple text
     description = db.Column(db.String(255), nullable=False)
 
+    # Keyset pagination of a user's credit history, newest first
+    __table_args__ = (db.Index('ix_credit_logs_user_timestamp', 'user_id', 'timestamp', 'id'),)
+
     def to_dict(self):
         return {
             'id': self.id,
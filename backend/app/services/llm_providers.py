@@ -0,0 +1,156 @@
+"""
+Chat completion providers for the translation service and the CMS content generator
+
+Both used to call DeepSeek directly: TranslationService with its own base
+URL, key and session, app/cms/ai_content.py with raw requests.post calls.
+They now get a provider from build_provider(), chosen with LLM_PROVIDER:
+
+    deepseek  - api.deepseek.com (DEEPSEEK_API_KEY, DEEPSEEK_API_BASE_URL, DEEPSEEK_MODEL)
+    openai    - any OpenAI-compatible API (LLM_API_KEY or OPENAI_API_KEY,
+                LLM_API_BASE_URL, LLM_MODEL)
+    stub      - a local stub server with configurable latency and error rates
+                (LLM_STUB_LATENCY_MS, LLM_STUB_MS_PER_TOKEN, LLM_STUB_ERROR_RATE,
+                LLM_STUB_RATE_LIMIT_RATE, LLM_STUB_SEED; see app/services/llm_stub.py)
+
+A provider only sends requests: it owns the base URL, model, credentials
+and the pooled session (see app/utils/http_pool.py). Rate limiting, retries
+on 429, streaming and parsing stay with the callers.
+"""
+import logging
+import os
+import threading
+
+from app.utils.http_pool import pooled_session
+
+logger = logging.getLogger('flask.app')
+
+PROVIDER_DEEPSEEK = 'deepseek'
+PROVIDER_OPENAI = 'openai'
+PROVIDER_STUB = 'stub'
+
+
+class ChatProvider:
+    """An OpenAI-compatible chat completions API"""
+    name = PROVIDER_OPENAI
+    label = 'OpenAI-compatible API'
+
+    def __init__(self, base_url, model, api_key, pool_size=4, http2=False):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.api_key = api_key
+        self.session = pooled_session(
+            pool_size=pool_size,
+            retries=2,
+            status_forcelist=(408, 500, 502, 503, 504),  # 429 is left to the caller's rate limiting
+            http2=http2
+        )
+
+    @property
+    def chat_url(self):
+        return f"{self.base_url}/chat/completions"
+
+    def is_available(self):
+        return bool(self.api_key)
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def post_chat(self, payload, timeout=(20, 75), stream=False):
+        """
+        POST a chat completion request; the provider's model is used unless payload has one.
+
+        Returns:
+            The response (a requests.Response, or the httpx equivalent with HTTP/2);
+            the caller closes it
+        """
+        payload = dict(payload)
+        payload.setdefault('model', self.model)
+        return self.session.post(self.chat_url, headers=self.headers(), json=payload, timeout=timeout, stream=stream)
+
+    def close(self):
+        self.session.close()
+
+
+class DeepSeekProvider(ChatProvider):
+    name = PROVIDER_DEEPSEEK
+    label = 'DeepSeek API'
+
+
+class StubProvider(ChatProvider):
+    """The local stub server, started on a free port with the provider"""
+    name = PROVIDER_STUB
+    label = 'stub API'
+
+    def __init__(self, settings=None, pool_size=4):
+        from app.services.llm_stub import StubServer
+        self.server = StubServer(settings).start()
+        super().__init__(self.server.base_url, 'stub-chat', 'stub', pool_size=pool_size)
+        self.session.trust_env = False  # Never route the loopback stub through a proxy
+
+    def close(self):
+        super().close()
+        self.server.stop()
+
+
+def stub_settings_from_env():
+    from app.services.llm_stub import StubSettings
+    return StubSettings(
+        latency_ms=float(os.environ.get('LLM_STUB_LATENCY_MS', 200)),
+        ms_per_token=float(os.environ.get('LLM_STUB_MS_PER_TOKEN', 2)),
+        error_rate=float(os.environ.get('LLM_STUB_ERROR_RATE', 0)),
+        rate_limit_rate=float(os.environ.get('LLM_STUB_RATE_LIMIT_RATE', 0)),
+        seed=int(os.environ.get('LLM_STUB_SEED', 0))
+    )
+
+
+def build_provider(name=None, pool_size=4, http2=False):
+    """
+    The provider named by LLM_PROVIDER (deepseek by default), configured from the environment.
+
+    Args:
+        name: Provider name, instead of LLM_PROVIDER
+        pool_size: Keep-alive connections; size it to the threads calling it
+        http2: Use HTTP/2 if httpx[http2] is installed (not for the stub)
+
+    Returns:
+        ChatProvider
+    """
+    name = (name or os.environ.get('LLM_PROVIDER') or PROVIDER_DEEPSEEK).lower()
+    if name == PROVIDER_STUB:
+        provider = StubProvider(stub_settings_from_env(), pool_size=pool_size)
+    elif name == PROVIDER_OPENAI:
+        provider = ChatProvider(
+            os.environ.get('LLM_API_BASE_URL', 'https://api.openai.com/v1'),
+            os.environ.get('LLM_MODEL', 'gpt-4o-mini'),
+            os.environ.get('LLM_API_KEY') or os.environ.get('OPENAI_API_KEY'),
+            pool_size=pool_size, http2=http2
+        )
+    else:
+        if name != PROVIDER_DEEPSEEK:
+            logger.warning(f"Unknown LLM_PROVIDER '{name}', using DeepSeek")
+        provider = DeepSeekProvider(
+            os.environ.get('DEEPSEEK_API_BASE_URL', 'https://api.deepseek.com/v1'),
+            os.environ.get('DEEPSEEK_MODEL', 'deepseek-chat'),
+            os.environ.get('DEEPSEEK_API_KEY') or os.environ.get('OPENAI_API_KEY'),
+            pool_size=pool_size, http2=http2
+        )
+    logger.info(f"Using the {provider.label} at {provider.base_url} with model {provider.model}")
+    return provider
+
+
+_shared_provider = None
+_shared_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    A provider shared by the occasional callers in this process (content
+    generation); the translation service builds its own, with a pool sized
+    to its workers.
+    """
+    global _shared_provider
+    if _shared_provider is None:
+        with _shared_lock:
+            if _shared_provider is None:
+                _shared_provider = build_provider(pool_size=int(os.environ.get('LLM_SHARED_POOL_SIZE', 2)))
+    return _shared_provider
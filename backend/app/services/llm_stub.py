@@ -0,0 +1,240 @@
+"""
+Local stub of an OpenAI-compatible chat completions API
+
+Answers /chat/completions without any network or API key, so the
+translation pipeline and the CMS content generator can be developed and
+load tested offline (LLM_PROVIDER=stub, see app/services/llm_providers.py).
+
+Answers are deterministic:
+    - translation prompts (see TranslationService) come back with every
+      value prefixed by "[<language>] ", keeping the HTML as it is
+    - any other prompt gets generated placeholder HTML of about max_tokens
+
+Latency is latency_ms before the first byte plus ms_per_token for every
+answer token, streamed as server-sent events when the request asks for it.
+A share error_rate of requests get a 500 and rate_limit_rate a 429 with
+Retry-After. Which requests fail is decided by a hash of the seed, the
+request body and how many times that body was seen, so a run replays the
+same way whatever the thread interleaving.
+
+Run on its own for other processes (LLM_PROVIDER=openai LLM_API_BASE_URL=http://127.0.0.1:8089/v1):
+    python -m app.services.llm_stub --port 8089 --latency-ms 300 --error-rate 0.05
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.utils.html_text import html_to_text
+
+CHARS_PER_TOKEN = 4
+
+_FIELDS = re.compile(r'<fields_to_translate>\n(.*)\n</fields_to_translate>', re.S)
+_CONTENT = re.compile(r'<content_to_translate>\n(.*)\n</content_to_translate>', re.S)
+_TARGET = re.compile(r' into (.+?)\.\n')
+_TEXT_START = re.compile(r'^((?:\s*<[^>]+>)*\s*)')
+
+_WORDS = ('image', 'background', 'removal', 'edit', 'photo', 'product', 'quality', 'result', 'tool', 'simple',
+          'fast', 'detail', 'light', 'color', 'upload', 'workflow', 'online', 'team', 'shop', 'clean')
+
+
+def _tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _mark(value, language):
+    """The stub's "translation": the language in brackets before the first text, markup untouched"""
+    if not html_to_text(value).strip():
+        return value
+    return _TEXT_START.sub(lambda match: f"{match.group(1)}[{language}] ", value, count=1)
+
+
+def answer_for(messages, max_tokens, json_mode):
+    """The deterministic answer to a chat completion request"""
+    prompt = messages[-1].get('content', '') if messages else ''
+    target = _TARGET.search(prompt)
+    language = target.group(1) if target else 'Translated'
+    fields = _FIELDS.search(prompt)
+    if fields and json_mode:
+        source = json.loads(fields.group(1))
+        return json.dumps({key: _mark(value, language) for key, value in source.items()}, ensure_ascii=False)
+    content = _CONTENT.search(prompt)
+    if content:
+        return _mark(content.group(1), language)
+
+    seed = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16)
+    parts, size, section = [], 0, 0
+    while size < max_tokens * CHARS_PER_TOKEN:
+        section += 1
+        words = [_WORDS[(seed + section * 7 + n * 3) % len(_WORDS)] for n in range(60)]
+        block = f"<h2>Section {section}</h2>\n<p>{' '.join(words).capitalize()}.</p>\n"
+        parts.append(block)
+        size += len(block)
+    return ''.join(parts)
+
+
+class StubSettings:
+    """Latency and failure settings; may be changed while the server runs"""
+
+    def __init__(self, latency_ms=200, ms_per_token=2.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency_ms = float(latency_ms)
+        self.ms_per_token = float(ms_per_token)
+        self.error_rate = float(error_rate)
+        self.rate_limit_rate = float(rate_limit_rate)
+        self.seed = int(seed)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+        server = self.server
+        settings = server.settings
+        roll, jitter = server.roll(body)
+        server.count('requests')
+
+        time.sleep(settings.latency_ms * (0.75 + jitter / 2) / 1000)
+        if roll < settings.rate_limit_rate:
+            server.count('rate_limited')
+            self._send_json(429, {'error': {'message': 'Rate limit reached (stub)'}}, {'Retry-After': '1'})
+            return
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            server.count('errors')
+            self._send_json(500, {'error': {'message': 'Internal error (stub)'}})
+            return
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON'}})
+            return
+        messages = data.get('messages') or []
+        json_mode = (data.get('response_format') or {}).get('type') == 'json_object'
+        answer = answer_for(messages, int(data.get('max_tokens') or 1000), json_mode)
+        usage = {
+            'prompt_tokens': sum(_tokens(message.get('content', '')) for message in messages),
+            'completion_tokens': _tokens(answer)
+        }
+        server.count('completion_tokens', usage['completion_tokens'])
+        if data.get('stream'):
+            self._stream(answer, usage, settings)
+        else:
+            time.sleep(usage['completion_tokens'] * settings.ms_per_token / 1000)
+            self._send_json(200, {
+                'id': 'stub', 'object': 'chat.completion', 'model': data.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                'usage': usage
+            })
+
+    def _stream(self, answer, usage, settings):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        piece = 16 * CHARS_PER_TOKEN  # About 16 tokens per event
+        for offset in range(0, len(answer), piece):
+            text = answer[offset:offset + piece]
+            time.sleep(_tokens(text) * settings.ms_per_token / 1000)
+            self._write_event({'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]})
+        self._write_event({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage})
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_event(self, event):
+        self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """The stub API on 127.0.0.1, served from a daemon thread once started"""
+    daemon_threads = True
+
+    def __init__(self, settings=None, port=0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.settings = settings or StubSettings()
+        self.counters = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.serve_forever, name='llm-stub', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+
+    def roll(self, body):
+        """(failure roll, latency jitter), both in [0, 1), from the seed, the body and its repeat count"""
+        key = hashlib.sha256(body).digest()
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+        digest = hashlib.sha256(f"{self.settings.seed}:{seen}:".encode('ascii') + key).digest()
+        return int.from_bytes(digest[:4], 'big') / 2 ** 32, int.from_bytes(digest[4:8], 'big') / 2 ** 32
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """Forget counters and seen requests, so the same requests replay the same way"""
+        with self._lock:
+            self.counters = {}
+            self._seen = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stub of an OpenAI-compatible chat completions API')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--ms-per-token', type=float, default=2.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = StubServer(StubSettings(args.latency_ms, args.ms_per_token, args.error_rate, args.rate_limit_rate, args.seed),
+                        port=args.port)
+    print(f"Stub chat completions API at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Translation memory for post content
+
+Editing one paragraph of an English post used to send the whole HTML body to
+DeepSeek again for every language. Content is now split into top-level
+blocks (see app/utils/html_text.py split_blocks) and each translated block is
+stored in cms_translation_segments under the SHA-256 of (model, from
+language, to language, source block). On the next translation only blocks
+without a stored translation are sent to the API and the document is put
+back together from both.
+
+Rows are evicted when unused for TRANSLATION_MEMORY_MAX_AGE_DAYS, and the
+least recently used beyond TRANSLATION_MEMORY_MAX_SEGMENTS. Lookups use
+their own connection, so they never flush or commit the caller's session.
+"""
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+from sqlalchemy import select, update, delete, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.cms import TranslationSegment
+from app.utils.html_text import split_blocks, html_to_text
+
+logger = logging.getLogger('flask.app')
+
+# Rough size of a token, for the tokens-saved estimate
+CHARS_PER_TOKEN = 4
+
+_LOOKUP_CHUNK = 500
+
+
+def segment_hash(text, from_lang, to_lang, model):
+    key = '\x00'.join((model, from_lang, to_lang, text))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def is_translatable(segment):
+    """Whether a block has any text to translate (whitespace, <img>, <br> have none)"""
+    return bool(html_to_text(segment).strip())
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class ContentPlan:
+    """
+    Content split into blocks, with the blocks found in the memory filled in.
+
+    Attributes:
+        segments: The source blocks, ''.join(segments) == content
+        results: Translated block by index; untranslatable blocks are kept as they are
+        pending: Indexes of blocks that still need the API
+    """
+
+    def __init__(self, content, from_lang, to_lang, model):
+        self.from_lang = from_lang
+        self.to_lang = to_lang
+        self.model = model
+        self.segments = split_blocks(content)
+        self.results = {}
+        self.pending = []
+        self.hashes = {}
+        for index, segment in enumerate(self.segments):
+            if is_translatable(segment):
+                self.hashes[index] = segment_hash(segment, from_lang, to_lang, model)
+                self.pending.append(index)
+            else:
+                self.results[index] = segment
+        self.translatable = len(self.pending)
+        self.hits = 0
+        self.tokens_saved = 0
+
+    def pending_fields(self, prefix='content.'):
+        """Pending blocks as fields for a structured request"""
+        return {f"{prefix}{index}": self.segments[index] for index in self.pending}
+
+    def pending_tokens(self):
+        return sum(estimate_tokens(self.segments[index]) for index in self.pending)
+
+    def chunks(self, max_tokens, prefix='content.'):
+        """
+        Pending blocks in document order, grouped into requests of at most
+        max_tokens (estimated); a block larger than that is a chunk of its own.
+
+        Returns:
+            list: dicts of fields, as pending_fields
+        """
+        chunks = []
+        current, size = {}, 0
+        for index in self.pending:
+            tokens = estimate_tokens(self.segments[index])
+            if current and size + tokens > max_tokens:
+                chunks.append(current)
+                current, size = {}, 0
+            current[f"{prefix}{index}"] = self.segments[index]
+            size += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def fill(self, translated, prefix='content.'):
+        """Take pending blocks from a structured answer; returns the indexes filled"""
+        filled = []
+        for index in self.pending:
+            value = translated.get(f"{prefix}{index}")
+            if value is not None:
+                self.results[index] = self._keep_spacing(index, value)
+                filled.append(index)
+        self.pending = [index for index in self.pending if index not in self.results]
+        return filled
+
+    def _keep_spacing(self, index, value):
+        # Answers come back stripped; keep the block's own leading/trailing whitespace
+        segment = self.segments[index]
+        leading = segment[:len(segment) - len(segment.lstrip())]
+        trailing = segment[len(segment.rstrip()):]
+        return leading + value.strip() + trailing
+
+    def content(self):
+        return ''.join(self.results[index] for index in range(len(self.segments)))
+
+
+class TranslationMemory:
+    """Stored block translations, read and written with Core statements"""
+
+    def __init__(self, max_segments=50000, max_age_days=180, evict_every=200):
+        self.max_segments = max_segments
+        self.max_age_days = max_age_days
+        self.evict_every = evict_every
+        self._stores = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        return has_app_context()
+
+    def plan(self, content, from_lang, to_lang, model):
+        """
+        Split content and fill in every block the memory already has.
+
+        Returns:
+            ContentPlan
+        """
+        plan = ContentPlan(content, from_lang, to_lang, model)
+        found = self.lookup([plan.hashes[index] for index in plan.pending])
+        for index in list(plan.pending):
+            translated = found.get(plan.hashes[index])
+            if translated is not None:
+                plan.results[index] = translated
+                plan.hits += 1
+                plan.tokens_saved += estimate_tokens(plan.segments[index]) + estimate_tokens(translated)
+        plan.pending = [index for index in plan.pending if index not in plan.results]
+        return plan
+
+    def lookup(self, hashes):
+        """
+        Stored translations by source hash; marks the rows found as used.
+
+        Returns:
+            dict: source_hash -> translated_text
+        """
+        table = TranslationSegment.__table__
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        if not unique:
+            return found
+        try:
+            with db.engine.begin() as connection:
+                for offset in range(0, len(unique), _LOOKUP_CHUNK):
+                    chunk = unique[offset:offset + _LOOKUP_CHUNK]
+                    rows = connection.execute(
+                        select(table.c.source_hash, table.c.translated_text).where(table.c.source_hash.in_(chunk))
+                    )
+                    found.update((row.source_hash, row.translated_text) for row in rows)
+                if found:
+                    connection.execute(
+                        update(table).where(table.c.source_hash.in_(list(found)))
+                        .values(hits=table.c.hits + 1, last_used_at=datetime.utcnow())
+                    )
+        except Exception as e:
+            logger.error(f"Translation memory lookup failed: {e}")
+            return {}
+        return found
+
+    def store(self, pairs, from_lang, to_lang, model):
+        """Remember (source block, translated block) pairs"""
+        table = TranslationSegment.__table__
+        now = datetime.utcnow()
+        rows = {}
+        for source, translated in pairs:
+            if translated and translated.strip():
+                source_hash = segment_hash(source, from_lang, to_lang, model)
+                rows[source_hash] = {
+                    'source_hash': source_hash, 'from_lang': from_lang, 'to_lang': to_lang, 'model': model,
+                    'translated_text': translated, 'hits': 0, 'created_at': now, 'last_used_at': now
+                }
+        if not rows:
+            return
+        try:
+            with db.engine.begin() as connection:
+                existing = set(connection.execute(
+                    select(table.c.source_hash).where(table.c.source_hash.in_(list(rows)))
+                ).scalars())
+                new_rows = [row for source_hash, row in rows.items() if source_hash not in existing]
+                if new_rows:
+                    connection.execute(table.insert(), new_rows)
+        except IntegrityError:
+            # Another worker stored some of the same blocks meanwhile; insert the rest one by one
+            for row in rows.values():
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(table.insert(), [row])
+                except IntegrityError:
+                    pass
+        except Exception as e:
+            logger.error(f"Translation memory store failed: {e}")
+            return
+
+        with self._lock:
+            self._stores += 1
+            due = self._stores % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop rows unused for max_age_days, then the least recently used beyond max_segments"""
+        table = TranslationSegment.__table__
+        try:
+            with db.engine.begin() as connection:
+                cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+                aged = connection.execute(delete(table).where(table.c.last_used_at < cutoff)).rowcount
+                excess = connection.execute(select(func.count()).select_from(table)).scalar() - self.max_segments
+                trimmed = 0
+                if excess > 0:
+                    # The excess-th least recently used row; ties on last_used_at are broken by id
+                    last_used_at, row_id = connection.execute(
+                        select(table.c.last_used_at, table.c.id)
+                        .order_by(table.c.last_used_at, table.c.id).offset(excess - 1).limit(1)
+                    ).one()
+                    trimmed = connection.execute(delete(table).where(or_(
+                        table.c.last_used_at < last_used_at,
+                        and_(table.c.last_used_at == last_used_at, table.c.id <= row_id)
+                    ))).rowcount
+            if aged or trimmed:
+                logger.info(f"Translation memory evicted {aged} aged and {trimmed} least recently used segments")
+        except Exception as e:
+            logger.error(f"Translation memory eviction failed: {e}")
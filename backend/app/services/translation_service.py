@@ -6,103 +6,155 @@ import json
 import time
 import random
 import logging
+import re
+import threading
 import requests
-from urllib3.util import Retry
-from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import current_app, g, has_request_context
-from app.models.cms import Language
+from app.utils.html_text import html_to_text, make_excerpt, split_blocks
+from app.utils.rate_limit import TokenBucket, parse_retry_after
+from app.services.llm_providers import build_provider
+from app.services.translation_memory import TranslationMemory, ContentPlan, estimate_tokens
 
 logger = logging.getLogger('flask.app')
 
+MODE_STRUCTURED = 'structured'
+MODE_PER_FIELD = 'per_field'
+
+# Sent together in structured mode; meta_keywords are kept as they are
+STRUCTURED_FIELDS = ('title', 'content', 'meta_title', 'meta_description')
+
+# Content blocks the structured answer missed are retried one call each up to this many,
+# beyond that they are translated in chunks
+MAX_SEGMENT_FALLBACKS = 3
+
+_HTML_TAG = re.compile(r'<\s*/?\s*[a-zA-Z][^>]*>')
+
+
+class TranslationCancelled(Exception):
+    """Raised out of a translation whose cancel check returned True (see TranslationService.set_cancel_check)"""
+
+
+class TranslationStats:
+    """Running latency and token totals of post field translations, per mode"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes = {}
+
+    def record(self, mode, seconds, usage, fallback_fields=0, failed=False):
+        with self._lock:
+            totals = self._modes.setdefault(mode, {
+                'translations': 0, 'failures': 0, 'seconds': 0.0, 'api_calls': 0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'fallback_fields': 0,
+                'memory_segments': 0, 'memory_hits': 0, 'tokens_saved': 0
+            })
+            totals['translations'] += 1
+            totals['failures'] += 1 if failed else 0
+            totals['seconds'] += seconds
+            totals['fallback_fields'] += fallback_fields
+            for name in ('api_calls', 'prompt_tokens', 'completion_tokens', 'memory_segments', 'memory_hits', 'tokens_saved'):
+                totals[name] += usage[name]
+
+    def snapshot(self):
+        """Totals and per-translation averages for each mode"""
+        with self._lock:
+            result = {}
+            for mode, totals in self._modes.items():
+                count = totals['translations']
+                result[mode] = dict(
+                    totals,
+                    seconds=round(totals['seconds'], 2),
+                    avg_seconds=round(totals['seconds'] / count, 2),
+                    avg_api_calls=round(totals['api_calls'] / count, 2),
+                    avg_tokens=round((totals['prompt_tokens'] + totals['completion_tokens']) / count, 1),
+                    memory_hit_rate=round(totals['memory_hits'] / totals['memory_segments'], 3) if totals['memory_segments'] else None
+                )
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._modes = {}
+
+
 class TranslationService:
-    """Service for translating content between languages using DeepSeek API"""
+    """Service for translating content between languages using DeepSeek API (or another provider, see LLM_PROVIDER)"""
     
     def __init__(self):
-        """Initialize the translation service with DeepSeek API"""
-        self.api_key = os.environ.get('DEEPSEEK_API_KEY') or os.environ.get('OPENAI_API_KEY')
-        self.api_base_url = "https://api.deepseek.com/v1"
-        self.model = "deepseek-chat"
-        self.session = None
-        self.setup_session()
+        """Initialize the translation service with the configured chat completions provider"""
+        self.provider = None
+        self.setup_provider()
+        
+        # One bucket for every DeepSeek call in this process; 429s pause it for Retry-After
+        self.rate_limiter = TokenBucket(
+            rate=float(os.environ.get('DEEPSEEK_REQUESTS_PER_SECOND', 2)),
+            burst=int(os.environ.get('DEEPSEEK_REQUEST_BURST', 4))
+        )
+        self.max_rate_limited_attempts = int(os.environ.get('DEEPSEEK_MAX_RATE_LIMITED_ATTEMPTS', 4))
         
-        logger.info(f"Translation service initialized with DeepSeek API")
+        # 'structured' sends all post fields in one request, 'per_field' one request per field
+        self.translation_mode = os.environ.get('DEEPSEEK_TRANSLATION_MODE', MODE_STRUCTURED)
+        self.structured_max_tokens = int(os.environ.get('DEEPSEEK_STRUCTURED_MAX_TOKENS', 8192))
+        self.stats = TranslationStats()
+        self._usage = threading.local()
+        self._cancel = threading.local()
         
-        if self.api_key:
-            logger.info("DeepSeek API settings initialized successfully")
-        else:
-            logger.warning("DEEPSEEK_API_KEY not found in environment variables")
+        # Long content is translated in chunks of about DEEPSEEK_CHUNK_TOKENS, several at once,
+        # with streamed responses so the read timeout applies between tokens rather than to the whole answer
+        self.chunk_tokens = int(os.environ.get('DEEPSEEK_CHUNK_TOKENS', 1500))
+        self.chunk_concurrency = int(os.environ.get('DEEPSEEK_CHUNK_CONCURRENCY', 3))
+        self.stream_responses = os.environ.get('DEEPSEEK_STREAM', 'true').lower() == 'true'
+        
+        # Translated content blocks are reused across runs (see app/services/translation_memory.py)
+        self.memory_enabled = os.environ.get('TRANSLATION_MEMORY_ENABLED', 'true').lower() == 'true'
+        self.memory = TranslationMemory(
+            max_segments=int(os.environ.get('TRANSLATION_MEMORY_MAX_SEGMENTS', 50000)),
+            max_age_days=int(os.environ.get('TRANSLATION_MEMORY_MAX_AGE_DAYS', 180))
+        )
+        
+        logger.info(f"Translation service initialized with the {self.provider.label}")
+        
+        if not self.provider.is_available():
+            logger.warning(f"No API key configured for the {self.provider.label}")
     
-    def setup_session(self):
-        """Setup a requests session with connection pooling and retries"""
-        if self.session:
-            self.session.close()
-            
-        self.session = requests.Session()
-        adapter = HTTPAdapter(
-            pool_connections=10,
-            pool_maxsize=10,
-            max_retries=Retry(
-                total=2,  # Reduced retries
-                backoff_factor=1,
-                status_forcelist=[408, 429, 500, 502, 503, 504],
-                allowed_methods=["POST"],
-                respect_retry_after_header=True
+    def setup_provider(self, provider=None):
+        """
+        Use provider, or build the one LLM_PROVIDER names (see app/services/llm_providers.py),
+        for every API call in this process; the previous one is closed.
+
+        A built provider's session pool holds one keep-alive connection per
+        thread that can call the API at once: each translation worker with its
+        chunk threads, unless DEEPSEEK_POOL_SIZE says otherwise.
+        """
+        if self.provider:
+            self.provider.close()
+        if provider is None:
+            pool_size = os.environ.get('DEEPSEEK_POOL_SIZE') or (
+                int(os.environ.get('CMS_TRANSLATION_WORKERS', 3)) * int(os.environ.get('DEEPSEEK_CHUNK_CONCURRENCY', 3))
             )
-        )
-        self.session.mount('https://', adapter)
+            provider = build_provider(
+                pool_size=int(pool_size),
+                http2=os.environ.get('DEEPSEEK_HTTP2', 'false').lower() == 'true'
+            )
+        self.provider = provider
+    
+    @property
+    def model(self):
+        # Part of the translation memory key, so each model's translations are kept apart
+        return self.provider.model
     
     def is_available(self):
         """Check if the translation service is available"""
-        return self.api_key is not None
+        return self.provider.is_available()
     
     def get_language_name(self, language_code):
-        """Get the language name from code, prioritizing hardcoded map, then DB if context available."""
-        # Fallback values for common languages if not in database
-        language_map = {
-            'en': 'English',
-            'fr': 'French',
-            'es': 'Spanish',
-            'de': 'German',
-            'it': 'Italian',
-            'pt': 'Portuguese',
-            'ru': 'Russian',
-            'ja': 'Japanese',
-            'ko': 'Korean',
-            'zh-TW': 'Traditional Chinese',
-            'ar': 'Arabic',
-            'nl': 'Dutch',
-            'sv': 'Swedish',
-            'tr': 'Turkish',
-            'pl': 'Polish',
-            'hu': 'Hungarian',
-            'el': 'Greek',
-            'no': 'Norwegian',
-            'vi': 'Vietnamese',
-            'th': 'Thai',
-            'id': 'Indonesian',
-            'ms': 'Malaysian'
-        }
-        
-        if language_code in language_map:
-            logger.debug(f"Language code '{language_code}' resolved to '{language_map[language_code]}' from hardcoded map.")
-            return language_map[language_code]
-
-        # If not in map, and if we have app context, try the database
-        if has_request_context(): # Check if we are in an application context that allows DB queries
-            try:
-                language = Language.query.get(language_code)
-                if language:
-                    logger.info(f"Language code '{language_code}' resolved to '{language.name}' from database.")
-                    return language.name
-                else:
-                    logger.info(f"Language code '{language_code}' not found in database (after checking map). Using placeholder.")
-            except Exception as e:
-                logger.error(f"Error querying database for language code '{language_code}': {str(e)}", exc_info=True)
-                logger.info(f"Using placeholder for language code '{language_code}' after DB error.")
-        else:
-            logger.warning(f"Language code '{language_code}' not in hardcoded map and no request context to query database. Using placeholder.")
-            
-        # Ultimate fallback if not in map and DB query not possible or failed
+        """Get the language name from code, from the language registry (see app/cms/languages.py)"""
+        # Imported here: app.cms imports this module
+        from app.cms.languages import get_language_registry
+        name = get_language_registry().name(language_code)
+        if name:
+            return name
+        logger.warning(f"Language code '{language_code}' is not a known language. Using placeholder.")
         return f"Language ({language_code})"
     
     def translate_content(self, content, from_lang_code, to_lang_code):
@@ -143,6 +195,8 @@ class TranslationService:
             
         Returns:
             str: Translated content or None if translation fails
+        
+        Content longer than chunk_tokens is translated in chunks (see _translate_long_content).
         """
         if not self.is_available():
             logger.error(f"API key not available for {to_lang_code}")
@@ -152,6 +206,12 @@ class TranslationService:
             return "" 
         if from_lang_code == to_lang_code: return content
         
+        if estimate_tokens(content) > self.chunk_tokens and len(split_blocks(content)) > 1:
+            return self._translate_long_content(content, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+        return self._translate_html(content, to_lang_name, from_lang_name)
+    
+    def _translate_html(self, content, to_lang_name, from_lang_name, max_tokens=4090):
+        """Translate an HTML fragment in one request; returns None if it failed"""
         logger.info(f"Attempting to translate ~{len(content)} chars from {from_lang_name} to {to_lang_name}...")
         logger.debug(f"Translation prompt for {to_lang_name} will use from_lang_name: '{from_lang_name}', to_lang_name: '{to_lang_name}'")
         
@@ -166,74 +226,223 @@ If there are any untranslatable terms (like product names, code snippets, or spe
 </content_to_translate>
 
 Respond ONLY with the fully translated HTML content that would go inside the <content_to_translate> element. Ensure your response includes ALL original HTML structure. Do not add any explanatory text before or after the translated HTML block."""
-        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        translated_content = self._chat_completion(prompt, to_lang_name, max_tokens=max_tokens)
+        if translated_content is None:
+            return None
+        
+        translated_content = translated_content.strip().replace('```', '')
+        logger.info(f"Original len: {len(content)}, Translated len ({to_lang_name}): {len(translated_content)}. Sample: '{translated_content[:70]}...'")
+
+        if not translated_content.strip():
+            logger.warning(f"Translated content for {to_lang_name} is EMPTY. Original had {len(content)} chars.")
+            # Consider this a failure for robustness, as empty translation is usually not desired.
+            return None 
+        if translated_content == content and len(content) > 50: # Heuristic for non-trivial content
+            logger.warning(f"Translated content for {to_lang_name} is identical to original for non-trivial input.")
+            # Potentially return None here if this is a strong indicator of failure for this API
+            # For now, let it pass but log it clearly.
+
+        return translated_content
+    
+    def _translate_long_content(self, content, from_lang_code, to_lang_code, from_lang_name, to_lang_name):
+        """
+        Translate long HTML content in token-budgeted chunks of its blocks and stitch
+        the results back together in order.
+        
+        Each finished chunk is stored in the translation memory as soon as it
+        arrives, so when a chunk fails, translating the content again only sends
+        the chunks that did not finish.
+        
+        Returns:
+            str: Translated content, or None if some blocks could not be translated
+        """
+        if self.memory_enabled and self.memory.available():
+            plan = self.memory.plan(content, from_lang_code, to_lang_code, self.model)
+            self._add_usage(memory_segments=plan.translatable, memory_hits=plan.hits, tokens_saved=plan.tokens_saved)
+        else:
+            plan = ContentPlan(content, from_lang_code, to_lang_code, self.model)
+        logger.info(f"Translating long content to {to_lang_name}: {len(plan.pending)} of {plan.translatable} blocks "
+                    f"(~{plan.pending_tokens()} tokens) in chunks of ~{self.chunk_tokens} tokens")
+        self._translate_chunks(plan, from_lang_name, to_lang_name)
+        for index in list(plan.pending)[:MAX_SEGMENT_FALLBACKS]:
+            value = self._translate_html(plan.segments[index], to_lang_name, from_lang_name, max_tokens=self.structured_max_tokens)
+            if value is not None:
+                plan.results[index] = plan._keep_spacing(index, value)
+                plan.pending.remove(index)
+                self._remember(plan, [index])
+        if plan.pending:
+            logger.error(f"{len(plan.pending)} content blocks for {to_lang_name} could not be translated; "
+                         f"the finished ones are kept for the next attempt")
+            return None
+        return plan.content()
+    
+    def _translate_chunks(self, plan, from_lang_name, to_lang_name):
+        """
+        Translate the plan's pending blocks in chunks of about chunk_tokens, up to
+        chunk_concurrency at once, and fill in (and remember) each chunk as it finishes.
+        Blocks a chunk's answer missed stay pending.
+        """
+        chunks = plan.chunks(self.chunk_tokens)
+        if not chunks:
+            return
+        usage = getattr(self._usage, 'current', None)
+        check = getattr(self._cancel, 'check', None)
+        
+        def translate(fields):
+            # Worker threads add to the caller's usage record and follow its cancel check
+            self._usage.current = usage
+            self._cancel.check = check
+            try:
+                return self.translate_fields_with_names(fields, plan.from_lang, plan.to_lang, from_lang_name, to_lang_name)
+            finally:
+                self._usage.current = None
+                self._cancel.check = None
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.chunk_concurrency, len(chunks)))) as executor:
+            futures = [executor.submit(translate, fields) for fields in chunks]
+            for future in as_completed(futures):
+                try:
+                    translated = future.result()
+                except TranslationCancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                except Exception as e:
+                    logger.error(f"Chunk translation to {to_lang_name} failed: {e}", exc_info=True)
+                    continue
+                # Stored from this thread, which has the app context
+                self._remember(plan, plan.fill(translated))
+    
+    def _remember(self, plan, indexes):
+        """Store translated blocks of a plan in the translation memory, if it is in use"""
+        if indexes and self.memory_enabled and self.memory.available():
+            self.memory.store([(plan.segments[index], plan.results[index]) for index in indexes],
+                              plan.from_lang, plan.to_lang, plan.model)
+    
+    def _chat_completion(self, prompt, to_lang_name, max_tokens=4090, json_mode=False):
+        """
+        One chat completion request; token usage is added to the current usage record.
+        
+        The answer is streamed unless DEEPSEEK_STREAM is false, so the read timeout
+        applies between tokens rather than to the whole answer.
+        
+        Returns:
+            str: The message content, or None if the request failed
+        """
         data = {
             "model": self.model, "messages": [
                 {"role": "system", "content": "You are an expert translator."}, {"role": "user", "content": prompt}
             ],
-            "temperature": 0.2, "max_tokens": 4090 # Increased slightly just in case
+            "temperature": 0.2, "max_tokens": max_tokens
         }
-
-        # Create a new session for each call to ensure thread safety
-        local_session = requests.Session()
-        adapter = HTTPAdapter(
-            pool_connections=1, # Fine for single, short-lived session
-            pool_maxsize=1,   # Fine for single, short-lived session
-            max_retries=Retry(
-                total=2,  # Reduced retries from original global session for quicker feedback per call
-                backoff_factor=1,
-                status_forcelist=[408, 429, 500, 502, 503, 504],
-                allowed_methods=["POST"],
-                respect_retry_after_header=True
-            )
-        )
-        local_session.mount('https://', adapter)
+        if json_mode:
+            data["response_format"] = {"type": "json_object"}
+        if self.stream_responses:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}
 
         try:
-            # Removed: if hasattr(g, 'cancel_translation') and g.cancel_translation: return None
             # Cancellation is primarily handled by X-Cancel-Translation header check before task submission in routes.py
             # and task timeout via future.result(timeout=...).
-            
-            logger.debug(f"Calling DeepSeek API for {to_lang_name}. URL: {self.api_base_url}/chat/completions. Timeout: (20, 75)")
-            response = local_session.post(f"{self.api_base_url}/chat/completions", headers=headers, json=data, timeout=(20, 75)) # Connect, Read timeouts
-            
-            logger.info(f"DeepSeek API response for {to_lang_name}. Status: {response.status_code}. Raw Response Text (first 500 chars): {response.text[:500]}")
-
-            if response.status_code != 200:
-                logger.error(f"DeepSeek API Error ({to_lang_name}): {response.status_code} - {response.text[:200]}") # Log more of error if not 200
-                return None
-            
+            logger.debug(f"Calling {self.provider.label} for {to_lang_name}. URL: {self.provider.chat_url}. Timeout: (20, 75)")
+            response = self._post_rate_limited(data, to_lang_name)
+            self._add_usage(api_calls=1)
             try:
-                response_data = response.json()
-            except ValueError as json_e: # Handle cases where response is not valid JSON
-                logger.error(f"Failed to parse DeepSeek API response as JSON for {to_lang_name}. Error: {str(json_e)}. Response text: {response.text[:500]}")
-                return None
+                if response.status_code != 200:
+                    logger.error(f"DeepSeek API Error ({to_lang_name}): {response.status_code} - {response.text[:200]}") # Log more of error if not 200
+                    return None
+                
+                if 'text/event-stream' in response.headers.get('Content-Type', ''):
+                    content, finish_reason, usage = self._read_stream(response)
+                    logger.info(f"DeepSeek API response for {to_lang_name} streamed. Status: {response.status_code}. "
+                                f"Content (first 500 chars): {content[:500]}")
+                else:
+                    logger.info(f"DeepSeek API response for {to_lang_name}. Status: {response.status_code}. Raw Response Text (first 500 chars): {response.text[:500]}")
+                    try:
+                        response_data = response.json()
+                    except ValueError as json_e: # Handle cases where response is not valid JSON
+                        logger.error(f"Failed to parse DeepSeek API response as JSON for {to_lang_name}. Error: {str(json_e)}. Response text: {response.text[:500]}")
+                        return None
+                    if not response_data.get("choices") or not response_data["choices"][0].get("message", {}).get("content"):
+                        logger.error(f"Invalid DeepSeek API response structure for {to_lang_name}. Full Response JSON: {json.dumps(response_data)}")
+                        usage = response_data.get("usage") or {}
+                        self._add_usage(prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0))
+                        return None
+                    content = response_data["choices"][0]["message"]["content"]
+                    finish_reason = response_data["choices"][0].get("finish_reason")
+                    usage = response_data.get("usage") or {}
+            finally:
+                response.close()
 
-            if not response_data.get("choices") or not response_data["choices"][0].get("message", {}).get("content"):
-                logger.error(f"Invalid DeepSeek API response structure for {to_lang_name}. Full Response JSON: {json.dumps(response_data)}")
+            self._add_usage(prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0))
+            if not content:
+                logger.error(f"DeepSeek API response for {to_lang_name} has no content")
                 return None
+            if finish_reason == "length":
+                logger.warning(f"DeepSeek API response for {to_lang_name} was cut off at max_tokens={max_tokens}")
             
-            translated_content = response_data["choices"][0]["message"]["content"].strip().replace('```', '')
-            logger.info(f"Original len: {len(content)}, Translated len ({to_lang_name}): {len(translated_content)}. Sample: '{translated_content[:70]}...'")
-
-            if not translated_content.strip():
-                logger.warning(f"Translated content for {to_lang_name} is EMPTY. Original had {len(content)} chars.")
-                # Consider this a failure for robustness, as empty translation is usually not desired.
-                return None 
-            if translated_content == content and len(content) > 50: # Heuristic for non-trivial content
-                logger.warning(f"Translated content for {to_lang_name} is identical to original for non-trivial input.")
-                # Potentially return None here if this is a strong indicator of failure for this API
-                # For now, let it pass but log it clearly.
-
-            return translated_content
+            return content
+        except TranslationCancelled:
+            logger.info(f"DeepSeek API call for {to_lang_name} cancelled")
+            raise
         except requests.exceptions.Timeout as e:
             logger.error(f"DeepSeek API call timed out for {to_lang_name}: {str(e)}")
             return None
         except Exception as e:
-            logger.error(f"Exception during translate_content for {to_lang_name}: {str(e)}", exc_info=True)
+            logger.error(f"Exception during DeepSeek API call for {to_lang_name}: {str(e)}", exc_info=True)
             return None
-        finally:
-            local_session.close() # Ensure the local session is always closed
+    
+    def _read_stream(self, response):
+        """
+        Collect a streamed (server-sent events) chat completion.
+        
+        Returns:
+            tuple: (content, finish_reason, usage)
+        """
+        parts = []
+        finish_reason = None
+        usage = {}
+        for line in response.iter_lines():
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                break
+            self._check_cancelled()
+            try:
+                event = json.loads(payload)
+            except ValueError:
+                logger.warning(f"Skipping malformed DeepSeek stream event: {payload[:200]}")
+                continue
+            usage = event.get("usage") or usage
+            for choice in event.get("choices") or []:
+                parts.append((choice.get("delta") or {}).get("content") or '')
+                finish_reason = choice.get("finish_reason") or finish_reason
+        return ''.join(parts), finish_reason, usage
+    
+    def _post_rate_limited(self, data, to_lang_name):
+        """
+        POST to the chat completions API through the shared rate limiter.
+
+        A 429 pauses the limiter for the Retry-After the API asked for (or an
+        exponential backoff) and the call is repeated, up to
+        max_rate_limited_attempts times; the last response is returned.
+        """
+        stream = bool(data.get("stream"))
+        for attempt in range(1, self.max_rate_limited_attempts + 1):
+            self._check_cancelled()
+            self.rate_limiter.acquire()
+            self._check_cancelled()
+            response = self.provider.post_chat(data, timeout=(20, 75), stream=stream) # Connect, Read timeouts
+            if response.status_code != 429 or attempt == self.max_rate_limited_attempts:
+                return response
+            response.close()
+            delay = parse_retry_after(response.headers.get('Retry-After'), default=2 ** attempt)
+            logger.warning(f"DeepSeek API rate limited ({to_lang_name}), pausing calls for {delay:.1f}s (attempt {attempt})")
+            self.rate_limiter.penalize(delay)
+        return response
     
     def translate_post_fields(self, post_data, from_lang_code, to_lang_code):
         logger.info(f"-- Starting field translation for {to_lang_code} (via main translate_post_fields method) --")
@@ -259,51 +468,219 @@ Respond ONLY with the fully translated HTML content that would go inside the <co
 
         return self.translate_post_fields_with_lang_names(post_data, from_lang_code, to_lang_code, from_lang_name_resolved, to_lang_name_resolved)
 
-    def translate_post_fields_with_lang_names(self, post_data, from_lang_code, to_lang_code, from_lang_name, to_lang_name):
-        """Alternative version of translate_post_fields that accepts language names directly to avoid DB lookups"""
-        logger.info(f"-- Starting field translation using explicit lang names: {from_lang_name} to {to_lang_name} --")
-        translated_fields = {}
+    def translate_post_fields_with_lang_names(self, post_data, from_lang_code, to_lang_code, from_lang_name, to_lang_name, mode=None,
+                                              partial=False):
+        """
+        Alternative version of translate_post_fields that accepts language names directly to avoid DB lookups
         
-        # Removed: Early cancellation check using 'g' object as it's not reliable in worker threads without context
-        # if hasattr(g, 'cancel_translation') and g.cancel_translation:
-        #     logger.warning(f"Translation for {to_lang_code} aborted before starting fields.")
-        #     return None
+        In structured mode (the default, see DEEPSEEK_TRANSLATION_MODE) title, content,
+        meta_title and meta_description go to the API in one request; only fields
+        missing from or invalid in its answer are translated one call each.
+        In per_field mode every field is translated one call each, as before the
+        structured request, and the translation memory is not used, so the two
+        modes can be compared. Latency, API calls and tokens are recorded per
+        mode in self.stats; fields translated one call each count as fallbacks.
+        
+        Returns None if the title or the content could not be translated. With
+        partial=True only a failed title does: when the content fails the other
+        fields are still returned, without 'content'.
+        """
+        mode = mode or self.translation_mode
+        logger.info(f"-- Starting field translation using explicit lang names: {from_lang_name} to {to_lang_name} ({mode}) --")
+        usage = self._start_usage()
+        started = time.monotonic()
+        result = None
+        requested = []
+        translated = {}
+        content_failed = False
+        try:
+            requested = [field for field in STRUCTURED_FIELDS if (post_data.get(field) or '').strip()]
+            calls_api = self.is_available() and from_lang_code != to_lang_code
+            plan = None
+            if calls_api and mode == MODE_STRUCTURED and 'content' in requested \
+                    and self.memory_enabled and self.memory.available():
+                plan = self.memory.plan(post_data['content'], from_lang_code, to_lang_code, self.model)
+                self._add_usage(memory_segments=plan.translatable, memory_hits=plan.hits, tokens_saved=plan.tokens_saved)
+
+            if calls_api and mode == MODE_STRUCTURED:
+                # Long content goes in chunks of its own (see _complete_content_plan and translate_content_with_names)
+                fields = {field: post_data[field] for field in requested if field != 'content'}
+                if plan and plan.pending_tokens() <= self.chunk_tokens:
+                    fields.update(plan.pending_fields())
+                elif not plan and 'content' in requested and estimate_tokens(post_data['content']) <= self.chunk_tokens:
+                    fields['content'] = post_data['content']
+                if fields:
+                    translated = self.translate_fields_with_names(fields, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+
+            if plan:
+                content = self._complete_content_plan(plan, translated, post_data['content'],
+                                                      from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+                translated = {field: value for field, value in translated.items() if not field.startswith('content.')}
+                if content is not None:
+                    translated['content'] = content
+                elif estimate_tokens(post_data['content']) > self.chunk_tokens:
+                    # Chunks already failed; the blocks that finished are remembered for the next attempt
+                    if not partial:
+                        return result
+                    content_failed = True
+            result = self._translate_post_fields(post_data, from_lang_code, to_lang_code, from_lang_name, to_lang_name, translated,
+                                                 partial=partial, content_failed=content_failed)
+            return result
+        finally:
+            self._usage.current = None
+            self._usage.last = usage
+            elapsed = time.monotonic() - started
+            fallback_fields = len([field for field in requested if field not in translated])
+            self.stats.record(mode, elapsed, usage, fallback_fields=fallback_fields,
+                              failed=result is None or 'content' not in result)
+            logger.info(f"Field translation to {to_lang_name} ({mode}) took {elapsed:.1f}s, {usage['api_calls']} API calls, "
+                        f"{usage['prompt_tokens']}+{usage['completion_tokens']} tokens, {fallback_fields} per-field fallbacks, "
+                        f"memory {usage['memory_hits']}/{usage['memory_segments']} blocks (~{usage['tokens_saved']} tokens saved)")
+
+    def _complete_content_plan(self, plan, translated, content, from_lang_code, to_lang_code, from_lang_name, to_lang_name):
+        """
+        Put translated content together from memory hits and newly translated blocks,
+        and remember the new blocks.
+
+        Blocks not in the structured answer are translated one call each when there
+        are only a few, otherwise in chunks (see _translate_chunks). If short content
+        still has untranslated blocks it is translated whole in one call as before,
+        and its blocks are remembered if they line up with the source.
+
+        Returns:
+            str: Translated content, or None if it could not be translated
+        """
+        self._remember(plan, plan.fill(translated))
+        if len(plan.pending) > MAX_SEGMENT_FALLBACKS:
+            self._translate_chunks(plan, from_lang_name, to_lang_name)
+        for index in list(plan.pending)[:MAX_SEGMENT_FALLBACKS]:
+            value = self._translate_html(plan.segments[index], to_lang_name, from_lang_name, max_tokens=self.structured_max_tokens)
+            if value is None:
+                break
+            plan.results[index] = plan._keep_spacing(index, value)
+            plan.pending.remove(index)
+            self._remember(plan, [index])
+
+        if not plan.pending:
+            return plan.content()
+        if estimate_tokens(content) > self.chunk_tokens:
+            logger.error(f"{len(plan.pending)} content blocks for {to_lang_name} could not be translated; "
+                         f"the finished ones are kept for the next attempt")
+            return None
+
+        logger.info(f"{len(plan.pending)} content blocks for {to_lang_name} still untranslated; translating the whole content")
+        # The memory hits went unused after all
+        self._add_usage(memory_hits=-plan.hits, tokens_saved=-plan.tokens_saved)
+        whole = self._translate_html(content, to_lang_name, from_lang_name)
+        if whole is None:
+            return None
+        parts = split_blocks(whole)
+        if len(parts) == len(plan.segments):
+            self.memory.store([(plan.segments[index], parts[index]) for index in plan.hashes],
+                              from_lang_code, to_lang_code, self.model)
+        return whole
+
+    def last_usage(self):
+        """API calls, tokens and translation memory use of this thread's last post translation"""
+        return getattr(self._usage, 'last', None)
+
+    def translate_fields_with_names(self, fields, from_lang_code, to_lang_code, from_lang_name, to_lang_name):
+        """
+        Translate several fields in one request, as a JSON object keyed by field name.
+        
+        Returns:
+            dict: The fields that came back valid (non-empty strings keeping the
+                source's HTML markup); missing or invalid ones are left out
+        """
+        source = json.dumps(fields, ensure_ascii=False, indent=1)
+        prompt = f"""Translate every value of the JSON object inside the <fields_to_translate> element from {from_lang_name} into {to_lang_name}.
+Translate each value completely, from the beginning to the very end.
+Values containing HTML must keep ALL original HTML tags (like <p>, <h1>, <h2>, <ul>, <li>, <strong>, <a>, etc.), structure, and attributes EXACTLY as they are; translate only the text content within the tags.
+If there are any untranslatable terms (like product names, code snippets, or specific proper nouns), keep them as they are in the original language.
+
+<fields_to_translate>
+{source}
+</fields_to_translate>
+
+Respond ONLY with a JSON object with exactly the same keys ({', '.join(fields)}) whose values are the translations. Do not add any explanatory text."""
+        logger.info(f"Attempting to translate {len(fields)} fields (~{len(source)} chars) from {from_lang_name} to {to_lang_name} in one request...")
+        answer = self._chat_completion(prompt, to_lang_name, max_tokens=self.structured_max_tokens, json_mode=True)
+        if answer is None:
+            return {}
+        answer = answer.strip()
+        if answer.startswith('```'):
+            answer = answer.strip('`').strip()
+            if answer.startswith('json'):
+                answer = answer[4:]
+        try:
+            parsed = json.loads(answer)
+        except ValueError as e:
+            logger.warning(f"Structured translation for {to_lang_name} is not valid JSON ({e}); falling back to per-field requests")
+            return {}
+        if not isinstance(parsed, dict):
+            logger.warning(f"Structured translation for {to_lang_name} is not a JSON object; falling back to per-field requests")
+            return {}
+
+        translated = {}
+        for field, original in fields.items():
+            value = parsed.get(field)
+            if not isinstance(value, str) or not value.strip():
+                logger.warning(f"Structured translation for {to_lang_name} is missing '{field}'")
+                continue
+            value = value.strip()
+            source_tags = len(_HTML_TAG.findall(original))
+            if source_tags and len(_HTML_TAG.findall(value)) < source_tags * 0.9:
+                logger.warning(f"Structured translation of '{field}' for {to_lang_name} lost HTML tags "
+                               f"({len(_HTML_TAG.findall(value))} of {source_tags})")
+                continue
+            translated[field] = value
+        return translated
+
+    def _translate_post_fields(self, post_data, from_lang_code, to_lang_code, from_lang_name, to_lang_name, translated=None,
+                               partial=False, content_failed=False):
+        """
+        Fill in the post fields, translating one call each those not already in translated.
+
+        content_failed: the content already failed to translate and is not tried again.
+        With partial=True a failed content is left out of the result instead of failing it.
+        """
+        translated = translated or {}
+        translated_fields = {}
+
+        def translate(field, value):
+            if field in translated:
+                return translated[field]
+            return self.translate_content_with_names(value, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
 
         # Title (Critical)
         title_orig = post_data.get('title', '')
         logger.info(f"Translating TITLE for {to_lang_code}...")
-        translated_title = self.translate_content_with_names(title_orig, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+        translated_title = translate('title', title_orig)
         if translated_title is None:
             logger.error(f"CRITICAL: Title translation FAILED for {to_lang_code}.")
             return None # If title fails, the whole translation for this language fails
         translated_fields['title'] = translated_title
         logger.info(f"Title for {to_lang_code} translated successfully.")
 
-        # Removed: Cancellation check after title using 'g' object
-        # if hasattr(g, 'cancel_translation') and g.cancel_translation:
-        #    logger.warning(f"Translation for {to_lang_code} aborted after title.")
-        #    return None 
-
         # Content (Critical)
         content_orig = post_data.get('content', '')
-        logger.info(f"Translating CONTENT for {to_lang_code}...")
-        translated_content = self.translate_content_with_names(content_orig, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+        translated_content = None
+        if not content_failed:
+            logger.info(f"Translating CONTENT for {to_lang_code}...")
+            translated_content = translate('content', content_orig)
         if translated_content is None:
             logger.error(f"CRITICAL: Main content translation FAILED for {to_lang_code}.")
-            return None # If main content fails, the whole translation for this language fails
-        translated_fields['content'] = translated_content
-        logger.info(f"Content for {to_lang_code} translated successfully.")
-
-        # Removed: Cancellation check after content using 'g' object
-        # if hasattr(g, 'cancel_translation') and g.cancel_translation:
-        #    logger.warning(f"Translation for {to_lang_code} aborted after content.")
-        #    return None
+            if not partial:
+                return None # If main content fails, the whole translation for this language fails
+        else:
+            translated_fields['content'] = translated_content
+            logger.info(f"Content for {to_lang_code} translated successfully.")
 
         # Meta Title (Less critical, try to translate, use placeholder or derived if fails)
         meta_title_orig = post_data.get('meta_title', '')
         if meta_title_orig:
             logger.info(f"Translating META_TITLE for {to_lang_code}...")
-            translated_meta_title = self.translate_content_with_names(meta_title_orig, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+            translated_meta_title = translate('meta_title', meta_title_orig)
             if translated_meta_title is not None:
                 translated_fields['meta_title'] = translated_meta_title
             else:
@@ -318,7 +695,7 @@ Respond ONLY with the fully translated HTML content that would go inside the <co
         meta_description_orig = post_data.get('meta_description', '')
         if meta_description_orig:
             logger.info(f"Translating META_DESC for {to_lang_code}...")
-            translated_meta_description = self.translate_content_with_names(meta_description_orig, from_lang_code, to_lang_code, from_lang_name, to_lang_name)
+            translated_meta_description = translate('meta_description', meta_description_orig)
             if translated_meta_description is not None:
                 translated_fields['meta_description'] = translated_meta_description
             else:
@@ -327,22 +704,47 @@ Respond ONLY with the fully translated HTML content that would go inside the <co
         else: # If original meta_description is empty, try to generate a simple one from translated content
             logger.info(f"Original meta_description for {to_lang_code} is empty. Attempting to generate from content.")
             if translated_content:
-                # Basic plain text conversion and excerpt
-                temp_div = f"<div>{translated_content}</div>" # Wrap in div for basic parsing if needed
-                # A more robust HTML to text might be good here if issues persist
-                plain_text_content = temp_div.replace('</p>', ' </p>').replace('<br>', ' ').replace('<br/>', ' ')
-                import re
-                plain_text_content = re.sub('<[^<]+?>', '', plain_text_content) # Strip tags
-                excerpt = (plain_text_content.strip()[:155] + '...') if len(plain_text_content.strip()) > 155 else plain_text_content.strip()
+                # Same HTML-to-text pipeline as the stored translation excerpts
+                excerpt = make_excerpt(html_to_text(translated_content), 155)
                 translated_fields['meta_description'] = excerpt
                 logger.info(f"Generated meta_description for {to_lang_code}: '{excerpt[:50]}...'")
             else:
                 translated_fields['meta_description'] = ''
 
         translated_fields['meta_keywords'] = post_data.get('meta_keywords', '')
-        logger.info(f"-- Field translation for {to_lang_code} completed successfully with explicit lang names. --")
+        if translated_content is None:
+            logger.warning(f"-- Field translation for {to_lang_code} completed without the content. --")
+        else:
+            logger.info(f"-- Field translation for {to_lang_code} completed successfully with explicit lang names. --")
         return translated_fields
 
+    def set_cancel_check(self, check):
+        """
+        Stop this thread's translations once check() returns True: before each API
+        call and between streamed tokens, TranslationCancelled is raised. check is
+        called often and from chunk threads, so it should be cheap and thread-safe.
+        Pass None to clear it.
+        """
+        self._cancel.check = check
+
+    def _check_cancelled(self):
+        check = getattr(self._cancel, 'check', None)
+        if check is not None and check():
+            raise TranslationCancelled()
+
+    def _start_usage(self):
+        """Begin collecting API calls and tokens of this thread's requests"""
+        usage = {'api_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                 'memory_segments': 0, 'memory_hits': 0, 'tokens_saved': 0}
+        self._usage.current = usage
+        return usage
+
+    def _add_usage(self, **counts):
+        usage = getattr(self._usage, 'current', None)
+        if usage is not None:
+            for name, value in counts.items():
+                usage[name] += value or 0
+
     def _create_placeholder_translation(self, content, from_lang_code, to_lang_code):
         to_lang_name = self.get_language_name(to_lang_code)
         return f"[{to_lang_name}] {content}"
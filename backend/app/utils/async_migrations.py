@@ -6,6 +6,7 @@ allowing the main Flask application to start up quickly and become responsive
 while potentially time-consuming migrations run in the background.
 """
 
+import importlib
 import threading
 import time
 import logging
@@ -19,6 +20,95 @@ _migrations_running = False
 _migrations_complete = False
 _migration_results = {}
 
+# Columns the models map: added before the app serves a request (see run_schema_migrations)
+# (result key, module in app/utils or alternatives to try in order, function, what it migrates, what fails without it)
+SCHEMA_MIGRATIONS = (
+    ('schema_translation_text_fields', 'migrate_mysql_translation_text_fields', 'add_columns',
+     'CMS translation text columns', 'translation queries will fail'),
+    ('schema_translation_runs', 'migrate_mysql_translation_runs', 'run_migration',
+     'CMS translation run columns', 'auto-translation runs will fail'),
+)
+
+# Run in the background thread, in order; a failing step never stops the ones after it
+BACKGROUND_MIGRATIONS = (
+    ('recharge_history', 'migrate_recharge_history', 'run_migration',
+     'recharge_history columns', 'payments may have limited functionality'),
+    ('user_credits', 'migrate_user_credits', 'run_migration',
+     'users table credits column', 'payment verification may fail'),
+    # The PostgreSQL migration where pymysql is not installed
+    ('auto_translation', ('migrate_mysql_auto_translation', 'migrate_auto_translation'), 'run_migration',
+     'CMS auto-translation fields', 'auto-translation may not work properly'),
+    ('tags_description', 'migrate_mysql_tags_description', 'run_migration',
+     'CMS tags description field', 'tags may not display correctly'),
+    ('language_flags', 'migrate_mysql_language_flags', 'run_migration',
+     'CMS language flags', 'language flags may not display correctly'),
+    ('translation_text_fields', 'migrate_mysql_translation_text_fields', 'run_migration',
+     'CMS translation text fields', 'excerpts will be computed per request'),
+    ('translation_runs', 'migrate_mysql_translation_runs', 'run_migration',
+     'CMS translation runs', 'auto-translation runs may fail'),
+    ('indexes', 'migrate_indexes', 'run_migration',
+     'indexes', 'some queries may scan whole tables'),
+    ('search_index', 'migrate_search_index', 'run_migration',
+     'blog search index', 'blog search will use LIKE'),
+)
+
+def _import_first(modules):
+    """Import the first of the alternative migration modules that can be imported"""
+    modules = (modules,) if isinstance(modules, str) else modules
+    for module in modules[:-1]:
+        try:
+            return importlib.import_module(f'.{module}', __package__)
+        except ImportError:
+            logger.info(f"{module} cannot be imported, trying the next migration")
+    return importlib.import_module(f'.{modules[-1]}', __package__)
+
+
+def _run_step(name, module, function, description, consequence):
+    """
+    Run one migration step and record its result under name.
+
+    module may be a tuple of modules, the first one that imports is used.
+    Errors, including no module that imports, are logged and recorded as a
+    failed step instead of being raised.
+
+    Returns:
+        bool: Whether the step succeeded
+    """
+    from app import db
+    try:
+        step = getattr(_import_first(module), function)
+        logger.info(f"Running {description} migration...")
+        result = step() is not False
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in {description} migration: {e}", exc_info=True)
+        result = False
+    _migration_results[name] = result
+    if result:
+        logger.info(f"Database migration for {description} completed successfully")
+    else:
+        logger.warning(f"Database migration for {description} failed, {consequence}")
+    return result
+
+def run_schema_migrations(app):
+    """
+    Add the columns the models map but tables created before them lack.
+
+    Unlike the migrations in run_migrations_in_background these run before
+    the app serves a request: every query of the models selects the columns,
+    so until they exist those queries fail. Only the quick ALTER TABLE steps
+    run here; backfills and index builds are left to the background thread.
+
+    Args:
+        app: The Flask application instance
+
+    Returns:
+        bool: True if every step succeeded
+    """
+    with app.app_context():
+        results = [_run_step(*migration) for migration in SCHEMA_MIGRATIONS]
+    return all(results)
+
 def run_migrations_in_background(app):
     """
     Start a background thread to run all database migrations asynchronously.
@@ -48,12 +138,13 @@ def run_migrations_in_background(app):
     logger.info("Database migrations started in background thread")
     return migration_thread
 
-def _run_all_migrations(app):
+def _run_all_migrations(app, delay=2):
     """
     Run all database migrations sequentially in a background thread.
     
     Args:
         app: The Flask application instance
+        delay: Seconds to wait first, so the app has fully started
     """
     global _migrations_running, _migrations_complete, _migration_results
     
@@ -61,90 +152,13 @@ def _run_all_migrations(app):
         logger.info("Starting background database migrations")
         
         try:
-            # Small delay to ensure app has fully started
-            time.sleep(2)
+            time.sleep(delay)
             
-            # Import migration functions
             try:
-                # Migrate recharge_history table first
-                from .migrate_recharge_history import run_migration as migrate_recharge_history
-                
-                # Execute the migration to add required columns
-                logger.info("Running recharge_history migration...")
-                recharge_migration_result = migrate_recharge_history()
-                _migration_results['recharge_history'] = recharge_migration_result
-                if recharge_migration_result:
-                    logger.info("Database migration for recharge_history columns completed successfully")
-                else:
-                    logger.warning("Database migration for recharge_history failed, payments may have limited functionality")
-                    
-                # Run user credits migration
-                from .migrate_user_credits import run_migration as migrate_user_credits
-                
-                logger.info("Running user credits migration...")
-                # Execute the migration to add credits column to users table
-                user_migration_result = migrate_user_credits()
-                _migration_results['user_credits'] = user_migration_result
-                if user_migration_result:
-                    logger.info("Database migration for users table credits column completed successfully")
-                else:
-                    logger.warning("Database migration for users table credits column failed, payment verification may fail")
-                
-                # Run auto-translation fields migration for CMS
-                try:
-                    # Try MySQL migration first (since we're using MySQL)
-                    from .migrate_mysql_auto_translation import run_migration as migrate_mysql_auto_translation
-                    
-                    logger.info("Running MySQL auto-translation migration...")
-                    # Execute the migration to add auto-translation fields
-                    auto_translation_result = migrate_mysql_auto_translation()
-                    _migration_results['auto_translation'] = auto_translation_result
-                    if auto_translation_result:
-                        logger.info("Database migration for CMS auto-translation fields completed successfully")
-                    else:
-                        logger.warning("Database migration for CMS auto-translation fields failed, auto-translation may not work properly")
-                        
-                    # Run tags description migration
-                    from .migrate_mysql_tags_description import run_migration as migrate_mysql_tags_description
-                    
-                    logger.info("Running MySQL tags description migration...")
-                    # Execute the migration to add description field to tags
-                    tags_description_result = migrate_mysql_tags_description()
-                    _migration_results['tags_description'] = tags_description_result
-                    if tags_description_result:
-                        logger.info("Database migration for CMS tags description field completed successfully")
-                    else:
-                        logger.warning("Database migration for CMS tags description field failed, tags may not display correctly")
-                        
-                    # Run language flags migration
-                    from .migrate_mysql_language_flags import run_migration as migrate_mysql_language_flags
-                    
-                    logger.info("Running MySQL language flags migration...")
-                    # Execute the migration to add flag field to languages
-                    language_flags_result = migrate_mysql_language_flags()
-                    _migration_results['language_flags'] = language_flags_result
-                    if language_flags_result:
-                        logger.info("Database migration for CMS language flags completed successfully")
-                    else:
-                        logger.warning("Database migration for CMS language flags failed, language flags may not display correctly")
-                except ImportError:
-                    # Fallback to PostgreSQL migration if MySQL migration fails
-                    from .migrate_auto_translation import run_migration as migrate_auto_translation
-                    
-                    logger.info("Running PostgreSQL auto-translation migration (fallback)...")
-                    # Execute the migration to add auto-translation fields
-                    auto_translation_result = migrate_auto_translation()
-                    _migration_results['auto_translation'] = auto_translation_result
-                    if auto_translation_result:
-                        logger.info("Database migration for CMS auto-translation fields completed successfully (PostgreSQL)")
-                    else:
-                        logger.warning("Database migration for CMS auto-translation fields failed, auto-translation may not work properly")
-                    
+                for migration in BACKGROUND_MIGRATIONS:
+                    _run_step(*migration)
             except Exception as e:
-                logger.error(f"Error running database migrations: {e}")
-                # Log error details for troubleshooting
-                import traceback
-                logger.error(traceback.format_exc())
+                logger.error(f"Error running database migrations: {e}", exc_info=True)
                 _migration_results['error'] = str(e)
             
             logger.info("Background database migrations completed")
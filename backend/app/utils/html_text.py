@@ -0,0 +1,199 @@
+"""
+Plain text, excerpts and reading time from HTML post content
+
+Used to derive the PostTranslation fields that are stored on write (see
+app/models/cms.py) instead of parsing HTML on every request, and to split
+content into blocks for the translation memory (see split_blocks).
+"""
+import hashlib
+import math
+import re
+from html.parser import HTMLParser
+
+EXCERPT_CHARS = 200
+WORDS_PER_MINUTE = 200
+# Chinese, Japanese and Thai are read per character rather than per word
+CHARACTERS_PER_MINUTE = 500
+
+_BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p',
+    'pre', 'section', 'table', 'td', 'th', 'tr', 'ul'
+}
+_SKIPPED_TAGS = {'script', 'style', 'template', 'noscript', 'head'}
+_VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'
+}
+
+_UNSEGMENTED_CHAR = re.compile('[\u0e00-\u0e7f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+_WORD = re.compile(r'[^\W_]+')
+
+
+class _TextExtractor(HTMLParser):
+    """Collects text content, with a line break around block elements"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+class _BlockSplitter(HTMLParser):
+    """Records the (start, end, is_block) offsets of each top-level element"""
+
+    def __init__(self, html):
+        super().__init__(convert_charrefs=True)
+        self.html = html
+        self.pieces = []
+        self._line_starts = [0]
+        for index, char in enumerate(html):
+            if char == '\n':
+                self._line_starts.append(index + 1)
+        self._stack = []
+        self._start = None
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+    def _tag_end(self, start):
+        end = self.html.find('>', start)
+        return len(self.html) if end < 0 else end + 1
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            self.handle_startendtag(tag, attrs)
+            return
+        if not self._stack:
+            self._start = self._offset()
+        self._stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if not self._stack:
+            start = self._offset()
+            self.pieces.append((start, self._tag_end(start), tag in _BLOCK_TAGS))
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return
+        while self._stack.pop() != tag:
+            pass
+        if not self._stack:
+            self.pieces.append((self._start, self._tag_end(self._offset()), tag in _BLOCK_TAGS))
+
+
+def split_blocks(html):
+    """
+    Split HTML into top-level blocks, so that ''.join(split_blocks(html)) == html.
+
+    Each block element at the top level (<p>, <h2>, <ul>, ...) is one segment;
+    runs of top-level text and inline elements between blocks form one segment
+    each, and whitespace between blocks is a segment of its own.
+    """
+    if not html:
+        return []
+    parser = _BlockSplitter(html)
+    parser.feed(html)
+    parser.close()
+    if parser._stack:  # Unclosed element: the rest is one piece
+        parser.pieces.append((parser._start, len(html), True))
+
+    segments = []
+    position = 0
+    inline_start = None
+    for start, end, is_block in parser.pieces + [(len(html), len(html), True)]:
+        if not is_block:
+            if inline_start is None:
+                inline_start = position
+            position = end
+            continue
+        gap = html[position:start]
+        if inline_start is not None:
+            segments.append(html[inline_start:start] if gap.strip() else html[inline_start:position])
+            if not gap.strip() and gap:
+                segments.append(gap)
+            inline_start = None
+        elif gap:
+            segments.append(gap)
+        if end > start:
+            segments.append(html[start:end])
+        position = end
+    return segments
+
+
+def html_to_text(html):
+    """
+    Readable plain text of an HTML fragment: tags, scripts and styles removed,
+    entities decoded, one line per block element.
+    """
+    if not html:
+        return ''
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = (' '.join(line.split()) for line in ''.join(parser.parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def make_excerpt(text, length=EXCERPT_CHARS):
+    """First length characters of plain text on one line, cut at a word boundary"""
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    space = cut.rfind(' ')
+    if space > length * 0.7:
+        cut = cut[:space]
+    return cut.rstrip(' ,;:.') + '...'
+
+
+def count_words(text):
+    """Words in plain text, counting each Chinese, Japanese or Thai character as one"""
+    characters = len(_UNSEGMENTED_CHAR.findall(text))
+    words = len(_WORD.findall(_UNSEGMENTED_CHAR.sub(' ', text)))
+    return words, characters
+
+
+def reading_minutes(words, characters=0):
+    """Estimated reading time, at least one minute for any text"""
+    if not words and not characters:
+        return 0
+    return max(1, math.ceil(words / WORDS_PER_MINUTE + characters / CHARACTERS_PER_MINUTE))
+
+
+def derive_text_fields(content):
+    """
+    Derived fields stored alongside a translation's HTML content.
+
+    Returns:
+        dict: plain_text, excerpt, word_count, reading_time (minutes), content_hash
+    """
+    plain_text = html_to_text(content)
+    words, characters = count_words(plain_text)
+    return {
+        'plain_text': plain_text,
+        'excerpt': make_excerpt(plain_text),
+        'word_count': words + characters,
+        'reading_time': reading_minutes(words, characters),
+        'content_hash': hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+    }
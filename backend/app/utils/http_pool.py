@@ -0,0 +1,95 @@
+"""
+Long-lived pooled HTTP sessions for outbound API calls
+
+Building a requests.Session per call meant a new TCP connection and TLS
+handshake for every field of every language. A session built here is meant
+to be created once and shared by all threads: each host gets a pool of at
+most pool_size keep-alive connections, and threads beyond that wait for a
+free connection (pool_block) instead of opening throwaway ones.
+
+With http2=True an httpx client is used instead, multiplexing requests over
+one connection per host; it needs the optional httpx[http2] packages and
+falls back to the requests session when they are missing.
+"""
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+logger = logging.getLogger('flask.app')
+
+try:
+    import httpx
+    import h2  # noqa: F401 - httpx needs it for http2=True
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _Http2Session:
+    """The part of the requests.Session API the services use, on an httpx HTTP/2 client"""
+
+    def __init__(self, pool_size, retries):
+        self.client = httpx.Client(transport=httpx.HTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            retries=retries  # Connection errors only; httpx does not retry on status codes
+        ))
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+        try:
+            request = self.client.build_request('POST', url, headers=headers, json=json, timeout=timeout)
+            response = self.client.send(request, stream=stream)
+            if stream and response.status_code != 200:
+                response.read()  # So that .text works on errors, as with requests
+            return response
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+    def close(self):
+        self.client.close()
+
+
+def pooled_session(pool_size=10, retries=2, status_forcelist=(408, 500, 502, 503, 504), http2=False):
+    """
+    A thread-safe session with a bounded keep-alive connection pool per host.
+
+    Args:
+        pool_size: Connections kept per host; size it to the threads calling it
+        retries: Retries of failed connections and of status_forcelist responses
+        status_forcelist: Statuses retried with backoff (POST included)
+        http2: Use HTTP/2 if httpx[http2] is installed
+
+    Returns:
+        requests.Session, or an object with the same post()/close() if http2 is used
+    """
+    pool_size = max(1, int(pool_size))
+    if http2:
+        if HTTP2_AVAILABLE:
+            logger.info(f"Using an HTTP/2 client with up to {pool_size} connections per host")
+            return _Http2Session(pool_size, retries)
+        logger.warning("HTTP/2 requested but httpx[http2] is not installed, using HTTP/1.1 keep-alive")
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,  # Hosts with a cached pool
+        pool_maxsize=pool_size,  # Connections per host
+        pool_block=True,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=1,
+            status_forcelist=list(status_forcelist),
+            allowed_methods=["POST"],
+            respect_retry_after_header=True
+        )
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
@@ -0,0 +1,52 @@
+"""
+Migration script to create the indexes declared on the models that an
+existing database is missing
+
+db.create_all() only creates indexes together with new tables, so indexes
+added to a model later (composite indexes for the hot query shapes, see
+index_advisor.py) are created here.
+
+create_app runs this in the background migrations (see
+app/utils/async_migrations.py). Where startup migrations are turned off
+(DB_MIGRATIONS_ON_STARTUP=false), run it as a deploy step:
+
+    python -m app.utils.migrate_indexes
+"""
+import logging
+from app import db
+
+logger = logging.getLogger('flask.app')
+
+def run_migration():
+    """
+    Create every model-declared index that does not exist yet.
+
+    Returns:
+        bool: True if all missing indexes were created
+    """
+    try:
+        inspector = db.inspect(db.engine)
+        created = []
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name or ''):
+                if index.name and index.name not in existing:
+                    logger.info(f"Creating index {index.name} on {table.name}")
+                    index.create(db.engine)
+                    created.append(index.name)
+        logger.info(f"Index migration complete, {len(created)} indexes created")
+        return True
+    except Exception as e:
+        logger.error(f"Error in index migration: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    # This allows the script to be run directly
+    import os
+    os.environ['DB_MIGRATIONS_ON_STARTUP'] = 'false'  # Don't also start the background migrations
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        run_migration()
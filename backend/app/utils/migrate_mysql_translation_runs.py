@@ -0,0 +1,44 @@
+"""
+MySQL migration script to add the columns later added to the translation run
+tables (see app/cms/bulk_translate.py) to tables created before them
+"""
+import logging
+from sqlalchemy import text
+from app import db
+
+logger = logging.getLogger('flask.app')
+
+COLUMNS = [
+    ("cms_translation_runs", "post_id", "INT NULL"),
+    ("cms_translation_run_items", "memory_segments", "INT DEFAULT 0"),
+    ("cms_translation_run_items", "memory_hits", "INT DEFAULT 0"),
+    ("cms_translation_run_items", "tokens_saved", "INT DEFAULT 0"),
+    ("cms_translation_run_items", "next_attempt_at", "DATETIME NULL"),
+]
+
+def run_migration():
+    """
+    Add post_id to cms_translation_runs and the translation memory and retry
+    columns to cms_translation_run_items if they don't exist
+    """
+    try:
+        for table, column, column_type in COLUMNS:
+            check_sql = f"SHOW COLUMNS FROM `{table}` LIKE '{column}'"
+            result = db.session.execute(text(check_sql))
+            if result.rowcount == 0:
+                alter_sql = f"ALTER TABLE `{table}` ADD COLUMN `{column}` {column_type}"
+                db.session.execute(text(alter_sql))
+                db.session.commit()
+                logger.info(f"Added {column} column to {table} table")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in translation runs migration: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    # This allows the script to be run directly
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        run_migration()
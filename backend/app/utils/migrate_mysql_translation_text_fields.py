@@ -0,0 +1,100 @@
+"""
+MySQL migration script to add the derived text columns to cms_post_translations
+and backfill them for existing rows
+"""
+import logging
+from sqlalchemy import text, bindparam
+from app import db
+from app.utils.html_text import derive_text_fields
+
+logger = logging.getLogger('flask.app')
+
+COLUMNS = [
+    ("plain_text", "LONGTEXT"),
+    ("excerpt", "VARCHAR(255)"),
+    ("word_count", "INT"),
+    ("reading_time", "INT"),
+    ("content_hash", "VARCHAR(64)"),
+]
+
+def backfill(batch_size=200):
+    """
+    Compute the derived text fields of translations that do not have them yet.
+
+    Rows are updated in batches with Core statements, so last_updated_at is kept
+    and no ORM hooks run.
+
+    Returns:
+        int: Number of translations updated
+    """
+    from app.models.cms import PostTranslation
+    table = PostTranslation.__table__
+    update = (table.update()
+              .where(table.c.id == bindparam('_id'))
+              .values(plain_text=bindparam('plain_text'),
+                      excerpt=bindparam('excerpt'),
+                      word_count=bindparam('word_count'),
+                      reading_time=bindparam('reading_time'),
+                      content_hash=bindparam('content_hash'),
+                      last_updated_at=bindparam('_last_updated_at')))
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.content, table.c.last_updated_at)
+            .where(table.c.content_hash.is_(None), table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        params = [
+            dict(derive_text_fields(row.content), _id=row.id, _last_updated_at=row.last_updated_at)
+            for row in rows
+        ]
+        db.session.execute(update, params)
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+        logger.info(f"Backfilled text fields for {updated} translations")
+    return updated
+
+def add_columns():
+    """
+    Add the plain_text, excerpt, word_count, reading_time and content_hash columns
+    to cms_post_translations if they don't exist.
+
+    PostTranslation maps them, so this has to run before the app queries
+    translations (see run_schema_migrations in app/utils/async_migrations.py).
+    """
+    for column, column_type in COLUMNS:
+        check_sql = f"SHOW COLUMNS FROM `cms_post_translations` LIKE '{column}'"
+        result = db.session.execute(text(check_sql))
+        if result.rowcount == 0:
+            alter_sql = f"ALTER TABLE `cms_post_translations` ADD COLUMN `{column}` {column_type}"
+            db.session.execute(text(alter_sql))
+            db.session.commit()
+            logger.info(f"Added {column} column to cms_post_translations table")
+
+def run_migration():
+    """
+    Add the plain_text, excerpt, word_count, reading_time and content_hash columns
+    to cms_post_translations if they don't exist, then backfill them
+    """
+    try:
+        add_columns()
+        updated = backfill()
+        logger.info(f"Translation text fields migration complete, {updated} rows backfilled")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in translation text fields migration: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    # This allows the script to be run directly
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        run_migration()
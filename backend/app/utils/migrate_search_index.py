@@ -0,0 +1,53 @@
+"""
+Migration script to fill the blog search index on an existing database
+
+cms_post_search_terms is created empty by db.create_all() and afterwards
+kept current on every translation save (see app/cms/search.py), so posts
+written before the index existed are only found once they are indexed
+here. Until then the blog search falls back to LIKE.
+
+create_app runs this in the background migrations (see
+app/utils/async_migrations.py). Where startup migrations are turned off
+(DB_MIGRATIONS_ON_STARTUP=false), run it as a deploy step, or rebuild the
+whole index with rebuild_search_index.py:
+
+    python -m app.utils.migrate_search_index
+"""
+import logging
+from app import db
+
+logger = logging.getLogger('flask.app')
+
+def run_migration():
+    """
+    Index every post translation if the search index is empty.
+
+    Returns:
+        bool: True if the index was filled or did not need to be
+    """
+    from app.models.cms import PostTranslation, PostSearchTerm
+    from app.cms.search import rebuild_index
+
+    try:
+        if db.session.query(PostSearchTerm.translation_id).first() is not None:
+            logger.info("Search index already filled, skipping")
+            return True
+        if db.session.query(PostTranslation.id).first() is None:
+            logger.info("No post translations to index")
+            return True
+        indexed = rebuild_index()
+        logger.info(f"Search index migration complete, {indexed} translations indexed")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in search index migration: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    # This allows the script to be run directly
+    import os
+    os.environ['DB_MIGRATIONS_ON_STARTUP'] = 'false'  # Don't also start the background migrations
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        run_migration()
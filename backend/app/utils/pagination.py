@@ -0,0 +1,128 @@
+"""
+Keyset (cursor) pagination
+
+OFFSET pagination reads and throws away every row before the page, and
+.paginate() adds a COUNT(*) over all matching rows on top. Keyset pagination
+instead remembers the sort key of the last row sent, e.g. (published_at, id),
+and asks for rows after it, so every page costs the same with an index on
+the filter columns plus the key.
+
+Lists are newest first: ordered by the key columns descending. The last key
+must be unique (normally the primary key) so rows with equal timestamps are
+neither skipped nor repeated. NULLs in a nullable key column come after all
+non-NULL values, which is what MySQL and SQLite do for DESC.
+
+Cursors are opaque URL-safe strings; clients pass back the next_cursor of
+the previous page. A total is optional: 'exact' counts every matching row,
+'approximate' counts at most APPROXIMATE_COUNT_CAP rows.
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_, func
+
+from app import db
+
+APPROXIMATE_COUNT_CAP = 1000
+
+KeysetPage = namedtuple('KeysetPage', 'items next_cursor has_more total total_is_estimate')
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor for this list"""
+
+
+def _column_of(key):
+    return key.property.columns[0]
+
+
+def encode_cursor(values):
+    """Opaque cursor for a tuple of key values"""
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Key values of a cursor.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or has the wrong number of values
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError('wrong number of values')
+        return [datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+                for value in payload]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}") from e
+
+
+def cursor_for(item, keys):
+    """Cursor pointing just after item"""
+    return encode_cursor([getattr(item, key.key) for key in keys])
+
+
+def _after(keys, values):
+    """Rows that sort after values in descending key order"""
+    key, value = keys[0], values[0]
+    if len(keys) == 1:
+        return key < value
+    rest = _after(keys[1:], values[1:])
+    nullable = _column_of(key).nullable
+    if value is None:
+        return and_(key.is_(None), rest)
+    earlier = or_(key < value, key.is_(None)) if nullable else key < value
+    return or_(earlier, and_(key == value, rest))
+
+
+def count_rows(query, total='exact'):
+    """
+    Number of rows a query matches.
+
+    Returns:
+        tuple: (count, is_estimate); with total='approximate' the count stops at
+            APPROXIMATE_COUNT_CAP and is_estimate is True when the cap was reached
+    """
+    if total == 'approximate':
+        capped = query.order_by(None).with_entities(db.literal(1)).limit(APPROXIMATE_COUNT_CAP + 1).subquery()
+        count = db.session.query(func.count()).select_from(capped).scalar()
+        if count > APPROXIMATE_COUNT_CAP:
+            return APPROXIMATE_COUNT_CAP, True
+        return count, False
+    return query.order_by(None).count(), False
+
+
+def keyset_paginate(query, keys, limit, cursor=None, total=None):
+    """
+    One page of a query, newest first.
+
+    Args:
+        query: Filtered ORM query of the items, without ORDER BY
+        keys: Model attributes to sort on, the last one unique, e.g. (Post.published_at, Post.id)
+        limit: Page size
+        cursor: next_cursor of the previous page, or None for the first page
+        total: None, 'exact' or 'approximate'
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        InvalidCursor: If cursor cannot be decoded
+    """
+    count, is_estimate = count_rows(query, total) if total else (None, False)
+
+    page_query = query
+    if cursor:
+        page_query = page_query.filter(_after(keys, decode_cursor(cursor, len(keys))))
+    rows = page_query.order_by(*(key.desc() for key in keys)).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = cursor_for(items[-1], keys) if has_more else None
+    return KeysetPage(items, next_cursor, has_more, count, is_estimate)
@@ -0,0 +1,85 @@
+"""
+Token bucket rate limiter for calls to external APIs
+
+A bucket holds up to `burst` tokens and refills at `rate` tokens per second;
+every call takes one token and waits when none is left. When the provider
+answers 429 Too Many Requests, penalize() stops every caller sharing the
+bucket until its Retry-After has passed, instead of each thread retrying on
+its own schedule and being throttled again.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value, default=None):
+    """
+    Seconds to wait from a Retry-After header, given as seconds or an HTTP date.
+
+    Returns:
+        float or default: Non-negative delay, or default if the header is missing or invalid
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Thread-safe token bucket; rate <= 0 disables limiting"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now <= self._updated:
+            return
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Take a token, waiting for one if necessary.
+
+        Returns:
+            bool: True once a token is taken, False if timeout elapsed first
+        """
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            if deadline is not None:
+                if time.monotonic() + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + max(0.0, seconds))
+            # Refill only from the end of the pause, so calls resume at `rate` rather than in a burst
+            self._tokens = 0.0
+            self._updated = self._paused_until
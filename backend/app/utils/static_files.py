@@ -0,0 +1,120 @@
+"""
+Serving of user uploads and processed images
+
+Upload, CMS and processed filenames are UUID-based, so a URL always points at
+the same bytes. They are served with:
+
+- strong ETags from the file's mtime, size and name, answering
+  If-None-Match / If-Modified-Since with 304
+- Cache-Control: public, max-age=<1 year>, immutable
+- byte Range requests (206) for partial downloads and resumes
+
+Folder paths are resolved once in init_app() instead of per request.
+
+With STATIC_SENDFILE_MODE set, Python only decides what to send:
+- 'x-accel' returns an X-Accel-Redirect to STATIC_ACCEL_PREFIX/<folder>/<file>,
+  for an nginx `internal` location aliased to each folder.
+- 'x-sendfile' returns an X-Sendfile header with the absolute path, for
+  Apache mod_xsendfile or lighttpd.
+Conditional requests are still answered with 304 before handing off.
+"""
+import mimetypes
+import os
+
+from flask import request, current_app
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+SENDFILE_ACCEL = 'x-accel'
+SENDFILE_HEADER = 'x-sendfile'
+
+
+class StaticFolder:
+    """A directory served under a short name"""
+
+    def __init__(self, name, path, immutable=True, max_age=ONE_YEAR):
+        self.name = name
+        self.path = os.path.abspath(path)
+        self.immutable = immutable
+        self.max_age = max_age
+
+    def resolve(self, filename):
+        """Absolute path of filename inside the folder, or None if it escapes or is missing"""
+        path = safe_join(self.path, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        return path
+
+
+class StaticFileServer:
+    """Registry of served folders plus the response logic shared by their routes"""
+
+    def __init__(self):
+        self.folders = {}
+        self.mode = None
+        self.accel_prefix = '/protected'
+
+    def init_app(self, app):
+        self.mode = (app.config.get('STATIC_SENDFILE_MODE') or '').lower() or None
+        self.accel_prefix = app.config.get('STATIC_ACCEL_PREFIX', '/protected').rstrip('/')
+        app.extensions['static_files'] = self
+
+    def add_folder(self, name, path, immutable=True, max_age=ONE_YEAR):
+        self.folders[name] = StaticFolder(name, path, immutable, max_age)
+        return self.folders[name]
+
+    def folder_path(self, name):
+        return self.folders[name].path
+
+    def send(self, name, filename, mimetype=None):
+        """
+        Respond with a file from a registered folder.
+
+        Args:
+            name: Registered folder name
+            filename: Path relative to the folder
+            mimetype: Content type; guessed from the filename when omitted
+
+        Raises:
+            NotFound: If the file does not exist or escapes the folder
+        """
+        folder = self.folders[name]
+        path = folder.resolve(filename)
+        if path is None:
+            raise NotFound()
+        mimetype = mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if self.mode == SENDFILE_ACCEL:
+            response = self._accel_response(folder, filename, path, mimetype)
+        else:
+            response = send_file(
+                path,
+                request.environ,
+                mimetype=mimetype,
+                conditional=True,
+                etag=True,
+                max_age=folder.max_age,
+                use_x_sendfile=self.mode == SENDFILE_HEADER,
+                response_class=current_app.response_class
+            )
+        if folder.immutable and response.status_code in (200, 206, 304):
+            response.cache_control.immutable = True
+        return response
+
+    def _accel_response(self, folder, filename, path, mimetype):
+        """Hand the body to nginx, answering conditional requests here"""
+        stat = os.stat(path)
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{self.accel_prefix}/{folder.name}/{filename}"
+        response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        response.last_modified = int(stat.st_mtime)
+        response.cache_control.public = True
+        response.cache_control.max_age = folder.max_age
+        # nginx serves Range itself; only the 304 decision is made here
+        return response.make_conditional(request.environ)
+
+
+static_files = StaticFileServer()
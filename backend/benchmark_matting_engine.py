@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the local matting engines against the original per-pixel loop
+
+Generates synthetic product photos (white backdrop, coloured subject with a
+white highlight) at several sizes and times each engine on them.
+
+Usage:
+    python benchmark_matting_engine.py
+    python benchmark_matting_engine.py --sizes 1 4 --skip-legacy-above 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+# Add the backend directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app.matting.engine import ENGINES, get_engine
+
+
+def legacy_pixel_loop(image):
+    """The fallback from matting/service.py before the engines were introduced"""
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    width, height = image.size
+    new_image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    pixels = image.load()
+    new_pixels = new_image.load()
+    for y in range(height):
+        for x in range(width):
+            r, g, b, a = pixels[x, y]
+            if r > 200 and g > 200 and b > 200:
+                a = 0
+            new_pixels[x, y] = (r, g, b, a)
+    return new_image
+
+
+def make_image(megapixels):
+    """Build a 4:3 test image of roughly the requested size"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    image = Image.new('RGB', (width, height), (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((width * 0.2, height * 0.15, width * 0.8, height * 0.85), fill=(180, 60, 40))
+    draw.rectangle((width * 0.45, height * 0.4, width * 0.55, height * 0.6), fill=(250, 250, 250))
+    return image
+
+
+def time_call(func, image, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(image)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 12, 24],
+                        help='Image sizes in megapixels')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per engine; the best time is reported')
+    parser.add_argument('--skip-legacy-above', type=float, default=24,
+                        help='Do not run the slow per-pixel loop above this many megapixels')
+    parser.add_argument('--tile-size', type=int, default=1024)
+    args = parser.parse_args()
+
+    names = ['legacy'] + list(ENGINES)
+    print(f"{'MP':>6} " + " ".join(f"{name:>12}" for name in names))
+    print("-" * (7 + 13 * len(names)))
+
+    for megapixels in args.sizes:
+        image = make_image(megapixels)
+        row = []
+        if megapixels <= args.skip_legacy_above:
+            row.append(time_call(legacy_pixel_loop, image, 1))
+        else:
+            row.append(None)
+        for name in ENGINES:
+            engine = get_engine(name, tile_size=args.tile_size)
+            row.append(time_call(engine.matte, image, args.repeat))
+
+        cells = [f"{value:>11.3f}s" if value is not None else f"{'skipped':>12}" for value in row]
+        print(f"{megapixels:>6g} " + " ".join(cells))
+
+
+if __name__ == '__main__':
+    main()
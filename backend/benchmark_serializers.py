@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark blog post serialization before and after app/cms/serializers.py
+
+Builds 50 posts with 22 translations each (in memory, no database) and times:
+
+    legacy to_dict   - the former Post.to_dict, logging at INFO as in production
+    admin shape      - Post.to_dict() now, every translation in full
+    list shape       - one translation with a content preview, per post
+    json (stdlib)    - encoding the list shape with Flask's default provider
+    json (orjson)    - encoding it with FastJSONProvider, if orjson is installed
+
+Usage:
+    python benchmark_serializers.py
+    python benchmark_serializers.py --posts 50 --languages 22 --repeat 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+# Add the backend directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.models.cms import Post, PostTranslation, PostMedia, Tag
+from app.cms.serializers import serialize_post, SHAPE_ADMIN, SHAPE_LIST
+from app.utils.html_text import derive_text_fields
+from app.utils.json_provider import FastJSONProvider
+
+LANGUAGES = ['en', 'fr', 'es', 'de', 'it', 'pt', 'ru', 'ja', 'ko', 'zh-TW', 'ar',
+             'nl', 'sv', 'tr', 'pl', 'hu', 'el', 'no', 'vi', 'th', 'id', 'ms']
+
+
+def legacy_to_dict(post, include_translations=True, language=None):
+    """Post.to_dict before the serializer module, logging included"""
+    logger = logging.getLogger('flask.app')
+    logger.info(f"Converting post {post.id} to dict, include_translations={include_translations}, language={language}")
+    logger.info(f"Post {post.id}: slug={post.slug}, status={post.status}, translations_count={len(post.translations)}")
+    result = {
+        'id': post.id,
+        'slug': post.slug,
+        'featured_image': post.featured_image,
+        'author_id': post.author_id,
+        'status': post.status,
+        'created_at': post.created_at.isoformat(),
+        'updated_at': post.updated_at.isoformat(),
+        'published_at': post.published_at.isoformat() if post.published_at else None,
+        'media': [media.to_dict() for media in post.media],
+        'tags': [tag.to_dict() for tag in post.tags]
+    }
+    if include_translations:
+        if language:
+            logger.info(f"Looking for translation in language: {language}")
+            translation = next((t for t in post.translations if t.language_code == language), None)
+            if translation:
+                logger.info(f"Found translation for language {language}")
+                result['translation'] = translation.to_dict()
+                result['translation']['is_requested_language'] = True
+            else:
+                en_translation = next((t for t in post.translations if t.language_code == 'en'), None)
+                result['translation'] = en_translation.to_dict() if en_translation else None
+            result['available_languages'] = [t.language_code for t in post.translations]
+        else:
+            logger.info(f"Including all {len(post.translations)} translations")
+            result['translations'] = [trans.to_dict() for trans in post.translations]
+            trans_langs = [t.language_code for t in post.translations]
+            logger.info(f"Translation languages: {trans_langs}")
+    return result
+
+
+def make_posts(count, languages):
+    """Transient posts shaped like real ones: ~6 KB of HTML per translation"""
+    now = datetime.utcnow()
+    tag = Tag(id=1, name='Tips', slug='tips', description='')
+    body = '<p>' + ' '.join(['Remove backgrounds from product photos in seconds.'] * 120) + '</p>'
+    fields = derive_text_fields(body)
+    posts = []
+    for i in range(count):
+        post = Post(id=i + 1, slug=f'post-{i}', author_id=1, status='published', featured_image='/x.png',
+                    created_at=now, updated_at=now, published_at=now)
+        post.tags.append(tag)
+        post.media.append(PostMedia(id=i + 1, post_id=i + 1, file_path='/x.png', file_type='image', created_at=now))
+        for j, code in enumerate(LANGUAGES[:languages]):
+            post.translations.append(PostTranslation(
+                id=i * languages + j + 1, post_id=i + 1, language_code=code, title=f'Post {i} ({code})',
+                content=body, meta_title='', meta_description='', meta_keywords='', is_auto_translated=j > 0,
+                last_updated_at=now, **fields
+            ))
+        posts.append(post)
+    return posts
+
+
+def timed(label, function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1000:9.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=50)
+    parser.add_argument('--languages', type=int, default=22)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    # Production logs flask.app at INFO to a file
+    logger = logging.getLogger('flask.app')
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.FileHandler(os.devnull))
+    logger.propagate = False
+
+    posts = make_posts(args.posts, args.languages)
+    print(f"{args.posts} posts x {args.languages} translations, best of {args.repeat}\n")
+
+    timed('legacy to_dict (all)', lambda: [legacy_to_dict(post) for post in posts], args.repeat)
+    timed('admin shape (all)', lambda: [serialize_post(post, SHAPE_ADMIN) for post in posts], args.repeat)
+    timed('legacy to_dict (language)', lambda: [legacy_to_dict(post, language='fr') for post in posts], args.repeat)
+    listed = timed('list shape (language)', lambda: [serialize_post(post, SHAPE_LIST, language='fr') for post in posts],
+                   args.repeat)
+
+    app = Flask(__name__)
+    with app.app_context():
+        stdlib = DefaultJSONProvider(app)
+        legacy_payload = [legacy_to_dict(post, language='fr') for post in posts]
+        print()
+        timed('json (stdlib), legacy', lambda: stdlib.dumps(legacy_payload), args.repeat)
+        timed('json (stdlib), list shape', lambda: stdlib.dumps(listed), args.repeat)
+        if FastJSONProvider.available:
+            timed('json (orjson), list shape', lambda: FastJSONProvider(app).dumps(listed), args.repeat)
+        else:
+            print('json (orjson)                not installed')
+        print(f"\nlegacy payload {len(stdlib.dumps(legacy_payload)) // 1024} KB, "
+              f"list shape {len(stdlib.dumps(listed)) // 1024} KB")
+
+
+if __name__ == "__main__":
+    main()
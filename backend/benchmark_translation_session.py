@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark DeepSeek calls with a session per call against the shared pooled session
+
+Starts a local stub of the chat completions API (HTTPS with a throwaway
+self-signed certificate when openssl is available, HTTP otherwise) and
+times TranslationService._chat_completion two ways:
+
+    session per call  - the former behaviour: a new requests.Session and
+                        HTTPAdapter for every call, closed afterwards
+    pooled session    - the shared keep-alive session (see app/utils/http_pool.py)
+
+Both run from a number of threads at once, like the bulk translation
+workers. The stub answers immediately, so the difference is connection
+setup (TCP and TLS handshakes) and session construction.
+
+Usage:
+    python benchmark_translation_session.py
+    python benchmark_translation_session.py --calls 200 --threads 4 --no-tls
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the backend directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from app.services.translation_service import TranslationService
+from app.utils.rate_limit import TokenBucket
+
+ANSWER = json.dumps({
+    'choices': [{'message': {'content': 'Bonjour le monde'}, 'finish_reason': 'stop'}],
+    'usage': {'prompt_tokens': 12, 'completion_tokens': 4}
+}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with the same chat completion, keeping the connection open"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+    connections = set()
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections.add(self.client_address)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(ANSWER)))
+        self.end_headers()
+        self.wfile.write(ANSWER)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(tls):
+    """Start the stub on a free port; returns (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    scheme = 'http'
+    if tls:
+        directory = tempfile.mkdtemp()
+        cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                        '-keyout', key, '-out', cert], check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/v1"
+
+
+class SessionPerCall:
+    """Stands in for the shared session and builds a new one for each call, as before"""
+
+    def post(self, url, **kwargs):
+        local_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=Retry(
+            total=2, backoff_factor=1, status_forcelist=[408, 500, 502, 503, 504],
+            allowed_methods=["POST"], respect_retry_after_header=True
+        ))
+        local_session.mount('https://', adapter)
+        local_session.verify = False
+        local_session.trust_env = False
+        try:
+            return local_session.post(url, **kwargs)
+        finally:
+            local_session.close()
+
+    def close(self):
+        pass
+
+
+def timed(label, service, calls, threads):
+    StubHandler.connections.clear()
+    latencies = []
+
+    def call(_):
+        start = time.perf_counter()
+        assert service._chat_completion('Translate: Hello world', 'French') == 'Bonjour le monde'
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(call, range(calls)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<20} {p50:8.2f} ms p50 {p95:8.2f} ms p95 {calls / elapsed:9.1f} calls/s "
+          f"{len(StubHandler.connections):5d} connections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=3)
+    parser.add_argument('--no-tls', action='store_true', help='Plain HTTP stub (no TLS handshakes to save)')
+    args = parser.parse_args()
+
+    logging.getLogger('flask.app').setLevel(logging.ERROR)
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    tls = not args.no_tls and shutil.which('openssl') is not None
+    server, base_url = start_stub(tls)
+    print(f"{args.calls} calls from {args.threads} threads to a local {'HTTPS' if tls else 'HTTP'} stub\n")
+
+    os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+    os.environ['LLM_PROVIDER'] = 'deepseek'
+    os.environ['DEEPSEEK_POOL_SIZE'] = str(args.threads)
+    service = TranslationService()
+    provider = service.provider
+    provider.base_url = base_url
+    service.rate_limiter = TokenBucket(rate=1e9, burst=10 ** 9)
+    # Self-signed stub certificate; trust_env would override verify with REQUESTS_CA_BUNDLE
+    provider.session.verify = False
+    provider.session.trust_env = False
+
+    pooled = provider.session
+    provider.session = SessionPerCall()
+    timed('session per call', service, args.calls, args.threads)
+    provider.session = pooled
+    timed('pooled session', service, args.calls, args.threads)
+
+    pooled.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Index advisor: EXPLAIN the SQL the API issues and flag scans and sorts
+
+Runs a workload of GET requests through the Flask test client, records every
+SELECT each blueprint sends to the database, and EXPLAINs the distinct query
+shapes. Plans that read a whole table or sort without an index are flagged:
+
+    MySQL       type=ALL, "Using filesort", "Using temporary"
+    SQLite      SCAN <table> without an index, USE TEMP B-TREE
+    PostgreSQL  Seq Scan, Sort
+
+Small development tables make full scans cheap, so the optimizer may pick
+them even where an index exists; run against a database with realistic row
+counts for a meaningful report. Indexes missing from an existing database
+are created by app/utils/migrate_indexes.py.
+
+Usage:
+    python index_advisor.py
+    python index_advisor.py --user-id 3 --path /api/cms/blog?tag=news --strict
+    python index_advisor.py --json > plans.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+
+from flask import has_request_context, request
+from sqlalchemy import event, text
+
+# Add the backend directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app, db
+from app.models.models import User
+from app.models.cms import Post, Tag, PostTranslation
+
+# {slug}, {tag} and {word} are filled from the database
+WORKLOAD = [
+    '/api/cms/blog?limit=10',
+    '/api/cms/blog?limit=10&page=3',
+    '/api/cms/blog?limit=10&tag={tag}',
+    '/api/cms/blog?limit=10&search={word}',
+    '/api/cms/blog/{slug}?language=en',
+    '/api/cms/blog/{slug}?language=fr',
+    '/api/cms/languages',
+    '/api/cms/website-languages',
+    '/api/cms/tags',
+    '/api/cms/posts?language=en',
+    '/api/credits/history',
+    '/api/credits/history?page=2',
+    '/api/payment/history',
+    '/api/matting/history',
+]
+
+_PLACEHOLDERS = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+
+
+def query_shape(statement):
+    """Statement with whitespace collapsed and expanded IN lists folded"""
+    return _PLACEHOLDERS.sub('(...)', ' '.join(statement.split()))
+
+
+def workload_values():
+    """Real slug, tag and search word to put into the workload paths"""
+    post = Post.query.filter_by(status='published').order_by(Post.id).first()
+    tag = Tag.query.order_by(Tag.id).first()
+    title = db.session.query(PostTranslation.title).filter_by(language_code='en').first()
+    words = re.findall(r'\w{4,}', title[0]) if title else []
+    return {
+        'slug': post.slug if post else 'missing-post',
+        'tag': tag.slug if tag else 'missing-tag',
+        'word': words[0] if words else 'image'
+    }
+
+
+def record_queries(app, paths, user_id):
+    """
+    Request each path and collect the SELECTs issued.
+
+    Returns:
+        OrderedDict: (blueprint, shape) -> {'statement', 'parameters', 'count', 'paths'}
+    """
+    from flask_jwt_extended import create_access_token
+
+    recorded = OrderedDict()
+    current = {'path': None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return
+        blueprint = (request.blueprint if has_request_context() else None) or '(none)'
+        key = (blueprint, query_shape(statement))
+        entry = recorded.setdefault(key, {'statement': statement, 'parameters': parameters,
+                                          'count': 0, 'paths': []})
+        entry['count'] += 1
+        if current['path'] not in entry['paths']:
+            entry['paths'].append(current['path'])
+
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            client = app.test_client()
+            for path in paths:
+                current['path'] = path
+                response = client.get(path, headers={'Authorization': f'Bearer {token}'})
+                print(f"  {response.status_code} {path}", file=sys.stderr)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+    return recorded
+
+
+def explain(connection, dialect, statement, parameters):
+    """
+    EXPLAIN one statement.
+
+    Returns:
+        tuple: (plan lines, list of flags)
+    """
+    flags = []
+    if dialect == 'mysql':
+        rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+        plan = []
+        for row in rows:
+            extra = row.get('Extra') or ''
+            plan.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                        f"rows={row.get('rows')} {extra}".strip())
+            if row.get('type') == 'ALL':
+                flags.append(f"full scan of {row.get('table')}")
+            if 'Using filesort' in extra:
+                flags.append(f"filesort on {row.get('table')}")
+            if 'Using temporary' in extra:
+                flags.append(f"temporary table for {row.get('table')}")
+        return plan, flags
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        plan = [row[-1] for row in rows]
+        for detail in plan:
+            if re.match(r'SCAN \w+$', detail) or re.match(r'SCAN TABLE \w+$', detail):
+                flags.append(f"full scan: {detail}")
+            if 'USE TEMP B-TREE' in detail:
+                flags.append(f"sort without index: {detail}")
+        return plan, flags
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+    plan = [row[0] for row in rows]
+    for line in plan:
+        if 'Seq Scan' in line:
+            flags.append(f"full scan: {line.strip()}")
+        if re.search(r'(^|->\s*)Sort\b', line.strip()):
+            flags.append(f"sort without index: {line.strip()}")
+    return plan, flags
+
+
+def analyse(app, recorded):
+    """EXPLAIN every recorded query shape"""
+    results = []
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        with db.engine.connect() as connection:
+            for (blueprint, shape), entry in recorded.items():
+                try:
+                    plan, flags = explain(connection, dialect, entry['statement'], entry['parameters'])
+                except Exception as e:
+                    connection.rollback()
+                    plan, flags = [f"EXPLAIN failed: {e}"], []
+                results.append({
+                    'blueprint': blueprint,
+                    'query': shape,
+                    'executions': entry['count'],
+                    'paths': entry['paths'],
+                    'plan': plan,
+                    'flags': flags
+                })
+    return results
+
+
+def print_report(results):
+    flagged = [result for result in results if result['flags']]
+    by_blueprint = OrderedDict()
+    for result in results:
+        by_blueprint.setdefault(result['blueprint'], []).append(result)
+
+    for blueprint, entries in by_blueprint.items():
+        print(f"\n== {blueprint}: {len(entries)} query shapes, "
+              f"{sum(1 for entry in entries if entry['flags'])} flagged")
+        for entry in entries:
+            marker = '!!' if entry['flags'] else 'ok'
+            query = entry['query'] if len(entry['query']) <= 160 else entry['query'][:157] + '...'
+            print(f"[{marker}] x{entry['executions']} {query}")
+            for flag in entry['flags']:
+                print(f"       - {flag}")
+            if entry['flags']:
+                print(f"       from: {', '.join(entry['paths'])}")
+                for line in entry['plan']:
+                    print(f"       | {line}")
+
+    print(f"\n{len(results)} query shapes, {len(flagged)} flagged")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', type=int, help='User to authenticate as (default: first admin, else first user)')
+    parser.add_argument('--path', action='append', default=[], help='Extra GET path to include in the workload')
+    parser.add_argument('--only', action='store_true', help='Run only the --path entries')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--strict', action='store_true', help='Exit with status 1 if anything is flagged')
+    args = parser.parse_args()
+
+    app = create_app()
+    # Every request must reach the database for its queries to be seen
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+
+    with app.app_context():
+        user_id = args.user_id
+        if user_id is None:
+            user = User.query.filter_by(is_admin=True).first() or User.query.first()
+            if user is None:
+                sys.exit("No users in the database; create one or pass --user-id")
+            user_id = user.id
+        values = workload_values()
+
+    paths = ([] if args.only else WORKLOAD) + args.path
+    paths = [path.format(**values) for path in paths]
+    print(f"Running {len(paths)} requests as user {user_id}", file=sys.stderr)
+
+    results = analyse(app, record_queries(app, paths, user_id))
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+        flagged = [result for result in results if result['flags']]
+    else:
+        flagged = print_report(results)
+
+    if args.strict and flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
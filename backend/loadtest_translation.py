@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Load test the post translation pipeline against the local stub API
+
+Replays a corpus of posts through TranslationService.translate_post_fields_with_lang_names,
+one (post, language) pair per job as the bulk translation workers do, at
+several worker counts, against the stub chat completions server (see
+app/services/llm_stub.py). No network or API key is needed.
+
+For each worker count it reports throughput, job latency percentiles,
+scaling against the first count, API calls and tokens, and the failures
+the stub injected. The stub is reset between counts, so every count sees
+the same injected failures. The translation memory is not used (the jobs
+run outside an app context), so every run exercises the API path in full.
+
+The corpus is synthetic by default: posts of mixed length, the longer ones
+above DEEPSEEK_CHUNK_TOKENS so that chunking is exercised. --corpus takes
+a JSON list of posts ({"title", "content", "meta_title", "meta_description"}),
+--from-db the English translations in the configured database.
+
+Usage:
+    python loadtest_translation.py
+    python loadtest_translation.py --workers 1,2,4,8 --languages fr,de,es --latency-ms 400 --error-rate 0.05
+    python loadtest_translation.py --from-db --posts 50 --rps 5
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the backend directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Nothing below may reach a real API
+os.environ['LLM_PROVIDER'] = 'stub'
+
+from app.services.llm_providers import StubProvider
+from app.services.llm_stub import StubSettings
+from app.services.translation_service import translation_service
+from app.utils.rate_limit import TokenBucket
+
+WORDS = ('remove', 'background', 'image', 'photo', 'product', 'edge', 'hair', 'transparent', 'shadow', 'studio',
+         'upload', 'download', 'quality', 'resolution', 'batch', 'workflow', 'marketplace', 'listing', 'color', 'light')
+
+
+def synthetic_corpus(count, seed):
+    """Posts of 2 to 40 paragraphs; about a third are long enough to be chunked"""
+    rng = random.Random(seed)
+
+    def sentence(words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    posts = []
+    for number in range(count):
+        paragraphs = rng.choice((2, 4, 6, 10, 25, 40))
+        blocks = []
+        for index in range(paragraphs):
+            if index % 5 == 0:
+                blocks.append(f"<h2>{sentence(5)}</h2>")
+            blocks.append(f"<p>{' '.join(sentence(rng.randint(8, 16)) for _ in range(rng.randint(3, 6)))}</p>")
+        posts.append({
+            'title': f"{sentence(6)} #{number}",
+            'content': '\n'.join(blocks),
+            'meta_title': sentence(6),
+            'meta_description': sentence(18),
+            'meta_keywords': 'image, background'
+        })
+    return posts
+
+
+def database_corpus(count):
+    from app import create_app
+    from app.models.cms import PostTranslation
+    app = create_app()
+    with app.app_context():
+        rows = PostTranslation.query.filter_by(language_code='en').order_by(PostTranslation.post_id).limit(count).all()
+        return [{
+            'title': row.title, 'content': row.content, 'meta_title': row.meta_title,
+            'meta_description': row.meta_description, 'meta_keywords': row.meta_keywords
+        } for row in rows]
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(len(values) * share)) - 1))]
+
+
+def run_level(jobs, workers, server):
+    """Translate every job with workers threads; returns the level's results"""
+    server.reset()
+    latencies = []
+    failures = 0
+    totals = {'api_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+    lock = threading.Lock()
+
+    def translate(job):
+        nonlocal failures
+        post, code, name = job
+        started = time.perf_counter()
+        translated = translation_service.translate_post_fields_with_lang_names(post, 'en', code, 'English', name)
+        elapsed = time.perf_counter() - started
+        usage = translation_service.last_usage() or {}
+        with lock:
+            latencies.append(elapsed)
+            failures += translated is None
+            for counter in totals:
+                totals[counter] += usage.get(counter, 0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(translate, jobs))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'workers': workers, 'jobs': len(jobs), 'failed': failures, 'seconds': elapsed,
+        'jobs_per_second': len(jobs) / elapsed,
+        'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95), 'p99': percentile(latencies, 0.99),
+        **totals,
+        'stub_requests': server.counters.get('requests', 0),
+        'stub_errors': server.counters.get('errors', 0),
+        'stub_rate_limited': server.counters.get('rate_limited', 0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4,8', help='Comma-separated worker counts to run')
+    parser.add_argument('--languages', default='fr,de,es', help='Target language codes')
+    parser.add_argument('--posts', type=int, default=20, help='Posts in the corpus')
+    parser.add_argument('--corpus', help='JSON file with a list of posts')
+    parser.add_argument('--from-db', action='store_true', help='English translations from the configured database')
+    parser.add_argument('--mode', choices=('structured', 'per_field'), default=None)
+    parser.add_argument('--rps', type=float, default=0, help='API requests per second (0: no limit)')
+    parser.add_argument('--latency-ms', type=float, default=200, help='Stub latency before the first byte')
+    parser.add_argument('--ms-per-token', type=float, default=2.0, help='Stub latency per answer token')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of stub requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of stub requests answered with 429')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep the service logging')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('flask.app').setLevel(logging.CRITICAL)
+
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as corpus_file:
+            posts = json.load(corpus_file)[:args.posts]
+    elif args.from_db:
+        posts = database_corpus(args.posts)
+    else:
+        posts = synthetic_corpus(args.posts, args.seed)
+    languages = [code.strip() for code in args.languages.split(',') if code.strip()]
+    jobs = [(post, code, translation_service.get_language_name(code)) for post in posts for code in languages]
+    levels = [int(count) for count in args.workers.split(',')]
+
+    settings = StubSettings(args.latency_ms, args.ms_per_token, args.error_rate, args.rate_limit_rate, args.seed)
+    translation_service.setup_provider(StubProvider(settings, pool_size=max(levels) * translation_service.chunk_concurrency))
+    translation_service.rate_limiter = TokenBucket(rate=args.rps, burst=max(1, int(args.rps))) if args.rps else \
+        TokenBucket(rate=1e9, burst=10 ** 9)
+    if args.mode:
+        translation_service.translation_mode = args.mode
+    server = translation_service.provider.server
+
+    if not args.json:
+        print(f"{len(posts)} posts x {len(languages)} languages = {len(jobs)} jobs "
+              f"({translation_service.translation_mode} mode, chunks of ~{translation_service.chunk_tokens} tokens, "
+              f"{translation_service.chunk_concurrency} at once)")
+        print(f"Stub: {args.latency_ms:.0f} ms + {args.ms_per_token} ms/token, {args.error_rate:.0%} errors, "
+              f"{args.rate_limit_rate:.0%} rate limited, seed {args.seed}\n")
+        print(f"{'workers':>7} {'jobs/s':>8} {'scaling':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+              f"{'failed':>7} {'calls':>7} {'tokens':>9} {'500s':>6} {'429s':>6}")
+
+    results = []
+    for workers in levels:
+        result = run_level(jobs, workers, server)
+        result['scaling'] = result['jobs_per_second'] / results[0]['jobs_per_second'] if results else 1.0
+        results.append(result)
+        if not args.json:
+            print(f"{workers:>7} {result['jobs_per_second']:>8.2f} {result['scaling']:>7.2f}x {result['p50']:>8.2f} "
+                  f"{result['p95']:>8.2f} {result['p99']:>8.2f} {result['failed']:>7} {result['api_calls']:>7} "
+                  f"{result['prompt_tokens'] + result['completion_tokens']:>9} {result['stub_errors']:>6} "
+                  f"{result['stub_rate_limited']:>6}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    translation_service.provider.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Script to (re)build the blog full-text search index from all post translations.
+The background migrations fill an empty index at startup (see
+app/utils/migrate_search_index.py); afterwards it is kept current on every
+translation save. Run this to rebuild an index that got out of step.
+"""
+
+from app import create_app, db
+from app.cms.search import rebuild_index
+
+def rebuild_search_index():
+    """
+    Index every post translation into cms_post_search_terms.
+    """
+    app = create_app()
+    with app.app_context():
+        print("Rebuilding blog search index...")
+        db.create_all()
+        indexed = rebuild_index()
+        print(f"Search index rebuilt: {indexed} translations indexed")
+
+if __name__ == "__main__":
+    rebuild_search_index()
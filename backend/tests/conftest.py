@@ -0,0 +1,111 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# Add the backend directory to the path so we can import from app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import db, jwt, bcrypt  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    The CMS blueprint on a SQLite database of its own.
+
+    create_app is tied to MySQL, so the app is put together here the way
+    create_app does it; the response cache is off so every request queries.
+    """
+    app = Flask('tests')
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        JWT_SECRET_KEY='test-secret-key-of-sufficient-length',
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        RESPONSE_CACHE_ENABLED=False
+    )
+    db.init_app(app)
+    jwt.init_app(app)
+    bcrypt.init_app(app)
+
+    from app.cms import bp as cms_bp
+    app.register_blueprint(cms_bp)
+
+    with app.app_context():
+        from app.models import models, cms  # noqa: F401
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def factory_app(tmp_path, monkeypatch):
+    """
+    The whole app from create_app, on a SQLite database of its own.
+
+    The process-wide matting cache, backend client and job queue are reset
+    so they are built from this app's settings; the matting backend is an
+    unreachable address, so images go to the local fallback engine.
+    """
+    from app import create_app
+    from app.matting import cache, client, derivatives, jobs
+
+    for module, name in ((cache, '_result_cache'), (client, '_backend_client'),
+                         (derivatives, '_derivative_cache'), (jobs, '_job_queue')):
+        monkeypatch.setattr(module, name, None)
+    for folder in ('uploads', 'processed'):
+        (tmp_path / folder).mkdir()
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'JWT_SECRET_KEY': 'test-secret-key-of-sufficient-length',
+        'DB_MIGRATIONS_ON_STARTUP': False,
+        'RESPONSE_CACHE_ENABLED': False,
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'PROCESSED_FOLDER': str(tmp_path / 'processed'),
+        'MATTING_CACHE_FOLDER': str(tmp_path / 'matting_cache'),
+        'MATTING_DERIVATIVE_FOLDER': str(tmp_path / 'variants'),
+        'MATTING_DERIVATIVES_EAGER': False,
+        'MATTING_BACKEND_URLS': 'http://127.0.0.1:9/api/process-image-api',
+        'MATTING_BACKEND_MAX_ATTEMPTS': 1,
+        'MATTING_BACKEND_CONNECT_TIMEOUT': 1.0,
+    })
+    yield app
+
+    if jobs._job_queue is not None:
+        jobs._job_queue.stop()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def factory_client(factory_app):
+    return factory_app.test_client()
+
+
+@pytest.fixture
+def auth_headers(factory_app):
+    """Authorization headers of a new user: auth_headers(credits=10, is_admin=False)"""
+    from flask_jwt_extended import create_access_token
+    from app.models.models import User
+
+    def make(credits=10, is_admin=False):
+        with factory_app.app_context():
+            number = User.query.count() + 1
+            user = User(username=f'user{number}', email=f'user{number}@example.com', password='x',
+                        credits=credits, is_admin=is_admin)
+            db.session.add(user)
+            db.session.commit()
+            return {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+    return make
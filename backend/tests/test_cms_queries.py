@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models.models import User
+from app.models.cms import Post, PostTranslation, Tag
+
+
+def add_posts(count, start=0):
+    """Published posts with an English and a French translation and two tags each"""
+    author = User.query.first()
+    if author is None:
+        author = User(username='author', email='author@example.com', password='x')
+        db.session.add(author)
+        db.session.flush()
+    tags = [Tag.query.filter_by(slug=slug).first() or Tag(name=slug.title(), slug=slug) for slug in ('news', 'howto')]
+    for number in range(start, start + count):
+        post = Post(slug=f'post-{number}', author_id=author.id, status='published',
+                    published_at=datetime(2024, 1, 1) + timedelta(hours=number))
+        post.translations.append(PostTranslation(language_code='en', title=f'Post {number}',
+                                                 content=f'<p>Post {number} in English</p>'))
+        post.translations.append(PostTranslation(language_code='fr', title=f'Article {number}',
+                                                 content=f'<p>Article {number} en français</p>'))
+        post.tags.extend(tags)
+        db.session.add(post)
+    db.session.commit()
+
+
+def count_queries(client, url):
+    """Status and number of statements sent to the database while serving url"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return response, len(statements)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/cms/blog?limit=50',
+    '/api/cms/blog?limit=50&language=fr',
+    '/api/cms/blog?limit=50&tag=news',
+])
+def test_blog_listing_query_count_does_not_grow_with_posts(app, client, url):
+    add_posts(5)
+    response, few = count_queries(client, url)
+    assert response.status_code == 200
+    assert len(response.get_json()['posts']) == 5
+
+    add_posts(20, start=5)
+    db.session.expire_all()
+    response, many = count_queries(client, url)
+    assert response.status_code == 200
+    assert len(response.get_json()['posts']) == 25
+
+    assert many == few, (few, many)
+
+
+def test_blog_listing_returns_requested_language(app, client):
+    add_posts(3)
+    posts = client.get('/api/cms/blog?language=fr').get_json()['posts']
+    assert [post['translation']['language_code'] for post in posts] == ['fr', 'fr', 'fr']
+    assert [tag['slug'] for tag in posts[0]['tags']] == ['news', 'howto']
+
+
+def test_blog_listing_without_language_summarises_every_translation(app, client):
+    add_posts(2)
+    posts = client.get('/api/cms/blog').get_json()['posts']
+    assert [[translation['language_code'] for translation in post['translations']] for post in posts] == [
+        ['en', 'fr'], ['en', 'fr']]
+    assert posts[0]['translations'][1]['title'] == 'Article 1'
+    assert set(posts[0]['translations'][0]) == {'id', 'language_code', 'title', 'is_auto_translated'}
+
+    posts = client.get('/api/cms/blog?language=fr').get_json()['posts']
+    assert 'translations' not in posts[0]
+
+
+def test_blog_search_falls_back_to_like_until_the_index_is_filled(app, client):
+    from app.models.cms import PostSearchTerm
+    from app.utils import migrate_search_index
+
+    add_posts(3)
+    # A database that predates the search index
+    PostSearchTerm.query.delete()
+    db.session.commit()
+
+    posts = client.get('/api/cms/blog?search=Article 1').get_json()['posts']
+    assert [post['slug'] for post in posts] == ['post-1']
+    assert 'search' not in posts[0]
+
+    assert migrate_search_index.run_migration()
+    assert PostSearchTerm.query.count() > 0
+
+    posts = client.get('/api/cms/blog?search=Article').get_json()['posts']
+    assert len(posts) == 3
+    assert all(post['search'] for post in posts)
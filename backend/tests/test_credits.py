@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.models import CreditLog, User
+
+
+def test_credit_history_cursor_pages_have_no_page_number(factory_app, factory_client, auth_headers):
+    headers = auth_headers(credits=3)
+    with factory_app.app_context():
+        user = User.query.one()
+        for number in range(3):
+            db.session.add(CreditLog(user_id=user.id, timestamp=datetime(2024, 1, 1) + timedelta(hours=number),
+                                     change_amount=-1, balance_after_change=3 - number,
+                                     source_type='image_processing', description=f'Image {number}'))
+        db.session.commit()
+
+    first = factory_client.get('/api/credits/history?limit=2', headers=headers).get_json()
+    assert (first['total_pages'], first['current_page'], first['total_items']) == (2, 1, 3)
+    assert first['next_cursor']
+
+    second = factory_client.get(f"/api/credits/history?limit=2&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert [log['description'] for log in second['history']] == ['Image 0']
+    assert second['total_pages'] is None
+    assert second['current_page'] is None
+    assert second['has_more'] is False
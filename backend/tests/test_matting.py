@@ -0,0 +1,58 @@
+import io
+import zipfile
+
+from PIL import Image
+
+
+def png_bytes(color=(200, 40, 40)):
+    """A small opaque PNG on a white background"""
+    image = Image.new('RGB', (64, 48), (255, 255, 255))
+    image.paste(color, (16, 12, 48, 36))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_repeated_upload_is_served_from_the_result_cache(factory_client, auth_headers):
+    headers = auth_headers(credits=5)
+    image = png_bytes()
+
+    first = factory_client.post('/api/matting/process?wait=20', headers=headers,
+                                data={'file': (io.BytesIO(image), 'photo.png')})
+    assert first.status_code == 200, first.get_json()
+    assert first.get_json()['status'] == 'completed'
+
+    second = factory_client.post('/api/matting/process', headers=headers,
+                                 data={'file': (io.BytesIO(image), 'again.png')})
+    assert second.status_code == 200
+    assert second.get_json()['cached'] is True
+
+    stats = factory_client.get('/api/matting/cache/stats', headers=auth_headers(is_admin=True))
+    assert stats.status_code == 200
+    assert stats.get_json()['entries'] == 1
+    assert stats.get_json()['hits'] == 1
+
+
+def test_cache_stats_require_an_admin(factory_client, auth_headers):
+    response = factory_client.get('/api/matting/cache/stats', headers=auth_headers())
+    assert response.status_code == 403
+
+
+def test_batch_processes_every_file_and_zips_the_results(factory_client, auth_headers):
+    headers = auth_headers(credits=5)
+    response = factory_client.post('/api/matting/batch', headers=headers, data={
+        'files': [(io.BytesIO(png_bytes((200, 40, 40))), 'red.png'),
+                  (io.BytesIO(png_bytes((40, 40, 200))), 'blue.png')]
+    })
+    assert response.status_code == 200, response.get_json()
+    batch = response.get_json()
+    assert batch['succeeded'] == 2
+    assert batch['credits_spent'] == 2
+    assert batch['credits_remaining'] == 3
+    assert [item['status'] for item in batch['items']] == ['completed', 'completed']
+    assert batch['download_url'] == f"/api/matting/batch/{batch['batch_id']}/download"
+
+    download = factory_client.get(batch['download_url'], headers=headers)
+    assert download.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(download.get_data())) as archive:
+        assert archive.namelist() == ['0001_red.png', '0002_blue.png']
@@ -0,0 +1,38 @@
+import pytest
+
+from app.services.llm_providers import StubProvider
+from app.services.llm_stub import StubSettings
+from app.services.translation_service import translation_service, MODE_STRUCTURED
+
+PARAGRAPHS = [f"<p>Paragraph {number} about removing the background of product photos.</p>\n" for number in range(6)]
+
+
+@pytest.fixture
+def stub_translation(factory_app, monkeypatch):
+    """The translation service on the local stub API with the translation memory on"""
+    monkeypatch.setattr(translation_service, 'memory_enabled', True)
+    translation_service.setup_provider(StubProvider(StubSettings(latency_ms=0, ms_per_token=0)))
+    with factory_app.app_context():
+        yield translation_service
+    translation_service.setup_provider()
+
+
+def translate(service, content):
+    post = {'title': 'Background removal', 'content': content}
+    result = service.translate_post_fields_with_lang_names(post, 'en', 'fr', 'English', 'French', mode=MODE_STRUCTURED)
+    return result, service.last_usage()
+
+
+def test_edited_post_reuses_the_unchanged_blocks(stub_translation):
+    first, first_usage = translate(stub_translation, ''.join(PARAGRAPHS))
+    assert first['content'].count('[French] ') == len(PARAGRAPHS)
+    assert first_usage['memory_hits'] == 0
+
+    edited = PARAGRAPHS[:2] + ["<p>A new second paragraph.</p>\n"] + PARAGRAPHS[3:]
+    second, second_usage = translate(stub_translation, ''.join(edited))
+
+    assert second['content'].count('[French] ') == len(edited)
+    assert '[French] A new second paragraph.' in second['content']
+    assert second_usage['memory_hits'] == len(edited) - 1
+    assert second_usage['tokens_saved'] > 0
+    assert second_usage['prompt_tokens'] < first_usage['prompt_tokens']
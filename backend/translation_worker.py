@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Run the CMS auto-translation workers in a process of their own.
+
+Set CMS_TRANSLATION_IN_PROCESS_WORKERS=false for the web processes so that
+they only record runs, and run this next to them; it works off the pending
+items of every running run, from all web processes, until stopped with
+SIGTERM or Ctrl+C. Several of these may run at once: items are claimed
+atomically (see app/cms/bulk_translate.py).
+"""
+
+import os
+import signal
+
+os.environ['CMS_TRANSLATION_IN_PROCESS_WORKERS'] = 'false'
+
+from app import create_app
+from app.cms.bulk_translate import build_bulk_translator
+
+
+def main():
+    app = create_app()
+    translator = build_bulk_translator(app)
+    signal.signal(signal.SIGTERM, lambda signum, frame: translator.stop())
+    translator.start()
+    print(f"Translation worker running with {translator.workers} threads, polling every {translator.poll_interval}s")
+    try:
+        translator.wait()
+    except KeyboardInterrupt:
+        pass
+    translator.stop()
+
+
+if __name__ == "__main__":
+    main()
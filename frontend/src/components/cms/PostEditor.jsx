@@ -23,8 +23,10 @@ import {
   getPostMedia,
   deleteTranslation,
   generateAIContent,
+  streamAIContent,
   getWebsiteLanguages,
-  getAuthToken // Corrected import name
+  autoTranslatePost,
+  cancelTranslationRun
 } from '../../lib/cms-service';
 import TranslationModal from './TranslationModal';
 
@@ -234,6 +236,7 @@ const PostEditor = () => {
   const [isTranslating, setIsTranslating] = useState(false);
   const [isGeneratingAIContent, setIsGeneratingAIContent] = useState(false);
   const [abortController, setAbortController] = useState(null);
+  const translationRunRef = useRef(null); // Background run of the current auto-translation
   
   // Helper function to check if a language is RTL
   const isRTL = (langCode) => ['ar', 'he', 'ur', 'fa'].includes(langCode);
@@ -250,21 +253,29 @@ const PostEditor = () => {
     
     try {
       console.log(`Generating AI content for title: "${formData.title}" in language: ${formData.language_code}`);
-      // Call the API to generate content
-      const response = await generateAIContent(
-        formData.title, 
-        formData.language_code, 
-        'medium' // Default to medium length content
-      );
+      // Show the content as it is written; the final event has it converted to HTML
+      let response;
+      try {
+        response = await streamAIContent(
+          formData.title,
+          formData.language_code,
+          'medium', // Default to medium length content
+          { onDelta: (text) => setFormData(prev => ({ ...prev, content: text })) }
+        );
+      } catch (streamError) {
+        // The generation carries on server-side, so the plain request picks it up (or its cached result)
+        console.warn('Streaming AI content failed, falling back to a single request:', streamError);
+        response = await generateAIContent(formData.title, formData.language_code, 'medium');
+      }
       
-      console.log('AI content generation response:', response);
+      console.log('AI content generation response:', { ...response, content: undefined });
       
       if (response.success && response.content) {
         // Update form data with the generated content
-        setFormData({
-          ...formData,
+        setFormData(prev => ({
+          ...prev,
           content: response.content
-        });
+        }));
         
         // Show success message
         setSuccess("AI content successfully generated!");
@@ -846,6 +857,11 @@ const PostEditor = () => {
   const handleCancelTranslation = () => {
     if (abortController) {
       abortController.abort();
+      // Stop the background run too, including languages being translated right now
+      if (translationRunRef.current) {
+        cancelTranslationRun(translationRunRef.current).catch(err => console.error('Failed to cancel translation run:', err));
+        translationRunRef.current = null;
+      }
       setAbortController(null);
       setIsTranslating(false);
       setError('Translation cancelled by user.');
@@ -885,86 +901,25 @@ const PostEditor = () => {
     try {
       setSuccess(`Starting translation for ${languagesToProcess.length} language(s)...`);
       
-      const BATCH_SIZE = 5;
-      const batches = [];
-      for (let i = 0; i < languagesToProcess.length; i += BATCH_SIZE) {
-        batches.push(languagesToProcess.slice(i, i + BATCH_SIZE));
-      }
-
-      console.log(`Processing translations in ${batches.length} batch(es) for ${languagesToProcess.length} language(s).`);
-
-      for (let i = 0; i < batches.length; i++) {
-        const batch = batches[i];
-        if (controller.signal.aborted) {
-          throw new Error('Translation cancelled by user.');
-        }
-        
-        // Clear previous batch error before showing new batch success
-        setError(null);
-        setSuccess(`Processing batch ${i + 1} of ${batches.length} (Languages: ${batch.join(', ')})...`);
-        
-        try {
-          const token = getAuthToken(); // Corrected function call
-          if (!token) throw new Error('Authentication token not found. Please log in again.');
-          
-          const response = await fetch(`/api/cms/posts/${id}/auto-translate`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-              'Authorization': `Bearer ${token}`
-            },
-            body: JSON.stringify({ target_languages: batch }),
-            signal: controller.signal
-          });
-
-          if (controller.signal.aborted) throw new Error('Translation cancelled by user.');
-
-          const resultText = await response.text(); // Get raw response text for better debugging
-          let result;
-          try {
-            result = JSON.parse(resultText);
-          } catch (e) {
-            console.error('Failed to parse JSON response:', resultText);
-            throw new Error(`Server returned non-JSON response (status ${response.status}). Check console for details.`);
-          }
-
-          if (!response.ok) {
-            console.error(`Batch ${i+1} API error:`, response.status, result);
-            throw new Error(result.error || result.message || `Batch ${i+1} failed with status: ${response.status}`);
-          }
-
-          console.log(`Batch ${i + 1} response:`, result);
-
-          if (result.translations) {
-            cumulativeSuccessCount += (result.translations.successful || []).length;
-            cumulativeFailedCount += (result.translations.failed || []).length;
-            cumulativeSkippedCount += (result.translations.skipped || []).length;
-          } else {
-            // If translations key is missing, assume failure for the batch for safety
-            console.warn('Translations key missing in batch response:', result);
-            cumulativeFailedCount += batch.length; 
-          }
-          // Update success message after each batch, clear any lingering error
+      // The backend translates every language in the background; follow its progress until done
+      const result = await autoTranslatePost(id, {
+        target_languages: languagesToProcess,
+        signal: controller.signal,
+        onStarted: (run) => { translationRunRef.current = run.run_id; },
+        onProgress: (run) => {
+          const { done, failed, skipped, cancelled } = run.counts;
           setError(null);
-          setSuccess(`Batch ${i + 1} processed. Overall: ${cumulativeSuccessCount} successful, ${cumulativeFailedCount} failed, ${cumulativeSkippedCount} skipped.`);
-        
-        } catch (batchError) {
-          if (batchError.name === 'AbortError') throw batchError; // Re-throw to outer catch
-          
-          console.error(`Error processing batch ${i + 1}:`, batchError);
-          cumulativeFailedCount += batch.length; // Assume all in batch failed if the batch itself errors
-          // Set error message, clear success message
-          setSuccess(null);
-          setError(`Error in batch ${i + 1}: ${batchError.message}. Trying next batch if any.`);
-          // No automatic retry for batch, allow loop to continue if there are more batches
-        }
-        
-        if (i < batches.length - 1 && !controller.signal.aborted) {
-          await new Promise(resolve => setTimeout(resolve, 1000)); // Small delay between batches
+          setSuccess(`Translating... ${run.percent}% (${done} done, ${failed} failed, ${skipped + cancelled} skipped of ${run.total}).`);
         }
-      }
+      });
+      translationRunRef.current = null;
+
+      console.log('Auto-translate result:', result);
+      cumulativeSuccessCount = result.translations.successful.length;
+      cumulativeFailedCount = result.translations.failed.length;
+      cumulativeSkippedCount = result.translations.skipped.length;
 
-      // After all batches attempted, refresh post data regardless of outcome to get latest state
+      // Refresh post data regardless of outcome to get latest state
       try {
         const postData = await getPost(id); 
         if (postData && postData.translations) {
@@ -718,7 +718,7 @@ export const autoTranslatePost = async (postId, options = {}) => {
       target_languages: targetLanguages,
     };
     
-    // Make the translation request
+    // Start the translation; the backend translates in the background and returns the run at once
     const response = await axios.post(fullApiUrl, payload, {
       headers: {
         'Authorization': `Bearer ${token}`,
@@ -726,16 +726,17 @@ export const autoTranslatePost = async (postId, options = {}) => {
         'Accept': 'application/json'
       }
     });
+    if (options.onStarted) options.onStarted(response.data.run);
     
-    // Log response summary
-    const successCount = response.data?.translations?.successful?.length || 0;
-    const skippedCount = response.data?.translations?.skipped?.length || 0;
-    const failedCount = response.data?.translations?.failed?.length || 0;
+    const run = await waitForTranslationRun(response.data.run.run_id, options.onProgress, 2000, options.signal);
+    const translations = runTranslations(run);
+    translations.failed.push(...(response.data.unsupported_languages || []));
     
-    console.log(`Translation completed: ${successCount} translated, ${skippedCount} skipped, ${failedCount} failed`);
+    console.log(`Translation completed: ${translations.successful.length} translated, ${translations.skipped.length} skipped, ${translations.failed.length} failed`);
     
-    return response.data;
+    return { ...response.data, run, translations };
   } catch (error) {
+    if (options.signal && options.signal.aborted) throw new Error('Translation cancelled by user.');
     console.error('Error in auto-translate:', error);
     if (error.response) {
       console.error('Response error data:', error.response.data);
@@ -750,8 +751,52 @@ export const autoTranslatePost = async (postId, options = {}) => {
   }
 };
 
+// Successful, failed and skipped language codes of a single post's run
+export const runTranslations = (run) => {
+  const translations = { successful: [], failed: [], skipped: [] };
+  (run.items || []).forEach(item => {
+    if (item.status === 'done') translations.successful.push(item.language_code);
+    else if (item.status === 'skipped' || item.status === 'cancelled') translations.skipped.push(item.language_code);
+    else translations.failed.push(item.language_code);
+  });
+  return translations;
+};
+
+// Stop a background translation run, or only some of its languages
+export const cancelTranslationRun = async (runId, languages) => {
+  const token = getAuthToken();
+  const response = await axios.post(`/api/cms/posts/auto-translate-all/${runId}/cancel`,
+    languages ? { languages } : {}, {
+    headers: {
+      'Authorization': `Bearer ${token}`,
+      'Content-Type': 'application/json',
+      'Accept': 'application/json'
+    }
+  });
+  return response.data.run;
+};
+
+// Poll a background auto-translate run until it is no longer running (or signal is aborted)
+export const waitForTranslationRun = async (runId, onProgress, intervalMs = 3000, signal) => {
+  const token = getAuthToken();
+  while (true) {
+    if (signal && signal.aborted) throw new Error('Translation cancelled by user.');
+    const response = await axios.get(`/api/cms/posts/auto-translate-all/${runId}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Accept': 'application/json'
+      }
+    });
+    const run = response.data.run;
+    if (onProgress) onProgress(run);
+    if (run.status !== 'running') return run;
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+};
+
 // Auto-translate all posts from English to all other languages
-export const autoTranslateAllPosts = async (options = {}) => {
+// The backend translates in the background; this resolves once the run has finished
+export const autoTranslateAllPosts = async (options = {}, onProgress) => {
   try {
     console.log('Starting auto-translation for all posts');
     
@@ -793,7 +838,8 @@ export const autoTranslateAllPosts = async (options = {}) => {
         'Accept': 'application/json'
       }
     });
-    return response.data;
+    const run = await waitForTranslationRun(response.data.run.run_id, onProgress);
+    return { ...response.data, run, count: run.counts.done };
   } catch (error) {
     console.error('Error in auto-translating all posts:', error);
     if (error.response) {
@@ -805,7 +851,7 @@ export const autoTranslateAllPosts = async (options = {}) => {
 };
 
 // Translate English posts to all missing languages (all except EN, ES, FR)
-export const translateMissingLanguages = async () => {
+export const translateMissingLanguages = async (onProgress) => {
   try {
     console.log('Starting translations for missing languages (excluding EN, ES, FR)');
     
@@ -827,7 +873,7 @@ export const translateMissingLanguages = async () => {
         'de', 'ar', 'el', 'hu', 'id', 'it', 'ja', 'ko', 'ms', 
         'nl', 'no', 'pl', 'pt', 'ru', 'sv', 'th', 'tr', 'vi', 'zh-TW'
       ],
-      batch_size: 2,  // Process 2 posts at a time to avoid timeouts
+      batch_size: 0,  // All posts; the run continues in the background
     };
     
     console.log(`Translating to missing languages: ${options.languages.join(', ')}`);
@@ -839,7 +885,8 @@ export const translateMissingLanguages = async () => {
         'Accept': 'application/json'
       }
     });
-    return response.data;
+    const run = await waitForTranslationRun(response.data.run.run_id, onProgress);
+    return { ...response.data, run, count: run.counts.done };
   } catch (error) {
     console.error('Error in translating missing languages:', error);
     if (error.response) {
@@ -1016,4 +1063,66 @@ export const generateAIContent = async (title, language = 'en', length = 'medium
     
     return handleError(error);
   }
-};
\ No newline at end of file
+};
+
+/**
+ * Generate blog content using AI, receiving it as it is written
+ *
+ * The server sends {"delta"} events with pieces of the content, then one
+ * {"done": true} event with the whole content as HTML. Repeated titles are
+ * answered from the server's generation cache unless refresh is set.
+ *
+ * @param {string} title - The blog post title
+ * @param {string} language - Language code (e.g., 'en', 'fr')
+ * @param {string} length - Content length: 'short', 'medium', or 'long'
+ * @param {Object} options - { onDelta(textSoFar), signal, refresh }
+ * @returns {Promise<Object>} - The final event: { success, content, cached } or { success: false, error }
+ */
+export const streamAIContent = async (title, language = 'en', length = 'medium', options = {}) => {
+  const token = getAuthToken();
+  if (!token) {
+    throw new Error('Authentication required. Please log in again.');
+  }
+
+  const response = await fetch(`${API_URL}/posts/generate-content/stream`, {
+    method: 'POST',
+    headers: {
+      'Authorization': `Bearer ${token}`,
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream'
+    },
+    body: JSON.stringify({ title, language, length, refresh: !!options.refresh }),
+    signal: options.signal
+  });
+  if (!response.ok || !response.body) {
+    let message = `HTTP ${response.status}`;
+    try {
+      message = (await response.json()).error || message;
+    } catch (e) {
+      // Not JSON
+    }
+    throw new Error(`AI generation failed: ${message}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      if (!raw.startsWith('data:')) continue;
+      const event = JSON.parse(raw.slice(5));
+      if (event.done) {
+        return event;
+      }
+      text += event.delta;
+      if (options.onDelta) options.onDelta(text);
+    }
+  }
+  throw new Error('AI generation failed: the stream ended early');
+};
@@ -7,29 +7,44 @@ const HistoryPage = () => {
   const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
 
+  // The history is paged with a cursor: each response names the page after it
+  const fetchHistory = async (cursor = null) => {
+    const token = localStorage.getItem('token');
+    const response = await axios.get('/api/matting/history', {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      },
+      params: cursor ? { cursor } : {}
+    });
+    setHistory(previous => cursor ? [...previous, ...response.data.history] : response.data.history);
+    setNextCursor(response.data.has_more ? response.data.next_cursor : null);
+  };
+
   useEffect(() => {
-    const fetchHistory = async () => {
-      try {
-        const token = localStorage.getItem('token');
-        const response = await axios.get('/api/matting/history', {
-          headers: {
-            'Authorization': `Bearer ${token}`
-          }
-        });
-        setHistory(response.data.history);
-      } catch (err) {
+    fetchHistory()
+      .catch((err) => {
         console.error('Error fetching history:', err);
         setError('Failed to load history. Please try again later.');
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchHistory();
+      })
+      .finally(() => setLoading(false));
   }, []);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchHistory(nextCursor);
+    } catch (err) {
+      console.error('Error fetching more history:', err);
+      setError('Failed to load history. Please try again later.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <div className="flex justify-center items-center min-h-[70vh]">
@@ -122,6 +137,18 @@ const HistoryPage = () => {
         </div>
       )}
 
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <button 
+            onClick={loadMore} 
+            disabled={loadingMore}
+            className="bg-gray-200 text-gray-800 px-4 py-2 rounded hover:bg-gray-300 disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
+
       <style jsx>{`
         .bg-checkerboard {
           background-image: linear-gradient(45deg, #f0f0f0 25%, transparent 25%),
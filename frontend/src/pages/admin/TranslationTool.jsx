@@ -31,9 +31,17 @@ const TranslationTool = () => {
         batch_size: parseInt(batchSize),
         placeholder_mode: usePlaceholder,
       });
+      console.log('Translation run started:', response.data);
 
-      setResult(response.data);
-      console.log('Translation response:', response.data);
+      // The run continues in the background; poll its progress until it finishes
+      let run = response.data.run;
+      setResult(run);
+      while (run.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 3000));
+        const progress = await axios.get(response.data.status_url);
+        run = progress.data.run;
+        setResult(run);
+      }
     } catch (err) {
       console.error('Translation error:', err);
       setError(err.response?.data?.error || err.message || 'Unknown error');
@@ -66,7 +74,7 @@ const TranslationTool = () => {
                 className="mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md"
                 placeholder="10"
               />
-              <p className="text-xs text-gray-500 mt-1">Number of posts to process at once. Use 0 for all posts.</p>
+              <p className="text-xs text-gray-500 mt-1">Number of posts to translate. Use 0 for all posts.</p>
             </label>
           </div>
           
@@ -104,39 +112,25 @@ const TranslationTool = () => {
       
       {result && (
         <div className="bg-green-100 border border-green-400 text-green-700 px-4 py-3 rounded mb-6">
-          <h3 className="font-bold text-lg mb-2">Translation Complete</h3>
+          <h3 className="font-bold text-lg mb-2">
+            {result.status === 'running' ? `Translating... ${result.percent}%` : `Translation ${result.status}`}
+          </h3>
           <div className="mb-2">
-            <p><strong>Total Posts:</strong> {result.results?.total_posts || 0}</p>
-            <p><strong>Posts Translated:</strong> {result.results?.successfully_translated_posts || 0}</p>
-            <p><strong>Languages Translated:</strong> {result.results?.translated_languages || 0}</p>
-            <p><strong>Skipped Languages:</strong> {result.results?.skipped_languages || 0}</p>
-            <p><strong>Failed Translations:</strong> {result.results?.failed_posts || 0}</p>
-            <p><strong>Remaining Posts:</strong> {result.results?.remaining_posts || 0}</p>
+            <p><strong>Total Translations:</strong> {result.total}</p>
+            <p><strong>Translated:</strong> {result.counts?.done || 0}</p>
+            <p><strong>Skipped (edited by hand):</strong> {result.counts?.skipped || 0}</p>
+            <p><strong>Failed:</strong> {result.counts?.failed || 0}</p>
+            <p><strong>Remaining:</strong> {(result.counts?.pending || 0) + (result.counts?.running || 0)}</p>
           </div>
           
-          {result.results?.details && result.results.details.length > 0 && (
+          {result.failed_items && result.failed_items.length > 0 && (
             <div className="mt-4">
-              <h4 className="font-semibold">Details by Post:</h4>
+              <h4 className="font-semibold">Failed Translations:</h4>
               <div className="mt-2 max-h-60 overflow-y-auto">
-                {result.results.details.map((post, index) => (
-                  <div key={index} className="border-b border-green-200 py-2">
-                    <p><strong>Post ID {post.post_id}:</strong> {post.post_slug}</p>
-                    {post.successful_languages.length > 0 && (
-                      <p className="text-sm">
-                        <span className="font-medium">Successful:</span> {post.successful_languages.join(', ')}
-                      </p>
-                    )}
-                    {post.failed_languages.length > 0 && (
-                      <p className="text-sm text-red-600">
-                        <span className="font-medium">Failed:</span> {post.failed_languages.join(', ')}
-                      </p>
-                    )}
-                    {post.skipped_languages.length > 0 && (
-                      <p className="text-sm text-gray-600">
-                        <span className="font-medium">Skipped:</span> {post.skipped_languages.join(', ')}
-                      </p>
-                    )}
-                  </div>
+                {result.failed_items.map((item, index) => (
+                  <p key={index} className="text-sm text-red-600">
+                    <strong>Post ID {item.post_id}</strong> ({item.language_code}): {item.error}
+                  </p>
                 ))}
               </div>
             </div>